@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import sys
 import dj_database_url
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -54,9 +55,47 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # BEGIN IMMEDIATE: transações que escrevem se enfileiram (com espera)
+        # em vez de falhar com "database is locked" — ver agendamentos/reservas.py
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # banco de teste em arquivo: o SQLite em memória compartilhada usa
+        # locks por tabela que não respeitam o timeout (testes concorrentes)
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# Cache compartilhado entre os workers do gunicorn (disponibilidade da agenda).
+# Em produção com Redis, defina REDIS_URL.
+# Nos testes, cache em memória do processo: o cache.clear() dos testes e os
+# contadores de versão (timeout=None) não podem vazar para o cache do dev.
+TESTANDO = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+if TESTANDO:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'agendamento_system_testes',
+        }
+    }
+elif os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR', '/tmp/agendamento_system_cache'),
+        }
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',},
@@ -76,6 +115,10 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Arquivos com dados de clientes (relatórios PDF): fora de MEDIA_ROOT, sem URL
+# pública — só saem pelas views que checam permissão
+ARQUIVOS_PRIVADOS_ROOT = os.path.join(BASE_DIR, 'privado')
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = 'login'
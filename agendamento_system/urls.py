@@ -1,6 +1,8 @@
+import re
+
 from django.contrib import admin
-from django.urls import path, include
-from agendamentos import views as agendamento_views
+from django.urls import path, include, re_path
+from agendamentos import armazenamento, views as agendamento_views
 from django.contrib.auth.views import LogoutView, LoginView
 from django.conf import settings
 from django.conf.urls.static import static
@@ -34,4 +36,11 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
+    # blobs com cache imutável antes da regra geral de mídia
+    urlpatterns += [
+        re_path(
+            rf'^{re.escape(settings.MEDIA_URL.lstrip("/"))}{armazenamento.PASTA}/(?P<caminho>.*)$',
+            agendamento_views.midia_conteudo,
+        ),
+    ]
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Cliente, Servico, Agendamento
+from .models import (
+    Cliente, Servico, Agendamento, Profissional,
+    ConfiguracaoAgenda, HorarioFuncionamento, ExcecaoAgenda, EmailPendente,
+)
 
 
 @admin.register(Cliente)
@@ -12,20 +15,68 @@ class ClienteAdmin(admin.ModelAdmin):
 
 @admin.register(Servico)
 class ServicoAdmin(admin.ModelAdmin):
-    list_display = ("nome", "preco", "duracao", "has_img")
+    list_display = ("nome", "preco", "duracao", "has_img", "imagem_status")
     search_fields = ("nome", "descricao")
     list_filter = ("duracao",)
     ordering = ("id",)
+    filter_horizontal = ("profissionais",)
 
     def has_img(self, obj):
         return bool(obj.imagem)
     has_img.boolean = True
     has_img.short_description = "Imagem?"
 
+
+@admin.register(Profissional)
+class ProfissionalAdmin(admin.ModelAdmin):
+    list_display = ("nome", "ativo")
+    list_filter = ("ativo",)
+    search_fields = ("nome",)
+
 @admin.register(Agendamento)
 class AgendamentoAdmin(admin.ModelAdmin):
-    list_display = ("id", "data_hora", "status", "cliente", "servico")
+    list_display = ("id", "data_hora", "status", "cliente", "servico", "profissional")
     search_fields = ("cliente__nome", "servico__nome")
-    list_filter = ("status", "data_hora")
+    list_filter = ("status", "profissional", "data_hora")
     date_hierarchy = "data_hora"
     ordering = ("-data_hora",)
+
+
+@admin.register(ConfiguracaoAgenda)
+class ConfiguracaoAgendaAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "intervalo", "duracao_padrao")
+
+    # linha única (ConfiguracaoAgenda.carregar lê pk=1)
+    def has_add_permission(self, request):
+        return super().has_add_permission(request) and not ConfiguracaoAgenda.objects.exists()
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.pk = 1
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(HorarioFuncionamento)
+class HorarioFuncionamentoAdmin(admin.ModelAdmin):
+    list_display = ("dia_semana", "aberto", "abre", "fecha", "pausa_inicio", "pausa_fim")
+    ordering = ("dia_semana",)
+
+
+@admin.register(ExcecaoAgenda)
+class ExcecaoAgendaAdmin(admin.ModelAdmin):
+    list_display = ("data", "descricao", "fechado", "abre", "fecha")
+    list_filter = ("fechado",)
+    date_hierarchy = "data"
+    ordering = ("-data",)
+
+
+@admin.register(EmailPendente)
+class EmailPendenteAdmin(admin.ModelAdmin):
+    list_display = ("assunto", "status", "tentativas", "proxima_tentativa", "criado_em", "enviado_em")
+    list_filter = ("status",)
+    search_fields = ("chave", "assunto")
+    readonly_fields = ("chave", "criado_em", "enviado_em", "ultimo_erro")
+    ordering = ("-criado_em",)
@@ -0,0 +1,165 @@
+# agendamentos/armazenamento.py
+"""
+Storage endereçado por conteúdo para as imagens (campos com
+storage=armazenamento.conteudo).
+
+O nome gravado é o SHA-256 dos bytes: PASTA/ab/abcdef….png. A mesma imagem
+enviada de novo (outro recorte igual, a mesma foto em dois serviços) vira o
+mesmo nome e o arquivo existe uma vez só; nomes nunca colidem nem ganham
+sufixo. Como o conteúdo de um nome não muda, a URL pode ir com cache
+"immutable" de um ano (views.midia_conteudo; em produção, o mesmo cabeçalho
+no servidor que entregar MEDIA_URL + PASTA).
+
+Um arquivo pode estar em várias linhas, então `delete` não apaga blobs —
+trocar ou remover a imagem só deixa o blob sem referência. Quem apaga é
+`coletar` (comando coletar_midia), que compara os arquivos de PASTA com os
+nomes gravados em todos os campos que usam este storage. Blobs mais novos
+que CARENCIA ficam: podem ser de um envio cuja transação ainda não
+terminou (regravar um blob existente renova a data dele pelo mesmo motivo).
+
+Nomes antigos (servicos/x.png etc.) continuam válidos e são apagados como
+antes; `enderecar` os converte para blobs.
+
+`privado` é o storage dos arquivos com dados de clientes (relatórios): fica
+em settings.ARQUIVOS_PRIVADOS_ROOT, fora de MEDIA_ROOT, e não tem URL.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import timedelta
+import hashlib
+import os
+import time
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+
+PASTA = "conteudo"
+CARENCIA = timedelta(hours=24)
+MAX_CACHE = 365 * 24 * 3600  # segundos; Cache-Control das URLs de blob
+
+
+def _hash(content) -> str:
+    h = hashlib.sha256()
+    for chunk in content.chunks():
+        h.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+    return h.hexdigest()
+
+
+def enderecado(nome: str) -> bool:
+    return bool(nome) and nome.startswith(PASTA + "/")
+
+
+class ArmazenamentoConteudo(FileSystemStorage):
+    def _save(self, name, content):
+        digest = _hash(content)
+        nome = f"{PASTA}/{digest[:2]}/{digest}{os.path.splitext(name)[1].lower()}"
+        if self.exists(nome):
+            os.utime(self.path(nome))  # renova a carência da coleta
+            return nome
+        # grava ao lado e renomeia: leitores nunca veem o blob pela metade, e
+        # dois envios simultâneos do mesmo conteúdo só trocam um pelo outro
+        temporario = super()._save(f"{nome}.{uuid.uuid4().hex}.tmp", content)
+        os.replace(self.path(temporario), self.path(nome))
+        return nome
+
+    def delete(self, name):
+        if enderecado(name):
+            return  # compartilhado: só `coletar` apaga
+        super().delete(name)
+
+    def apagar_blob(self, name):
+        super().delete(name)
+
+
+conteudo = ArmazenamentoConteudo()
+
+
+class ArmazenamentoPrivado(FileSystemStorage):
+    """Fora de MEDIA_ROOT e sem URL: o arquivo só sai por uma view com permissão."""
+
+    @property
+    def base_location(self):
+        return settings.ARQUIVOS_PRIVADOS_ROOT
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+    def url(self, name):
+        raise ValueError("Arquivo privado não tem URL pública.")
+
+
+privado = ArmazenamentoPrivado()
+
+
+def campos():
+    """(model, nome do campo) de todos os FileFields que usam este storage."""
+    return [
+        (model, campo.name)
+        for model in apps.get_models()
+        for campo in model._meta.get_fields()
+        if isinstance(campo, models.FileField) and isinstance(campo.storage, ArmazenamentoConteudo)
+    ]
+
+
+def referenciados() -> set[str]:
+    nomes = set()
+    for model, campo in campos():
+        nomes.update(model._default_manager.exclude(**{campo: ""}).values_list(campo, flat=True).distinct())
+    nomes.discard(None)
+    return nomes
+
+
+@dataclass
+class Coleta:
+    blobs: int = 0
+    bytes: int = 0
+
+
+def coletar(carencia: timedelta = CARENCIA, simular: bool = False) -> Coleta:
+    """Apaga os blobs de PASTA sem referência e mais velhos que `carencia`."""
+    coleta = Coleta()
+    raiz = conteudo.path(PASTA)
+    if not os.path.isdir(raiz):
+        return coleta
+    # lê as referências ANTES de listar: um blob gravado depois disso está na carência
+    usados = referenciados()
+    limite = time.time() - carencia.total_seconds()
+    for pasta, _, arquivos in os.walk(raiz):
+        for arquivo in arquivos:
+            caminho = os.path.join(pasta, arquivo)
+            nome = os.path.relpath(caminho, conteudo.location).replace(os.sep, "/")
+            try:
+                info = os.stat(caminho)
+            except FileNotFoundError:
+                continue
+            if nome in usados or info.st_mtime > limite:
+                continue
+            coleta.blobs += 1
+            coleta.bytes += info.st_size
+            if not simular:
+                conteudo.apagar_blob(nome)
+    return coleta
+
+
+def enderecar(model, campo: str) -> dict[str, str]:
+    """Converte os arquivos com nome antigo do campo em blobs; devolve {antigo: novo}."""
+    storage = model._meta.get_field(campo).storage
+    antigos = (
+        model._default_manager.exclude(**{campo: ""}).exclude(**{f"{campo}__isnull": True})
+        .exclude(**{f"{campo}__startswith": PASTA + "/"}).values_list(campo, flat=True).distinct()
+    )
+    trocas = {}
+    for antigo in list(antigos):
+        if not storage.exists(antigo):
+            continue
+        with storage.open(antigo, "rb") as f:
+            novo = storage.save(antigo, f)
+        model._default_manager.filter(**{campo: antigo}).update(**{campo: novo})
+        storage.delete(antigo)
+        trocas[antigo] = novo
+    return trocas
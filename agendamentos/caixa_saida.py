@@ -0,0 +1,214 @@
+# agendamentos/caixa_saida.py
+"""
+Caixa de saída transacional de e-mails.
+
+Quem gera a mensagem chama `enfileirar` dentro da própria transação (ex.:
+lembretes.enfileirar grava as etapas enviadas e os e-mails juntos): se a
+transação volta, o e-mail some com ela; se confirma, ele fica guardado até
+sair. A chave de idempotência (unique) faz a mesma mensagem entrar uma vez
+só, mesmo que o chamador rode de novo.
+
+`processar` é o worker (comando processar_emails): reserva um lote de
+pendentes vencidos, envia com um pool pequeno de threads — cada thread com
+a sua conexão SMTP reaproveitada entre mensagens — respeitando um limite de
+e-mails por segundo, e grava o resultado na thread principal. Falhas voltam
+para a fila com espera exponencial (BACKOFF_BASE * 2^(tentativas-1), até
+BACKOFF_MAX) e, depois de MAX_TENTATIVAS, ficam como "falhou".
+
+A reserva (status "enviando") vale por RESERVA: se o worker morrer no meio,
+as mensagens voltam a ser elegíveis quando ela vence. A entrega é "pelo
+menos uma vez".
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .models import EmailPendente
+
+MAX_TENTATIVAS = 6
+BACKOFF_BASE = timedelta(seconds=30)
+BACKOFF_MAX = timedelta(hours=1)
+RESERVA = timedelta(minutes=5)
+TAMANHO_LOTE = 50
+WORKERS = 4
+POR_SEGUNDO = 10.0
+
+
+def enfileirar(mensagens) -> int:
+    """
+    Grava as mensagens (chave, assunto, mensagem, remetente, destinatários)
+    na transação corrente; chaves já existentes são ignoradas. Devolve
+    quantas entraram.
+    """
+    mensagens = list(mensagens)
+    chaves = [m[0] for m in mensagens]
+    existentes = set(EmailPendente.objects.filter(chave__in=chaves).values_list("chave", flat=True))
+    novos = [
+        EmailPendente(
+            chave=chave, assunto=assunto, mensagem=mensagem,
+            remetente=remetente or settings.DEFAULT_FROM_EMAIL, destinatarios=list(destinatarios),
+        )
+        for chave, assunto, mensagem, remetente, destinatarios in mensagens
+        if chave not in existentes
+    ]
+    # ignore_conflicts: outra transação pode ter gravado a mesma chave agora
+    EmailPendente.objects.bulk_create(novos, ignore_conflicts=True)
+    return len(novos)
+
+
+def espera(tentativas: int) -> timedelta:
+    return min(BACKOFF_BASE * (2 ** max(tentativas - 1, 0)), BACKOFF_MAX)
+
+
+class LimiteTaxa:
+    """No máximo `por_segundo` liberações por segundo, compartilhado entre threads."""
+
+    def __init__(self, por_segundo: float):
+        self.intervalo = 1.0 / por_segundo if por_segundo > 0 else 0.0
+        self._proximo = time.monotonic()
+        self._trava = threading.Lock()
+
+    def esperar(self) -> None:
+        if not self.intervalo:
+            return
+        with self._trava:
+            agora = time.monotonic()
+            vez = max(self._proximo, agora)
+            self._proximo = vez + self.intervalo
+        if vez > agora:
+            time.sleep(vez - agora)
+
+
+@dataclass
+class Resultado:
+    enviados: int = 0
+    falhas: int = 0
+    duracao: float = 0.0
+
+    @property
+    def por_segundo(self) -> float:
+        return self.enviados / self.duracao if self.duracao else 0.0
+
+
+class _Remetente:
+    """Envia no pool; uma conexão de e-mail por thread, reaberta após erro."""
+
+    def __init__(self, limite: LimiteTaxa):
+        self.limite = limite
+        self._local = threading.local()
+        self._conexoes = []
+        self._trava = threading.Lock()
+
+    def _conexao(self):
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None:
+            conexao = get_connection(fail_silently=False)
+            conexao.open()
+            self._local.conexao = conexao
+            with self._trava:
+                self._conexoes.append(conexao)
+        return conexao
+
+    def enviar(self, email: EmailPendente) -> str | None:
+        """None se saiu; a mensagem do erro caso contrário."""
+        self.limite.esperar()
+        try:
+            EmailMessage(
+                email.assunto, email.mensagem, email.remetente, email.destinatarios,
+                connection=self._conexao(),
+            ).send()
+        except Exception as e:
+            conexao = getattr(self._local, "conexao", None)
+            self._local.conexao = None
+            if conexao is not None:
+                try:
+                    conexao.close()
+                except Exception:
+                    pass
+            return f"{type(e).__name__}: {e}"
+        return None
+
+    def fechar(self) -> None:
+        for conexao in self._conexoes:
+            try:
+                conexao.close()
+            except Exception:
+                pass
+
+
+def _reservar(agora, tamanho_lote: int) -> list[EmailPendente]:
+    elegiveis = Q(status="pendente") | Q(status="enviando")  # "enviando" só com a reserva vencida
+    with transaction.atomic():
+        ids = list(
+            EmailPendente.objects.select_for_update(skip_locked=True)
+            .filter(elegiveis, proxima_tentativa__lte=agora)
+            .order_by("proxima_tentativa", "id")
+            .values_list("id", flat=True)[:tamanho_lote]
+        )
+        if not ids:
+            return []
+        EmailPendente.objects.filter(id__in=ids).update(status="enviando", proxima_tentativa=agora + RESERVA)
+    return list(EmailPendente.objects.filter(id__in=ids).order_by("id"))
+
+
+def processar(
+    *, tamanho_lote: int = TAMANHO_LOTE, workers: int = WORKERS, por_segundo: float = POR_SEGUNDO,
+    parar: threading.Event | None = None,
+) -> Resultado:
+    """Esvazia a fila vencida (lote a lote) até acabar ou `parar` ser sinalizado."""
+    resultado = Resultado()
+    inicio = time.monotonic()
+    remetente = _Remetente(LimiteTaxa(por_segundo))
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="emails") as pool:
+            while not (parar and parar.is_set()):
+                lote = _reservar(timezone.now(), tamanho_lote)
+                if not lote:
+                    break
+                erros = list(pool.map(remetente.enviar, lote))
+                _registrar(lote, erros, resultado)
+    finally:
+        remetente.fechar()
+    resultado.duracao = time.monotonic() - inicio
+    return resultado
+
+
+def _registrar(lote: list[EmailPendente], erros: list[str | None], resultado: Resultado) -> None:
+    agora = timezone.now()
+    enviados = [e.id for e, erro in zip(lote, erros) if erro is None]
+    if enviados:
+        EmailPendente.objects.filter(id__in=enviados).update(status="enviado", enviado_em=agora, ultimo_erro="")
+    resultado.enviados += len(enviados)
+    for email, erro in zip(lote, erros):
+        if erro is None:
+            continue
+        resultado.falhas += 1
+        tentativas = email.tentativas + 1
+        EmailPendente.objects.filter(id=email.id).update(
+            status="falhou" if tentativas >= MAX_TENTATIVAS else "pendente",
+            tentativas=tentativas,
+            proxima_tentativa=agora + espera(tentativas),
+            ultimo_erro=erro[:1000],
+        )
+
+
+def situacao() -> dict:
+    """Profundidade da fila: contagem por status e idade do pendente mais antigo."""
+    agora = timezone.now()
+    contagem = dict(EmailPendente.objects.values_list("status").annotate(n=Count("id")).order_by())
+    mais_antigo = EmailPendente.objects.filter(status__in=("pendente", "enviando")).aggregate(m=Min("criado_em"))["m"]
+    return {
+        **{st: contagem.get(st, 0) for st, _ in EmailPendente.STATUS_CHOICES},
+        "vencidos": EmailPendente.objects.filter(status="pendente", proxima_tentativa__lte=agora).count(),
+        "idade_mais_antigo": (agora - mais_antigo).total_seconds() if mais_antigo else 0.0,
+    }
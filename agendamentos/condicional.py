@@ -0,0 +1,86 @@
+# agendamentos/condicional.py
+"""
+GET condicional (ETag / Last-Modified) para as APIs de calendário e horários.
+
+Uma versão global da agenda fica no cache e é trocada a cada gravação que
+muda o que essas APIs devolvem (ver signals.py). As funções abaixo rodam no
+decorator `condition` ANTES da view: se nada mudou, o 304 sai sem nenhuma
+consulta ao ORM e sem serializar nada.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timezone as dt_timezone
+import hashlib
+import time
+import uuid
+
+from django.core.cache import cache
+from django.utils import timezone
+
+CHAVE_VERSAO = "agenda:alteracao"
+CHAVE_RESERVAS_ATE = "agenda:reservas_ate"
+
+
+def versao_agenda() -> tuple[str, float]:
+    """(token, instante da última alteração em epoch)."""
+    atual = cache.get(CHAVE_VERSAO)
+    if atual is None:
+        cache.add(CHAVE_VERSAO, (uuid.uuid4().hex[:12], time.time()), None)
+        atual = cache.get(CHAVE_VERSAO) or ("", time.time())
+    return atual
+
+
+def marcar_alteracao() -> None:
+    cache.set(CHAVE_VERSAO, (uuid.uuid4().hex[:12], time.time()), None)
+
+
+def registrar_reserva_temporaria(expira_em: datetime) -> None:
+    """Enquanto houver reserva temporária, os horários mudam sozinhos ao expirar."""
+    ate = cache.get(CHAVE_RESERVAS_ATE) or 0
+    cache.set(CHAVE_RESERVAS_ATE, max(ate, expira_em.timestamp()), None)
+
+
+def _ultima_alteracao(dependente_do_relogio: bool) -> tuple[str, float]:
+    token, instante = versao_agenda()
+    if dependente_do_relogio:
+        # troca a cada minuto: horários do dia passam, reservas expiram
+        minuto = int(time.time() // 60) * 60
+        token, instante = f"{token}:{minuto}", max(instante, minuto)
+    return token, instante
+
+
+def _inclui_hoje(request) -> bool:
+    hoje = timezone.localdate().isoformat()
+    if request.GET.get("data"):
+        return request.GET["data"] == hoje
+    return request.GET.get("inicio", "") <= hoje <= request.GET.get("fim", "")
+
+
+def _horarios_dependem_do_relogio(request) -> bool:
+    return _inclui_hoje(request) or (cache.get(CHAVE_RESERVAS_ATE) or 0) > time.time()
+
+
+def _etag(request, token: str) -> str:
+    usuario = request.user
+    chave = f"{token}|{usuario.pk}|{usuario.is_staff}|{usuario.email}|{request.get_full_path()}"
+    return hashlib.sha1(chave.encode()).hexdigest()
+
+
+def _em_datetime(instante: float) -> datetime:
+    return datetime.fromtimestamp(instante, tz=dt_timezone.utc)
+
+
+def etag_agendamentos(request, *args, **kwargs) -> str:
+    return _etag(request, versao_agenda()[0])
+
+
+def modificado_agendamentos(request, *args, **kwargs) -> datetime:
+    return _em_datetime(versao_agenda()[1])
+
+
+def etag_horarios(request, *args, **kwargs) -> str:
+    return _etag(request, _ultima_alteracao(_horarios_dependem_do_relogio(request))[0])
+
+
+def modificado_horarios(request, *args, **kwargs) -> datetime:
+    return _em_datetime(_ultima_alteracao(_horarios_dependem_do_relogio(request))[1])
@@ -0,0 +1,364 @@
+# agendamentos/disponibilidade.py
+"""
+Motor de disponibilidade da agenda.
+
+Carrega os agendamentos ativos do dia com UMA consulta (cada um com a
+duração do seu próprio serviço) e calcula livre/ocupado de todos os slots
+em memória, com uma varredura sobre os intervalos ordenados. O resultado
+fica no cache do Django por (dia, duração, profissionais), versionado por dia.
+
+Recursos: cada profissional é uma agenda independente; um slot está livre se
+ALGUM dos profissionais candidatos estiver livre. Sem profissionais
+cadastrados vale a agenda única de antes (SEM_PROFISSIONAL). Agendamentos sem
+profissional (legados) ocupam todos.
+"""
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta
+import heapq
+import uuid
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .grade import obter_grade
+from .models import DURACAO_PADRAO_MINUTOS, Agendamento, ReservaTemporaria
+
+# Status que ocupam a agenda
+STATUS_ATIVOS = ("Pendente", "Confirmado")
+
+DURACAO_PADRAO = DURACAO_PADRAO_MINUTOS  # serviço não informado / removido
+MAX_DIAS_PERIODO = 62   # limite da consulta por período (visão mensal + folga)
+DURACAO_MAXIMA = timedelta(days=1)  # nenhum atendimento dura mais que isso
+SEM_PROFISSIONAL = (None,)          # agenda única (nenhum profissional cadastrado)
+
+_IGNORAR = object()
+
+Ocupacao = tuple[datetime, datetime, "int | None"]  # (início, fim, profissional_id)
+
+
+def _aware(d: date, t: time) -> datetime:
+    return timezone.make_aware(datetime.combine(d, t))
+
+
+def filtro_sobreposicao(inicio: datetime, fim: datetime) -> dict:
+    """
+    início < fim_pedido E fim > início_pedido, com limite inferior em
+    `data_hora` para que a busca seja uma faixa do índice (data_hora, data_hora_fim).
+    """
+    return {
+        "data_hora__gte": inicio - DURACAO_MAXIMA,
+        "data_hora__lt": fim,
+        "data_hora_fim__gt": inicio,
+    }
+
+
+def carregar_agendamentos(inicio: datetime, fim: datetime) -> list[Ocupacao]:
+    """
+    (início, fim, profissional) dos agendamentos ativos que tocam [inicio, fim),
+    ordenados pelo início. Uma única consulta.
+    """
+    return list(
+        Agendamento.objects.filter(status__in=STATUS_ATIVOS, **filtro_sobreposicao(inicio, fim))
+        .order_by("data_hora")
+        .values_list("data_hora", "data_hora_fim", "profissional_id")
+    )
+
+
+def carregar_reservas_temporarias(
+    inicio: datetime,
+    fim: datetime,
+    ignorar_usuario=None,
+) -> list[tuple[datetime, datetime, "int | None", datetime]]:
+    """(início, fim, profissional, expira_em) das reservas temporárias ainda válidas."""
+    qs = ReservaTemporaria.objects.filter(expira_em__gt=timezone.now(), **filtro_sobreposicao(inicio, fim))
+    if ignorar_usuario is not None:
+        qs = qs.exclude(usuario=ignorar_usuario)
+    return list(qs.values_list("data_hora", "data_hora_fim", "profissional_id", "expira_em"))
+
+
+def carregar_ocupacoes(
+    inicio: datetime,
+    fim: datetime,
+    ignorar_usuario=None,
+) -> list[Ocupacao]:
+    """Agendamentos ativos + reservas temporárias, ordenados pelo início."""
+    ocupacoes = carregar_agendamentos(inicio, fim)
+    ocupacoes += [(ini, termino, prof) for ini, termino, prof, _ in carregar_reservas_temporarias(inicio, fim, ignorar_usuario)]
+    ocupacoes.sort(key=lambda o: o[0])
+    return ocupacoes
+
+
+def ocupacoes_do_dia(data_sel: date, ignorar_usuario=None) -> list[Ocupacao]:
+    inicio = _aware(data_sel, time(0, 0))
+    return carregar_ocupacoes(inicio, inicio + timedelta(days=1), ignorar_usuario)
+
+
+def _recurso_ocupado(profissional_id, recursos):
+    """Qual agenda a ocupação prende: None = todas; _IGNORAR = nenhuma candidata."""
+    if recursos == SEM_PROFISSIONAL or profissional_id is None:
+        return None
+    if profissional_id in recursos:
+        return profissional_id
+    return _IGNORAR
+
+
+def varrer_slots(
+    data_sel: date,
+    duracao: int,
+    ocupacoes: list[Ocupacao],
+    recursos: tuple = SEM_PROFISSIONAL,
+) -> list[dict]:
+    """
+    Varre os slots do dia (grade compilada) contra `ocupacoes` (ordenadas pelo
+    início), contando quantas ocupações prendem cada profissional candidato.
+
+    Como início e fim dos slots só crescem, cada agendamento entra uma vez
+    no heap de "ativos" (pelo fim) e sai uma vez: O((n + s) log n + s·p),
+    numa única passada para todos os profissionais.
+    """
+    dur = timedelta(minutes=duracao)
+    meia_noite = _aware(data_sel, time(0, 0))
+
+    por_recurso = {r: 0 for r in recursos if r is not None}
+    geral = 0  # ocupações que prendem todas as agendas
+    slots = []
+    ativos: list = []  # heap (fim, seq, recurso) dos agendamentos já iniciados
+    i = 0
+    for minutos, hora in obter_grade().inicios(data_sel, duracao):
+        atual = meia_noite + timedelta(minutes=minutos)
+        fim_slot = atual + dur
+        # entra quem começa antes do fim do slot
+        while i < len(ocupacoes) and ocupacoes[i][0] < fim_slot:
+            ini, termino, prof = ocupacoes[i]
+            recurso = _recurso_ocupado(prof, recursos)
+            if recurso is not _IGNORAR:
+                heapq.heappush(ativos, (termino, i, recurso))
+                if recurso is None:
+                    geral += 1
+                else:
+                    por_recurso[recurso] += 1
+            i += 1
+        # sai quem terminou até o início do slot
+        while ativos and ativos[0][0] <= atual:
+            _, _, recurso = heapq.heappop(ativos)
+            if recurso is None:
+                geral -= 1
+            else:
+                por_recurso[recurso] -= 1
+
+        if not recursos:
+            livre = False
+        elif recursos == SEM_PROFISSIONAL:
+            livre = geral == 0
+        else:
+            livre = geral == 0 and any(n == 0 for n in por_recurso.values())
+        slots.append({"hora": hora, "ocupado": not livre})
+    return slots
+
+
+def remover_passados(data_sel: date, slots: list[dict], agora: datetime | None = None) -> list[dict]:
+    """Bloqueia o passado do dia atual (feito na leitura, fora do cache)."""
+    agora = timezone.localtime(agora or timezone.now())
+    if data_sel != agora.date():
+        return slots
+    hora_atual = agora.strftime("%H:%M")
+    return [s for s in slots if s["hora"] > hora_atual]
+
+
+def calcular_slots(
+    data_sel: date,
+    duracao: int,
+    ocupacoes: list[Ocupacao],
+    agora: datetime | None = None,
+    recursos: tuple = SEM_PROFISSIONAL,
+) -> list[dict]:
+    return remover_passados(data_sel, varrer_slots(data_sel, duracao, ocupacoes, recursos), agora)
+
+
+# ============================
+# CACHE VERSIONADO
+# ============================
+# Chave: (geração, dia, versão do dia, duração). Gravar/excluir um
+# agendamento troca a versão do dia (ver signals.py) e alterar serviços troca
+# a geração; entradas antigas simplesmente deixam de ser lidas e expiram.
+# A versão é lida ANTES de consultar o banco, e é trocada de novo após o
+# commit, então um cálculo feito com dados antigos nunca fica sob a versão
+# vigente.
+
+CACHE_PREFIXO = "disp"
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _chave_versao(data_sel: date) -> str:
+    return f"{CACHE_PREFIXO}:v:{data_sel.isoformat()}"
+
+
+def _chave_geracao() -> str:
+    return f"{CACHE_PREFIXO}:geracao"
+
+
+def _novo_token() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def _versoes(dias: list[date]) -> dict[date, str]:
+    chaves = {_chave_versao(d): d for d in dias}
+    chaves[_chave_geracao()] = None
+    atuais = cache.get_many(list(chaves))
+    faltando = [k for k in chaves if k not in atuais]
+    if faltando:
+        for chave in faltando:
+            cache.add(chave, _novo_token(), None)
+        atuais.update(cache.get_many(faltando))
+    geracao = atuais.get(_chave_geracao(), "")
+    return {d: f"{geracao}:{atuais.get(k, '')}" for k, d in chaves.items() if d is not None}
+
+
+def _chave_slots(data_sel: date, versao: str, duracao: int, recursos: tuple) -> str:
+    agendas = "-".join(str(r) for r in recursos) or "nenhum"
+    return f"{CACHE_PREFIXO}:slots:{data_sel.isoformat()}:{versao}:{duracao}:{agendas}"
+
+
+def invalidar_dia(data_sel: date) -> None:
+    cache.set(_chave_versao(data_sel), _novo_token(), None)
+
+
+def invalidar_tudo() -> None:
+    cache.set(_chave_geracao(), _novo_token(), None)
+
+
+def _dias_tocados(inicio: datetime, fim: datetime) -> list[date]:
+    dia = timezone.localtime(inicio).date()
+    ultimo = timezone.localtime(fim - timedelta(microseconds=1)).date()
+    dias = [dia]
+    while dia < ultimo:
+        dia += timedelta(days=1)
+        dias.append(dia)
+    return dias
+
+
+def slots_do_dia(
+    data_sel: date,
+    duracao: int = DURACAO_PADRAO,
+    recursos: tuple = SEM_PROFISSIONAL,
+    ignorar_usuario=None,
+) -> list[dict]:
+    return slots_do_periodo(data_sel, data_sel, duracao, recursos, ignorar_usuario)[data_sel]
+
+
+def slots_do_periodo(
+    inicio: date,
+    fim: date,
+    duracao: int = DURACAO_PADRAO,
+    recursos: tuple = SEM_PROFISSIONAL,
+    ignorar_usuario=None,
+) -> dict[date, list[dict]]:
+    """
+    Slots de cada dia em [inicio, fim] (inclusive). Dias em cache não tocam
+    o banco; os demais saem de UMA consulta cobrindo a janela que falta, com
+    os agendamentos distribuídos por dia local.
+
+    O valor em cache é o mesmo para todos e conta todas as reservas
+    temporárias; com `ignorar_usuario`, os dias em que ele segura um horário
+    são recalculados sem a reserva dele (fora do cache).
+    """
+    dias = [inicio + timedelta(days=i) for i in range((fim - inicio).days + 1)]
+    chaves = {d: _chave_slots(d, v, duracao, recursos) for d, v in _versoes(dias).items()}
+    em_cache = cache.get_many(list(chaves.values()))
+
+    faltando = [d for d in dias if chaves[d] not in em_cache]
+    calculados = {}
+    agora = timezone.now()
+    if faltando:
+        janela = (
+            _aware(faltando[0], time(0, 0)),
+            _aware(faltando[-1] + timedelta(days=1), time(0, 0)),
+        )
+        por_dia: dict[date, list[Ocupacao]] = {}
+        for ocupacao in carregar_agendamentos(*janela):
+            for dia in _dias_tocados(ocupacao[0], ocupacao[1]):
+                por_dia.setdefault(dia, []).append(ocupacao)
+        # dias com reserva temporária expiram do cache junto com a reserva
+        expira: dict[date, datetime] = {}
+        for ini, termino, prof, expira_em in carregar_reservas_temporarias(*janela):
+            for dia in _dias_tocados(ini, termino):
+                por_dia.setdefault(dia, []).append((ini, termino, prof))
+                expira[dia] = min(expira_em, expira.get(dia, expira_em))
+
+        sem_reserva = {}
+        for dia in faltando:
+            ocupacoes = sorted(por_dia.get(dia, []), key=lambda o: o[0])
+            calculados[chaves[dia]] = slots = varrer_slots(dia, duracao, ocupacoes, recursos)
+            if dia in expira:
+                timeout = max(1, int((expira[dia] - agora).total_seconds()))
+                cache.set(chaves[dia], slots, min(timeout, CACHE_TIMEOUT))
+            else:
+                sem_reserva[chaves[dia]] = slots
+        cache.set_many(sem_reserva, CACHE_TIMEOUT)
+
+    resultado = {}
+    for dia in dias:
+        chave = chaves[dia]
+        slots = em_cache[chave] if chave in em_cache else calculados[chave]
+        resultado[dia] = remover_passados(dia, slots, agora)
+    if ignorar_usuario is not None:
+        for dia in _dias_com_reserva_propria(inicio, fim, ignorar_usuario, agora):
+            ocupacoes = ocupacoes_do_dia(dia, ignorar_usuario)
+            resultado[dia] = remover_passados(dia, varrer_slots(dia, duracao, ocupacoes, recursos), agora)
+    return resultado
+
+
+def _dias_com_reserva_propria(inicio: date, fim: date, usuario, agora: datetime) -> set[date]:
+    janela = (_aware(inicio, time(0, 0)), _aware(fim + timedelta(days=1), time(0, 0)))
+    reservas = ReservaTemporaria.objects.filter(
+        usuario=usuario, expira_em__gt=agora, **filtro_sobreposicao(*janela)
+    ).values_list("data_hora", "data_hora_fim")
+    return {dia for ini, termino in reservas for dia in _dias_tocados(ini, termino) if inicio <= dia <= fim}
+
+
+def escolher_profissional(
+    inicio: datetime,
+    duracao: int,
+    recursos: tuple = SEM_PROFISSIONAL,
+    ocupacoes: list[Ocupacao] | None = None,
+    ignorar_usuario=None,
+) -> tuple[bool, "int | None"]:
+    """
+    (livre, profissional_id) para [inicio, inicio + duracao): o primeiro
+    candidato de `recursos` sem sobreposição. Sem `ocupacoes`, lê do banco só
+    o que sobrepõe o intervalo (faixa indexada, uma consulta por tabela).
+    """
+    fim = inicio + timedelta(minutes=duracao)
+    if ocupacoes is None:
+        ocupacoes = carregar_ocupacoes(inicio, fim, ignorar_usuario)
+
+    presos = set()
+    for ini, termino, prof in ocupacoes:
+        if not (ini < fim and termino > inicio):
+            continue
+        recurso = _recurso_ocupado(prof, recursos)
+        if recurso is None:
+            return False, None
+        presos.add(recurso)
+
+    for recurso in recursos:
+        if recurso not in presos:
+            return True, recurso
+    return False, None
+
+
+def tem_conflito(
+    inicio: datetime,
+    duracao: int,
+    ocupacoes: list[Ocupacao] | None = None,
+    ignorar_usuario=None,
+    recursos: tuple = SEM_PROFISSIONAL,
+) -> bool:
+    """
+    True se nenhum profissional de `recursos` está livre em
+    [inicio, inicio + duracao) — considerando agendamentos ativos e reservas
+    temporárias (exceto as do próprio `ignorar_usuario`).
+    """
+    livre, _ = escolher_profissional(inicio, duracao, recursos, ocupacoes, ignorar_usuario)
+    return not livre
@@ -0,0 +1,152 @@
+# agendamentos/estatisticas.py
+"""
+Séries para os gráficos de stats: períodos prontos (7d, 30d, 12s, 12m) ou
+personalizados, agrupados por dia, semana ou mês.
+
+O agrupamento é feito no banco (TruncWeek/TruncMonth sobre o resumo diário)
+e os buckets vazios são preenchidos em Python. Cada série fica em cache por
+(início, fim, granularidade) com as versões dos meses cobertos na chave
+(resumo.versao_periodo): gravar um agendamento só invalida o que o inclui.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+
+from . import resumo
+from .models import ResumoDiario
+
+GRANULARIDADES = ("dia", "semana", "mes")
+STATUS = ("Confirmado", "Realizado", "Cancelado", "Pendente")
+MAX_DIAS_PERSONALIZADO = 366 * 3
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+class PeriodoInvalido(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Periodo:
+    inicio: date
+    fim: date
+    granularidade: str
+
+
+def _inicio_do_bucket(dia: date, granularidade: str) -> date:
+    if granularidade == "semana":
+        return dia - timedelta(days=dia.weekday())
+    if granularidade == "mes":
+        return dia.replace(day=1)
+    return dia
+
+
+def _proximo_bucket(dia: date, granularidade: str) -> date:
+    if granularidade == "semana":
+        return dia + timedelta(days=7)
+    if granularidade == "mes":
+        return (dia + timedelta(days=32)).replace(day=1)
+    return dia + timedelta(days=1)
+
+
+def _granularidade_padrao(inicio: date, fim: date) -> str:
+    dias = (fim - inicio).days + 1
+    if dias <= 62:
+        return "dia"
+    return "semana" if dias <= 366 else "mes"
+
+
+def resolver_periodo(nome: str, params=None, hoje: date | None = None) -> Periodo:
+    """
+    "7d" | "30d" | "12s" | "12m" | "personalizado" (com ?inicio=&fim= e
+    ?granularidade= opcional). PeriodoInvalido para o resto.
+    """
+    params = params or {}
+    hoje = hoje or timezone.localdate()
+    if nome == "7d":
+        return Periodo(hoje - timedelta(days=6), hoje, "dia")
+    if nome == "30d":
+        return Periodo(hoje - timedelta(days=29), hoje, "dia")
+    if nome == "12s":
+        segunda = _inicio_do_bucket(hoje, "semana")
+        return Periodo(segunda - timedelta(weeks=11), segunda + timedelta(days=6), "semana")
+    if nome == "12m":
+        inicio = hoje.replace(day=1)
+        for _ in range(11):
+            inicio = (inicio - timedelta(days=1)).replace(day=1)
+        return Periodo(inicio, _proximo_bucket(hoje.replace(day=1), "mes") - timedelta(days=1), "mes")
+    if nome == "personalizado":
+        try:
+            inicio = date.fromisoformat(params.get("inicio", ""))
+            fim = date.fromisoformat(params.get("fim", ""))
+        except ValueError:
+            raise PeriodoInvalido("Informe inicio e fim no formato AAAA-MM-DD.")
+        if fim < inicio:
+            raise PeriodoInvalido("fim deve ser posterior a inicio.")
+        if (fim - inicio).days + 1 > MAX_DIAS_PERSONALIZADO:
+            raise PeriodoInvalido(f"Período máximo: {MAX_DIAS_PERSONALIZADO} dias.")
+        granularidade = params.get("granularidade") or _granularidade_padrao(inicio, fim)
+        if granularidade not in GRANULARIDADES:
+            raise PeriodoInvalido(f"granularidade deve ser uma de: {', '.join(GRANULARIDADES)}.")
+        return Periodo(inicio, fim, granularidade)
+    raise PeriodoInvalido(f"Período desconhecido: {nome}")
+
+
+def _agrupar(periodo: Periodo) -> list[dict]:
+    qs = ResumoDiario.objects.filter(data__gte=periodo.inicio, data__lte=periodo.fim)
+    if periodo.granularidade == "semana":
+        qs = qs.annotate(bucket=TruncWeek("data"))
+    elif periodo.granularidade == "mes":
+        qs = qs.annotate(bucket=TruncMonth("data"))
+    else:
+        qs = qs.annotate(bucket=F("data"))
+    return list(
+        qs.values("bucket", "status").annotate(n=Sum("quantidade"), receita=Sum("receita")).order_by()
+    )
+
+
+def _montar(periodo: Periodo, linhas: list[dict]) -> dict:
+    buckets = []
+    atual = _inicio_do_bucket(periodo.inicio, periodo.granularidade)
+    while atual <= periodo.fim:
+        buckets.append(atual)
+        atual = _proximo_bucket(atual, periodo.granularidade)
+    indice = {b: i for i, b in enumerate(buckets)}
+
+    series = {st: [0] * len(buckets) for st in STATUS}
+    total = [0] * len(buckets)
+    receita = [0.0] * len(buckets)
+    for linha in linhas:
+        i = indice.get(linha["bucket"])
+        if i is None:
+            continue
+        if linha["status"] in series:
+            series[linha["status"]][i] += linha["n"]
+        total[i] += linha["n"]
+        if linha["status"] != "Cancelado":
+            receita[i] += float(linha["receita"] or 0)
+
+    return {
+        "inicio": periodo.inicio.isoformat(),
+        "fim": periodo.fim.isoformat(),
+        "granularidade": periodo.granularidade,
+        "rotulos": [b.isoformat() for b in buckets],
+        "total": total,
+        "series": {st.lower(): valores for st, valores in series.items()},
+        "receita": [round(r, 2) for r in receita],
+    }
+
+
+def serie(periodo: Periodo) -> dict:
+    versao = resumo.versao_periodo(periodo.inicio, periodo.fim)
+    chave = f"stats:{periodo.inicio}:{periodo.fim}:{periodo.granularidade}:{versao}"
+    dados = cache.get(chave)
+    if dados is None:
+        dados = _montar(periodo, _agrupar(periodo))
+        cache.set(chave, dados, CACHE_TIMEOUT)
+    return dados
@@ -0,0 +1,167 @@
+# agendamentos/eventos.py
+"""
+Canal de eventos em tempo real (Server-Sent Events) para os navegadores.
+
+Cada aba aberta é uma Conexao com a sua fila; uma única Central por processo
+distribui os eventos:
+
+- gravações de Agendamento (signals.py) publicam "agendamento" após o commit;
+- um único agendador (thread) faz, a cada INTERVALO_LEMBRETES, UMA consulta
+  pelos próximos agendamentos de todos os clientes conectados e avisa
+  "seu horário é em N minutos" — a carga no banco não cresce com as abas.
+
+A Central vive no processo: rode o ASGI com um worker (ver app.yaml). Só o
+ASGI segura uma conexão aberta sem prender uma thread: no WSGI (runserver,
+wsgi.py) o StreamingHttpResponse consumiria o fluxo infinito até o fim. Lá a
+view do canal responde 204 — o EventSource para de reconectar — e o
+base.html volta a consultar api_notificacao_proximo_agendamento.
+"""
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from datetime import timedelta
+import json
+import logging
+import threading
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_LEMBRETES = 60  # segundos
+ANTECEDENCIA_LEMBRETE = timedelta(minutes=30)
+KEEPALIVE = 25  # segundos; mantém proxies sem fechar a conexão ociosa
+TAMANHO_FILA = 50
+STATUS_LEMBRETE = ("Pendente", "Confirmado")
+
+
+@dataclass(eq=False)
+class Conexao:
+    cliente_id: int | None
+    staff: bool
+    loop: asyncio.AbstractEventLoop
+    fila: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(TAMANHO_FILA))
+    avisados: set = field(default_factory=set)
+
+    def enviar(self, evento: dict) -> None:
+        """Chamado no loop da conexão; aba lenta perde eventos em vez de acumular."""
+        try:
+            self.fila.put_nowait(evento)
+        except asyncio.QueueFull:
+            pass
+
+
+class Central:
+    def __init__(self):
+        self._conexoes: set[Conexao] = set()
+        self._trava = threading.Lock()
+        self._acordar = threading.Event()
+        self._agendador: threading.Thread | None = None
+
+    # ---------- conexões ----------
+    def conectar(self, cliente_id: int | None, staff: bool) -> Conexao:
+        conexao = Conexao(cliente_id, staff, asyncio.get_running_loop())
+        with self._trava:
+            self._conexoes.add(conexao)
+            if self._agendador is None or not self._agendador.is_alive():
+                self._agendador = threading.Thread(target=self._rodar, name="eventos-agendador", daemon=True)
+                self._agendador.start()
+        self._acordar.set()  # lembrete imediato para a aba nova
+        return conexao
+
+    def desconectar(self, conexao: Conexao) -> None:
+        with self._trava:
+            self._conexoes.discard(conexao)
+
+    def _destinos(self, cliente_id: int | None) -> list[Conexao]:
+        with self._trava:
+            return [c for c in self._conexoes if c.staff or (cliente_id and c.cliente_id == cliente_id)]
+
+    # ---------- publicação (qualquer thread) ----------
+    def publicar(self, evento: dict, cliente_id: int | None) -> None:
+        for conexao in self._destinos(cliente_id):
+            try:
+                conexao.loop.call_soon_threadsafe(conexao.enviar, evento)
+            except RuntimeError:  # loop já encerrado: a aba caiu
+                self.desconectar(conexao)
+
+    # ---------- agendador ----------
+    def _rodar(self) -> None:
+        while True:
+            self._acordar.wait(INTERVALO_LEMBRETES)
+            self._acordar.clear()
+            with self._trava:
+                if not self._conexoes:
+                    self._agendador = None
+                    return
+            try:
+                self.verificar_lembretes()
+            except Exception:
+                logger.exception("Falha ao verificar lembretes")
+            finally:
+                close_old_connections()
+
+    def verificar_lembretes(self) -> None:
+        with self._trava:
+            conexoes = [c for c in self._conexoes if c.cliente_id]
+        if not conexoes:
+            return
+        proximos = proximos_agendamentos({c.cliente_id for c in conexoes})
+        agora = timezone.now()
+        for conexao in conexoes:
+            ag = proximos.get(conexao.cliente_id)
+            if not ag or ag["id"] in conexao.avisados:
+                continue
+            conexao.avisados.add(ag["id"])
+            minutos = max(int((ag["data_hora"] - agora).total_seconds() // 60), 0)
+            evento = {
+                "tipo": "lembrete",
+                "agendamento_id": ag["id"],
+                "minutos": minutos,
+                "mensagem": f"Seu próximo agendamento de {ag['servico__nome'] or 'Serviço'} é em {minutos} minutos.",
+            }
+            try:
+                conexao.loop.call_soon_threadsafe(conexao.enviar, evento)
+            except RuntimeError:
+                self.desconectar(conexao)
+
+
+def proximos_agendamentos(clientes_ids) -> dict[int, dict]:
+    """Próximo agendamento (na antecedência do lembrete) de cada cliente, numa consulta."""
+    from .models import Agendamento
+
+    agora = timezone.now()
+    qs = (
+        Agendamento.objects.filter(
+            cliente_id__in=clientes_ids,
+            status__in=STATUS_LEMBRETE,
+            data_hora__gt=agora,
+            data_hora__lt=agora + ANTECEDENCIA_LEMBRETE,
+        )
+        .order_by("data_hora")
+        .values("id", "cliente_id", "data_hora", "servico__nome")
+    )
+    proximos = {}
+    for ag in qs:
+        proximos.setdefault(ag["cliente_id"], ag)
+    return proximos
+
+
+def evento_agendamento(ag, acao: str) -> dict:
+    return {
+        "tipo": "agendamento",
+        "acao": acao,  # "criado" | "status" | "remarcado"
+        "id": ag.pk,
+        "status": ag.status,
+        "inicio": timezone.localtime(ag.data_hora).isoformat(),
+        "servico": ag.servico.nome if ag.servico_id and ag.servico else "Serviço",
+    }
+
+
+def formatar_sse(evento: dict) -> str:
+    return f"event: {evento['tipo']}\ndata: {json.dumps(evento, ensure_ascii=False)}\n\n"
+
+
+central = Central()
@@ -1,7 +1,7 @@
 # agendamentos/forms.py
 from django import forms
 from django.contrib.auth.models import User
-from .models import Cliente, Servico, Agendamento
+from .models import Cliente, Servico, Agendamento, ConfiguracaoAgenda, HorarioFuncionamento
 
 # ===========================
 # CLIENTE
@@ -23,8 +23,9 @@ class ClienteForm(forms.ModelForm):
 class ServicoForm(forms.ModelForm):
     class Meta:
         model = Servico
-        fields = ['nome', 'descricao', 'duracao', 'preco', 'imagem']
+        fields = ['nome', 'descricao', 'duracao', 'preco', 'imagem', 'profissionais']
         widgets = {
+            'profissionais': forms.CheckboxSelectMultiple(attrs={'class': 'form-check-input'}),
             'nome': forms.TextInput(attrs={'class': 'form-control'}),
             'descricao': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'duracao': forms.NumberInput(attrs={'class': 'form-control', 'min': 5, 'step': 5}),
@@ -72,8 +73,9 @@ class ServicoForm(forms.ModelForm):
 class AgendamentoForm(forms.ModelForm):
     class Meta:
         model = Agendamento
-        fields = ['cliente', 'servico', 'data_hora', 'status']
+        fields = ['cliente', 'servico', 'profissional', 'data_hora', 'status']
         widgets = {
+            'profissional': forms.Select(attrs={'class': 'form-select'}),
             'cliente': forms.Select(attrs={'class': 'form-select'}),
             'servico': forms.Select(attrs={'class': 'form-select'}),
             'data_hora': forms.DateTimeInput(attrs={'class': 'form-control', 'type': 'datetime-local'}),
@@ -100,18 +102,53 @@ class ProfileUpdateForm(forms.ModelForm):
         fields = ['telefone', 'cpf']
 
 # ===========================
-# CONFIGURAÇÃO (dummy)
+# CONFIGURAÇÃO DA AGENDA
 # ===========================
-class ConfiguracaoForm(forms.Form):
-    duracao_padrao = forms.IntegerField(
-        label="Duração padrão do agendamento (minutos)",
-        min_value=5,
-        initial=60,
-        widget=forms.NumberInput(attrs={'class': 'form-control'})
-    )
-    intervalo = forms.IntegerField(
-        label="Intervalo entre agendamentos (minutos)",
-        min_value=5,
-        initial=30,
-        widget=forms.NumberInput(attrs={'class': 'form-control'})
-    )
+class ConfiguracaoForm(forms.ModelForm):
+    class Meta:
+        model = ConfiguracaoAgenda
+        fields = ['duracao_padrao', 'intervalo', 'lembretes']
+        labels = {
+            'duracao_padrao': "Duração padrão do agendamento (minutos)",
+            'intervalo': "Intervalo entre agendamentos (minutos)",
+            'lembretes': "Lembretes por e-mail (minutos antes, separados por vírgula)",
+        }
+        widgets = {
+            'duracao_padrao': forms.NumberInput(attrs={'class': 'form-control', 'min': 5}),
+            'intervalo': forms.NumberInput(attrs={'class': 'form-control', 'min': 5}),
+            'lembretes': forms.TextInput(attrs={'class': 'form-control', 'placeholder': '1440, 120, 15'}),
+        }
+
+    def clean_lembretes(self):
+        valor = self.cleaned_data.get('lembretes', '')
+        partes = [p.strip() for p in valor.split(',') if p.strip()]
+        if not all(p.isdigit() and int(p) > 0 for p in partes):
+            raise forms.ValidationError("Use números inteiros de minutos separados por vírgula (ex.: 1440, 120, 15).")
+        # normalizado: da maior para a menor antecedência, sem repetições
+        return ",".join(str(m) for m in sorted({int(p) for p in partes}, reverse=True))
+
+    def clean(self):
+        cleaned = super().clean()
+        for campo in ('duracao_padrao', 'intervalo'):
+            if cleaned.get(campo) is not None and cleaned[campo] < 5:
+                self.add_error(campo, "Mínimo de 5 minutos.")
+        return cleaned
+
+
+class HorarioFuncionamentoForm(forms.ModelForm):
+    class Meta:
+        model = HorarioFuncionamento
+        fields = ['dia_semana', 'aberto', 'abre', 'fecha', 'pausa_inicio', 'pausa_fim']
+        widgets = {
+            'dia_semana': forms.HiddenInput(),
+            'aberto': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'abre': forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'}, format='%H:%M'),
+            'fecha': forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'}, format='%H:%M'),
+            'pausa_inicio': forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'}, format='%H:%M'),
+            'pausa_fim': forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'}, format='%H:%M'),
+        }
+
+
+HorarioFuncionamentoFormSet = forms.modelformset_factory(
+    HorarioFuncionamento, form=HorarioFuncionamentoForm, extra=0, can_delete=False
+)
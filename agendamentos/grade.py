@@ -0,0 +1,136 @@
+# agendamentos/grade.py
+"""
+Grade de horários compilada.
+
+A configuração (ConfiguracaoAgenda, HorarioFuncionamento, ExcecaoAgenda) é
+lida do banco uma vez e compilada em memória: janelas de expediente por dia
+da semana / data especial e, sob demanda, a lista de inícios de slot
+(minutos desde 00:00 + rótulo "HH:MM") por duração. Também guarda quais
+profissionais ativos atendem cada serviço. A grade só é recompilada
+quando a versão da configuração no cache muda (ver signals.py).
+"""
+from __future__ import annotations
+
+from datetime import date, time
+import threading
+import uuid
+
+from django.core.cache import cache
+
+from .models import ConfiguracaoAgenda, ExcecaoAgenda, HorarioFuncionamento, Profissional, Servico
+
+# Usado quando nenhum dia da semana foi configurado
+HORARIO_ABRE = time(9, 0)
+HORARIO_FECHA = time(18, 0)
+
+CHAVE_VERSAO = "agenda:config:versao"
+
+Janelas = tuple[tuple[int, int], ...]
+
+
+def _minutos(t: time) -> int:
+    return t.hour * 60 + t.minute
+
+
+class Grade:
+    def __init__(
+        self,
+        intervalo: int,
+        duracao_padrao: int,
+        semana: dict[int, Janelas],
+        excecoes: dict[date, Janelas],
+        profissionais: tuple[int, ...] = (),
+        por_servico: dict[int, tuple[int, ...]] | None = None,
+    ):
+        self.intervalo = intervalo
+        self.duracao_padrao = duracao_padrao
+        self.semana = semana
+        self.excecoes = excecoes
+        self.profissionais = profissionais
+        self.por_servico = por_servico or {}
+        self._inicios: dict[tuple, tuple[tuple[int, str], ...]] = {}
+
+    def recursos(self, servico_id: int | None = None, profissional_id: int | None = None) -> tuple:
+        """
+        Profissionais candidatos (ids). (None,) quando não há profissionais
+        cadastrados (agenda única); () quando ninguém pode atender.
+        """
+        if not self.profissionais:
+            return (None,)
+        candidatos = self.por_servico.get(servico_id) or self.profissionais
+        if profissional_id is not None:
+            return (profissional_id,) if profissional_id in candidatos else ()
+        return candidatos
+
+    def janelas(self, dia: date) -> Janelas:
+        if dia in self.excecoes:
+            return self.excecoes[dia]
+        return self.semana[dia.weekday()]
+
+    def inicios(self, dia: date, duracao: int) -> tuple[tuple[int, str], ...]:
+        """Inícios de slot do dia em que cabe `duracao` sem cruzar pausas."""
+        chave = ("data", dia, duracao) if dia in self.excecoes else ("semana", dia.weekday(), duracao)
+        inicios = self._inicios.get(chave)
+        if inicios is None:
+            lista = []
+            for abre, fecha in self.janelas(dia):
+                m = abre
+                while m + duracao <= fecha:
+                    lista.append((m, f"{m // 60:02d}:{m % 60:02d}"))
+                    m += self.intervalo
+            inicios = self._inicios[chave] = tuple(lista)
+        return inicios
+
+
+def compilar() -> Grade:
+    config = ConfiguracaoAgenda.carregar()
+    padrao = ((_minutos(HORARIO_ABRE), _minutos(HORARIO_FECHA)),)
+    semana: dict[int, Janelas] = {d: padrao for d in range(7)}
+
+    horarios = list(HorarioFuncionamento.objects.all())
+    if horarios:
+        semana = {d: () for d in range(7)}
+        for h in horarios:
+            if not h.aberto:
+                continue
+            if h.pausa_inicio and h.pausa_fim:
+                janelas = ((_minutos(h.abre), _minutos(h.pausa_inicio)), (_minutos(h.pausa_fim), _minutos(h.fecha)))
+            else:
+                janelas = ((_minutos(h.abre), _minutos(h.fecha)),)
+            semana[h.dia_semana] = tuple((a, f) for a, f in janelas if a < f)
+
+    excecoes: dict[date, Janelas] = {}
+    for e in ExcecaoAgenda.objects.all():
+        if e.fechado or not (e.abre and e.fecha):
+            excecoes[e.data] = ()
+        else:
+            excecoes[e.data] = ((_minutos(e.abre), _minutos(e.fecha)),)
+
+    profissionais = tuple(Profissional.objects.filter(ativo=True).values_list("id", flat=True))
+    por_servico: dict[int, tuple[int, ...]] = {}
+    vinculos = Servico.profissionais.through.objects.filter(profissional__ativo=True).order_by("profissional__nome")
+    for servico_id, profissional_id in vinculos.values_list("servico_id", "profissional_id"):
+        por_servico[servico_id] = por_servico.get(servico_id, ()) + (profissional_id,)
+
+    return Grade(config.intervalo or 30, config.duracao_padrao or 60, semana, excecoes, profissionais, por_servico)
+
+
+_compilada: dict = {"versao": None, "grade": None}
+_lock = threading.Lock()
+
+
+def obter_grade() -> Grade:
+    """Grade em memória; recompila só quando a configuração mudou."""
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        cache.add(CHAVE_VERSAO, uuid.uuid4().hex[:12], None)
+        versao = cache.get(CHAVE_VERSAO)
+    with _lock:
+        if _compilada["versao"] != versao or _compilada["grade"] is None:
+            _compilada["grade"] = compilar()
+            _compilada["versao"] = versao
+        return _compilada["grade"]
+
+
+def invalidar_grade() -> None:
+    cache.set(CHAVE_VERSAO, uuid.uuid4().hex[:12], None)
@@ -0,0 +1,224 @@
+# agendamentos/imagens.py
+"""
+Processamento da imagem principal do Servico fora da requisição.
+
+Quando a imagem muda (signals.py compara o nome do arquivo), o serviço fica
+com imagem_status "pendente" e, após o commit, `agendar` entrega o trabalho
+a um pool local de threads. `processar` recorta ao centro e redimensiona
+para TAMANHO x TAMANHO e regrava o arquivo no storage. Salvar o serviço sem
+trocar a imagem (ex.: editar só o texto) não toca no arquivo.
+
+O trabalho leva o nome do arquivo que motivou o pedido: se a imagem for
+trocada de novo antes de o pool chegar nela, o pedido antigo é descartado.
+Pedidos perdidos (processo reiniciado) ficam "pendente" e são retomados pelo
+comando processar_imagens.
+
+Derivadas: cada imagem das páginas públicas (Servico.imagem já processada,
+ServicoImagem, ResultadoAluna, ProvaSocial) ganha, uma vez, versões em
+LARGURAS nos formatos WebP e JPEG (ImagemDerivada, com largura e altura).
+O envio agenda a geração no mesmo pool (signals.py); o comando
+gerar_derivadas cobre as imagens antigas. As views carregam as derivadas da
+página numa consulta (`carregar_derivadas`) e a tag imagem_responsiva monta
+o srcset. Derivadas de imagens trocadas ou removidas saem com
+`remover_derivadas_orfas` (comando coletar_midia).
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import logging
+import os
+import threading
+
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Exists, OuterRef
+
+from .models import ImagemDerivada, ProvaSocial, ResultadoAluna, Servico, ServicoImagem
+
+logger = logging.getLogger(__name__)
+
+TAMANHO = 400
+QUALIDADE = 90
+MAX_WORKERS = 2
+LARGURAS = (320, 640, 1024, 1600)
+QUALIDADE_DERIVADA = 80
+FORMATOS = {"webp": "WEBP", "jpeg": "JPEG"}
+# (model, campo) das imagens exibidas nas páginas públicas
+CAMPOS_PUBLICOS = [(Servico, "imagem"), (ServicoImagem, "imagem"), (ResultadoAluna, "foto"), (ProvaSocial, "imagem")]
+
+_executor: ThreadPoolExecutor | None = None
+_executor_trava = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_trava:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="imagens")
+        return _executor
+
+
+def agendar(servico_id: int, nome: str) -> None:
+    """Processa a imagem `nome` do serviço depois do commit corrente."""
+    transaction.on_commit(lambda: _pool().submit(_executar, servico_id, nome))
+
+
+def _executar(servico_id: int, nome: str) -> None:
+    try:
+        processar(servico_id, nome)
+    except Exception:
+        logger.exception("Falha ao processar a imagem do serviço %s", servico_id)
+    finally:
+        close_old_connections()
+
+
+def _atual(servico_id: int, nome: str):
+    # só mexe na linha se a imagem ainda for a do pedido
+    return Servico.objects.filter(pk=servico_id, imagem=nome)
+
+
+def processar(servico_id: int, nome: str) -> bool:
+    """Recorta/redimensiona a imagem; False se o pedido ficou velho ou falhou."""
+    if not _atual(servico_id, nome).update(imagem_status="processando"):
+        return False
+    from PIL import Image
+
+    storage = Servico._meta.get_field("imagem").storage
+    try:
+        with storage.open(nome, "rb") as f, Image.open(f) as img:
+            formato = img.format or "PNG"
+            w, h = img.size
+            saida = None
+            if (w, h) != (TAMANHO, TAMANHO):
+                if w != h:
+                    lado = min(w, h)
+                    esquerda = (w - lado) // 2
+                    topo = (h - lado) // 2
+                    img = img.crop((esquerda, topo, esquerda + lado, topo + lado))
+                img = img.resize((TAMANHO, TAMANHO), Image.Resampling.LANCZOS)
+                if formato == "JPEG" and img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+                saida = BytesIO()
+                img.save(saida, format=formato, quality=QUALIDADE, optimize=True)
+    except Exception as e:
+        logger.warning("Imagem do serviço %s não processada: %s", servico_id, e)
+        _atual(servico_id, nome).update(imagem_status="erro")
+        return False
+
+    if saida is None:  # já no tamanho
+        gravado = nome
+    else:
+        if not _atual(servico_id, nome).exists():
+            return False
+        storage.delete(nome)
+        gravado = storage.save(nome, ContentFile(saida.getvalue()))
+    # update(): sem signals, então a troca de nome (se houver) não reagenda
+    if not _atual(servico_id, nome).update(imagem=gravado, imagem_status="pronta"):
+        return False
+    gerar_derivadas(gravado, storage)
+    return True
+
+
+# ---------- derivadas (srcset) ----------
+
+def agendar_derivadas(arquivo) -> None:
+    """Gera as derivadas de `arquivo` (FieldFile) depois do commit corrente."""
+    nome, storage = arquivo.name, arquivo.storage
+    transaction.on_commit(lambda: _pool().submit(_executar_derivadas, nome, storage))
+
+
+def _executar_derivadas(nome: str, storage) -> None:
+    try:
+        gerar_derivadas(nome, storage)
+    except Exception:
+        logger.exception("Falha ao gerar derivadas de %s", nome)
+    finally:
+        close_old_connections()
+
+
+def larguras_para(largura_original: int) -> list[int]:
+    """LARGURAS menores que a original, mais a própria (limitada à maior) — nunca amplia."""
+    return sorted({l for l in LARGURAS if l < largura_original} | {min(largura_original, LARGURAS[-1])})
+
+
+def _para_jpeg(img):
+    if img.mode == "RGB":
+        return img
+    if img.mode in ("RGBA", "LA"):
+        from PIL import Image
+
+        fundo = Image.new("RGB", img.size, "white")
+        fundo.paste(img, mask=img.getchannel("A"))
+        return fundo
+    return img.convert("RGB")
+
+
+def gerar_derivadas(nome: str, storage) -> list[ImagemDerivada]:
+    """(Re)gera as derivadas da imagem `nome`, lida de `storage`."""
+    from PIL import Image, ImageOps
+
+    with storage.open(nome, "rb") as f, Image.open(f) as original:
+        img = ImageOps.exif_transpose(original)  # fotos de celular vêm giradas no EXIF
+        img.load()
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if img.mode in ("LA", "P", "PA") else "RGB")
+
+    destino = ImagemDerivada._meta.get_field("arquivo").storage
+    base = os.path.splitext(os.path.basename(nome))[0]
+    w, h = img.size
+    remover_derivadas([nome])
+    derivadas = []
+    for largura in larguras_para(w):
+        altura = max(1, round(h * largura / w))
+        copia = img if largura == w else img.resize((largura, altura), Image.Resampling.LANCZOS)
+        for formato, formato_pil in FORMATOS.items():
+            saida = BytesIO()
+            if formato == "jpeg":
+                _para_jpeg(copia).save(saida, format=formato_pil, quality=QUALIDADE_DERIVADA, optimize=True, progressive=True)
+            else:
+                copia.save(saida, format=formato_pil, quality=QUALIDADE_DERIVADA, method=6)
+            caminho = destino.save(f"derivadas/{base}_{largura}w.{formato}", ContentFile(saida.getvalue()))
+            derivadas.append(ImagemDerivada(origem=nome, formato=formato, largura=largura, altura=altura, arquivo=caminho))
+    ImagemDerivada.objects.bulk_create(derivadas, ignore_conflicts=True)
+    return derivadas
+
+
+def remover_derivadas(nomes) -> int:
+    """Apaga as derivadas das imagens `nomes` (os blobs ficam para armazenamento.coletar)."""
+    antigas = list(ImagemDerivada.objects.filter(origem__in=list(nomes)))
+    for derivada in antigas:
+        derivada.arquivo.delete(save=False)
+    ImagemDerivada.objects.filter(pk__in=[d.pk for d in antigas]).delete()
+    return len(antigas)
+
+
+def remover_derivadas_orfas(antes_de, simular: bool = False) -> int:
+    """Remove as derivadas, criadas antes de `antes_de`, cuja origem não está em nenhuma imagem pública."""
+    orfas = ImagemDerivada.objects.filter(criado_em__lt=antes_de)
+    for model, campo in CAMPOS_PUBLICOS:
+        orfas = orfas.exclude(Exists(model.objects.filter(**{campo: OuterRef("origem")})))
+    if simular:
+        return orfas.count()
+    return remover_derivadas(orfas.values_list("origem", flat=True).distinct())
+
+
+def carregar_derivadas(arquivos) -> None:
+    """
+    Busca numa consulta as derivadas de vários FieldFiles (os de uma página)
+    e guarda no objeto dono de cada um, onde a tag imagem_responsiva procura.
+    """
+    arquivos = [a for a in arquivos if a]
+    mapa: dict[str, list[ImagemDerivada]] = {a.name: [] for a in arquivos}
+    for derivada in ImagemDerivada.objects.filter(origem__in=list(mapa)):
+        mapa[derivada.origem].append(derivada)
+    for arquivo in arquivos:
+        arquivo.instance._derivadas = mapa
+
+
+def derivadas_de(arquivo) -> list[ImagemDerivada]:
+    """Derivadas de `arquivo`, do cache de carregar_derivadas ou do banco."""
+    mapa = getattr(arquivo.instance, "_derivadas", None)
+    if mapa is not None and arquivo.name in mapa:
+        return mapa[arquivo.name]
+    return list(ImagemDerivada.objects.filter(origem=arquivo.name))
@@ -0,0 +1,200 @@
+# agendamentos/importacao.py
+"""
+Importação de clientes a partir de CSV (comando importar_clientes e tela de
+upload em gerir_clientes).
+
+O arquivo é lido linha a linha e processado em lotes: cada lote valida as
+linhas (validate_cpf / validate_telefone / e-mail), busca os clientes já
+existentes com DUAS consultas (email__in, cpf__in) e grava com bulk_create /
+bulk_update numa transação. Duplicatas dentro do próprio arquivo são
+detectadas com conjuntos em memória. Linhas com problema não interrompem a
+importação: vão para `erros` (linha, e-mail, mensagem). Se o banco recusar o
+lote (ex.: e-mail gravado por outra sessão entre a consulta e o insert), o
+lote é regravado linha a linha para que só a linha em conflito vire erro.
+"""
+from __future__ import annotations
+
+import csv
+from dataclasses import dataclass, field
+import itertools
+import re
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import DataError, IntegrityError, transaction
+from django.utils import timezone
+
+from . import condicional
+from .models import Agendamento, Cliente, validate_cpf, validate_telefone
+
+TAMANHO_LOTE = 1000
+# cabeçalhos aceitos -> campo
+COLUNAS = {
+    "nome": "nome",
+    "email": "email",
+    "e-mail": "email",
+    "telefone": "telefone",
+    "celular": "telefone",
+    "cpf": "cpf",
+}
+
+
+@dataclass
+class ResultadoImportacao:
+    criados: int = 0
+    atualizados: int = 0
+    sem_alteracao: int = 0
+    erros: list = field(default_factory=list)  # (linha, email, mensagem)
+
+    @property
+    def processados(self) -> int:
+        return self.criados + self.atualizados + self.sem_alteracao + len(self.erros)
+
+    def escrever_erros(self, destino) -> None:
+        writer = csv.writer(destino)
+        writer.writerow(["linha", "email", "erro"])
+        writer.writerows(self.erros)
+
+
+def _leitor(linhas):
+    """(número da linha, {campo: valor}) com o separador detectado (vírgula ou ponto e vírgula)."""
+    linhas = iter(linhas)
+    primeira = next(linhas, "")
+    delimitador = ";" if primeira.count(";") > primeira.count(",") else ","
+    leitor = csv.reader(itertools.chain([primeira], linhas), delimiter=delimitador)
+    cabecalho = [COLUNAS.get(c.strip().lower(), "") for c in next(leitor, [])]
+    if "email" not in cabecalho or "nome" not in cabecalho:
+        raise ValueError("O arquivo precisa das colunas 'nome' e 'email'.")
+    for valores in leitor:
+        if not any(v.strip() for v in valores):
+            continue
+        yield leitor.line_num, {c: v.strip() for c, v in zip(cabecalho, valores) if c}
+
+
+def _validar(dados: dict) -> dict:
+    """Normaliza a linha; ValidationError com a mensagem do primeiro problema."""
+    nome = dados.get("nome", "")
+    email = dados.get("email", "")
+    telefone = dados.get("telefone", "")
+    cpf = re.sub(r"[.\-\s]", "", dados.get("cpf", "")) or None
+    if not nome:
+        raise ValidationError("Nome obrigatório.")
+    linha = {"nome": nome, "email": email, "telefone": telefone, "cpf": cpf}
+    for campo, valor in linha.items():
+        limite = Cliente._meta.get_field(campo).max_length
+        if valor and len(valor) > limite:
+            raise ValidationError(f"{campo.capitalize()} muito longo (máximo {limite} caracteres).")
+    validate_email(email)
+    validate_telefone(telefone)
+    if cpf:
+        validate_cpf(cpf)
+    return linha
+
+
+def _mensagem(erro: ValidationError) -> str:
+    return "; ".join(erro.messages)
+
+
+def importar_clientes(linhas, *, atualizar: bool = True, tamanho_lote: int = TAMANHO_LOTE) -> ResultadoImportacao:
+    """
+    Importa as linhas de um CSV (qualquer iterável de str, ex.: arquivo aberto
+    em modo texto). Clientes existentes são encontrados por e-mail e, depois,
+    por CPF; com `atualizar=False` eles são apenas contados.
+    """
+    resultado = ResultadoImportacao()
+    emails_vistos: set[str] = set()
+    cpfs_vistos: set[str] = set()
+    clientes_vistos: set[int] = set()  # já casados com uma linha anterior
+    lote: list[tuple[int, dict]] = []
+
+    for num, dados in _leitor(linhas):
+        try:
+            linha = _validar(dados)
+        except ValidationError as e:
+            resultado.erros.append((num, dados.get("email", ""), _mensagem(e)))
+            continue
+        if linha["email"] in emails_vistos:
+            resultado.erros.append((num, linha["email"], "E-mail repetido no arquivo."))
+            continue
+        if linha["cpf"] and linha["cpf"] in cpfs_vistos:
+            resultado.erros.append((num, linha["email"], "CPF repetido no arquivo."))
+            continue
+        emails_vistos.add(linha["email"])
+        if linha["cpf"]:
+            cpfs_vistos.add(linha["cpf"])
+        lote.append((num, linha))
+        if len(lote) >= tamanho_lote:
+            _gravar_lote(lote, atualizar, resultado, clientes_vistos)
+            lote = []
+    if lote:
+        _gravar_lote(lote, atualizar, resultado, clientes_vistos)
+    resultado.erros.sort(key=lambda e: e[0])  # erros do lote chegam depois dos de validação
+    return resultado
+
+
+def _gravar_lote(
+    lote: list[tuple[int, dict]], atualizar: bool, resultado: ResultadoImportacao, clientes_vistos: set[int]
+) -> None:
+    campos = ("id", "nome", "email", "telefone", "cpf")
+    emails = [l["email"] for _, l in lote]
+    cpfs = [l["cpf"] for _, l in lote if l["cpf"]]
+    por_email = {c.email: c for c in Cliente.objects.filter(email__in=emails).only(*campos)}
+    por_cpf = {c.cpf: c for c in Cliente.objects.filter(cpf__in=cpfs).only(*campos)} if cpfs else {}
+
+    novos, alterados = [], []  # (linha, Cliente)
+    for num, linha in lote:
+        existente = por_email.get(linha["email"]) or por_cpf.get(linha["cpf"])
+        dono_cpf = por_cpf.get(linha["cpf"]) if linha["cpf"] else None
+        if dono_cpf is not None and existente is not None and dono_cpf.pk != existente.pk:
+            resultado.erros.append((num, linha["email"], "CPF já cadastrado para outro cliente."))
+            continue
+        if existente is not None and existente.pk in clientes_vistos:
+            resultado.erros.append((num, linha["email"], "Cliente já alterado por outra linha do arquivo."))
+            continue
+        if existente is None:
+            novos.append((num, Cliente(**linha)))
+            continue
+        clientes_vistos.add(existente.pk)
+        if not atualizar:
+            resultado.sem_alteracao += 1
+            continue
+        mudou = False
+        for campo in ("nome", "email", "telefone", "cpf"):
+            valor = linha[campo]
+            if campo == "cpf" and not valor:
+                continue  # não apaga CPF já cadastrado
+            if getattr(existente, campo) != valor:
+                setattr(existente, campo, valor)
+                mudou = True
+        if mudou:
+            alterados.append((num, existente))
+        else:
+            resultado.sem_alteracao += 1
+
+    try:
+        _gravar(novos, alterados, resultado)
+    except (IntegrityError, DataError):
+        # o lote voltou inteiro: regrava linha a linha para isolar a que o banco recusa
+        for _, cliente in novos:
+            cliente.pk = None
+        individuais = [([item], []) for item in novos] + [([], [item]) for item in alterados]
+        for novo, alterado in sorted(individuais, key=lambda par: (par[0] or par[1])[0][0]):
+            try:
+                _gravar(novo, alterado, resultado)
+            except (IntegrityError, DataError) as e:
+                num, cliente = (novo or alterado)[0]
+                resultado.erros.append((num, cliente.email, f"Não foi possível gravar: {e}"))
+
+
+def _gravar(novos: list, alterados: list, resultado: ResultadoImportacao) -> None:
+    """Grava numa transação (tudo ou nada) e só então conta no resultado."""
+    with transaction.atomic():
+        Cliente.objects.bulk_create([c for _, c in novos], batch_size=500)
+        if alterados:
+            clientes = [c for _, c in alterados]
+            Cliente.objects.bulk_update(clientes, ["nome", "email", "telefone", "cpf"], batch_size=500)
+            # bulk_update não dispara signals: nomes/contatos aparecem no calendário
+            Agendamento.objects.filter(cliente__in=clientes).update(atualizado_em=timezone.now())
+            transaction.on_commit(condicional.marcar_alteracao)
+    resultado.criados += len(novos)
+    resultado.atualizados += len(alterados)
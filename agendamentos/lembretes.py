@@ -0,0 +1,201 @@
+# agendamentos/lembretes.py
+"""
+Lembretes por e-mail de agendamentos confirmados (comando enviar_lembretes).
+
+As etapas são antecedências em minutos (ConfiguracaoAgenda.lembretes, ex.:
+24 h, 2 h e 15 min). Cada etapa vale numa janela que vai da sua antecedência
+até a da etapa seguinte, então as janelas cobrem (agora, agora + maior
+etapa] sem se sobrepor. Por isso UMA consulta por intervalo de data_hora
+(indexado) serve todas as etapas: um CASE anota a etapa vigente de cada
+agendamento e um NOT EXISTS tira as já enviadas (LembreteEnviado). Quem
+perdeu uma etapa (sistema parado, agendamento feito em cima da hora) recebe
+a etapa vigente, não as atrasadas.
+
+`enfileirar` processa o resultado em lotes: para cada etapa do lote, os
+e-mails das clientes e UM resumo para a dona vão para a caixa de saída
+(caixa_saida.py) na mesma transação que grava as etapas como enviadas. O
+envio em si fica com caixa_saida.processar, que tenta de novo o que falhar.
+
+`Agenda` é o relógio do modo --daemon: um heap em memória com o instante de
+cada etapa (data_hora - antecedência). A primeira carga pega tudo o que está
+no horizonte — o que venceu com o processo parado sai na hora. Depois, cada
+`atualizar` lê só o que mudou (atualizado_em) e o que entrou no horizonte
+desde a última leitura. Entradas antigas de um agendamento remarcado ficam
+no heap e não geram e-mail: a etapa é sempre recalculada por `enfileirar`.
+Mudanças nas etapas valem para o daemon depois de reiniciá-lo.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+import hashlib
+import heapq
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Exists, IntegerField, OuterRef, Q, Value, When
+from django.utils import timezone
+
+from . import caixa_saida
+from .models import Agendamento, ConfiguracaoAgenda, LembreteEnviado
+
+HORIZONTE = timedelta(hours=6)  # além da maior etapa, quanto o heap carrega adiante
+MARGEM_CURSOR = timedelta(seconds=2)  # commits que terminam depois da leitura
+TAMANHO_LOTE = 200
+
+
+def etapas() -> list[int]:
+    return ConfiguracaoAgenda.carregar().etapas_lembrete()
+
+
+def descrever(minutos: int) -> str:
+    if minutos >= 60 and minutos % 60 == 0:
+        horas = minutos // 60
+        return "1 hora" if horas == 1 else f"{horas} horas"
+    return "1 minuto" if minutos == 1 else f"{minutos} minutos"
+
+
+def pendentes(agora: datetime, etapas_: list[int], filtro: Q | None = None):
+    """Agendamentos com uma etapa vigente ainda não enviada, anotados com `etapa`."""
+    if not etapas_:
+        return Agendamento.objects.none()
+    janelas = zip(etapas_, [*etapas_[1:], 0])
+    etapa = Case(
+        *[
+            When(
+                data_hora__gt=agora + timedelta(minutes=seguinte),
+                data_hora__lte=agora + timedelta(minutes=minutos),
+                then=Value(minutos),
+            )
+            for minutos, seguinte in janelas
+        ],
+        output_field=IntegerField(),
+    )
+    enviada = LembreteEnviado.objects.filter(agendamento=OuterRef("pk"), antecedencia=OuterRef("etapa"))
+    qs = Agendamento.objects.filter(
+        status="Confirmado",
+        data_hora__gt=agora,
+        data_hora__lte=agora + timedelta(minutes=etapas_[0]),
+    )
+    if filtro is not None:
+        qs = qs.filter(filtro)
+    return qs.annotate(etapa=etapa).exclude(Exists(enviada))
+
+
+def mensagem_cliente(agendamento: Agendamento, etapa: int) -> tuple:
+    """(chave, assunto, mensagem, remetente, destinatários) para a cliente."""
+    servico = agendamento.servico.nome if agendamento.servico else "Atendimento"
+    data_formatada = timezone.localtime(agendamento.data_hora).strftime("%d/%m/%Y às %H:%M")
+    mensagem = (
+        f"Olá, {agendamento.cliente.nome}!\n\n"
+        f"Este é um lembrete do seu agendamento na BellCilios.\n\n"
+        f"Serviço: {servico}\n"
+        f"Data e Hora: {data_formatada}\n\n"
+        f"Estamos te esperando!\n"
+        f"Atenciosamente, Equipe BellCilios"
+    )
+    return (
+        f"lembrete:{agendamento.id}:{etapa}:cliente",
+        f"Lembrete de Agendamento - {servico}",
+        mensagem,
+        settings.DEFAULT_FROM_EMAIL,
+        [agendamento.cliente.email],
+    )
+
+
+def mensagem_dono(agendamentos: list[Agendamento], etapa: int) -> tuple:
+    """Um e-mail para a dona (Rebeca) com todos os agendamentos da etapa."""
+    linhas = [
+        f"- {timezone.localtime(a.data_hora).strftime('%d/%m %H:%M')}: {a.cliente.nome} "
+        f"({a.servico.nome if a.servico else 'Atendimento'})"
+        for a in agendamentos
+    ]
+    ids = ",".join(str(a.id) for a in agendamentos)
+    return (
+        f"lembrete:dono:{etapa}:{hashlib.sha1(ids.encode()).hexdigest()}",
+        f"Lembrete: {len(agendamentos)} agendamento(s) em aproximadamente {descrever(etapa)}",
+        "Agendamentos que começam em aproximadamente " + descrever(etapa) + ":\n\n" + "\n".join(linhas),
+        settings.DEFAULT_FROM_EMAIL,
+        [settings.DEFAULT_FROM_EMAIL],
+    )
+
+
+def enfileirar(
+    agora: datetime | None = None, filtro: Q | None = None, tamanho_lote: int = TAMANHO_LOTE,
+    etapas_: list[int] | None = None,
+) -> dict[int, int]:
+    """
+    Põe na caixa de saída as etapas vigentes ainda não enviadas e devolve
+    {etapa: agendamentos}. E-mails e registro das etapas entram na mesma
+    transação: uma etapa nunca fica marcada sem mensagem.
+    """
+    agora = agora or timezone.now()
+    etapas_ = etapas() if etapas_ is None else etapas_
+    consulta = pendentes(agora, etapas_, filtro).select_related("cliente", "servico").order_by("id")
+    por_etapa: dict[int, int] = {}
+    ultimo_id = 0
+    while True:
+        lote = list(consulta.filter(id__gt=ultimo_id)[:tamanho_lote])
+        if not lote:
+            break
+        ultimo_id = lote[-1].id
+        with transaction.atomic():
+            for etapa, grupo in groupby(sorted(lote, key=lambda a: (-a.etapa, a.data_hora, a.id)), key=lambda a: a.etapa):
+                grupo = list(grupo)
+                caixa_saida.enfileirar([*(mensagem_cliente(a, etapa) for a in grupo), mensagem_dono(grupo, etapa)])
+                por_etapa[etapa] = por_etapa.get(etapa, 0) + len(grupo)
+            LembreteEnviado.objects.bulk_create(
+                [LembreteEnviado(agendamento_id=a.id, antecedencia=a.etapa) for a in lote], ignore_conflicts=True
+            )
+    return por_etapa
+
+
+class Agenda:
+    """Heap (instante da etapa, id) alimentado incrementalmente pelo banco."""
+
+    def __init__(self, etapas_: list[int] | None = None, horizonte: timedelta = HORIZONTE):
+        self.etapas = etapas() if etapas_ is None else etapas_
+        self.horizonte = horizonte
+        self._heap: list[tuple[datetime, int, int]] = []
+        self._instantes: dict[tuple[int, int], datetime] = {}  # (id, etapa) -> instante vigente
+        self._cursor: datetime | None = None  # atualizado_em já lido
+        self._limite: datetime | None = None  # data_hora já carregada
+
+    def __len__(self) -> int:
+        return len({id_ for id_, _ in self._instantes})
+
+    def atualizar(self, agora: datetime) -> int:
+        """Lê o que mudou desde a última chamada; devolve quantas etapas entraram ou mudaram."""
+        if not self.etapas:
+            return 0
+        limite = agora + timedelta(minutes=self.etapas[0]) + self.horizonte
+        lido_em = timezone.now()
+        filtro = Q(data_hora__gt=agora, data_hora__lte=limite)
+        if self._limite is not None:
+            filtro &= Q(data_hora__gt=self._limite) | Q(atualizado_em__gte=self._cursor - MARGEM_CURSOR)
+        novos = 0
+        for id_, data_hora in Agendamento.objects.filter(filtro, status="Confirmado").values_list("id", "data_hora"):
+            for etapa in self.etapas:
+                novos += self.agendar(id_, etapa, data_hora - timedelta(minutes=etapa))
+        self._cursor, self._limite = lido_em, limite
+        return novos
+
+    def agendar(self, id_: int, etapa: int, instante: datetime) -> bool:
+        if self._instantes.get((id_, etapa)) == instante:
+            return False
+        self._instantes[(id_, etapa)] = instante
+        heapq.heappush(self._heap, (instante, id_, etapa))
+        return True
+
+    def proximo(self) -> datetime | None:
+        return self._heap[0][0] if self._heap else None
+
+    def vencidos(self, agora: datetime) -> list[int]:
+        """Tira do heap as etapas com instante <= agora; devolve os ids (sem repetir)."""
+        ids = {}
+        while self._heap and self._heap[0][0] <= agora:
+            instante, id_, etapa = heapq.heappop(self._heap)
+            if self._instantes.get((id_, etapa)) == instante:
+                del self._instantes[(id_, etapa)]
+                ids[id_] = None
+        return list(ids)
@@ -0,0 +1,44 @@
+# agendamentos/management/commands/coletar_midia.py
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from agendamentos import armazenamento, imagens
+from agendamentos.models import ImagemDerivada
+
+
+class Command(BaseCommand):
+    help = 'Apaga as imagens (blobs) e derivadas que nenhum registro usa mais.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--carencia-horas', type=float, default=armazenamento.CARENCIA.total_seconds() / 3600,
+            help='Não apaga o que foi gravado há menos que isso (envios em andamento).',
+        )
+        parser.add_argument('--simular', action='store_true', help='Só conta o que seria apagado.')
+        parser.add_argument(
+            '--enderecar', action='store_true',
+            help='Antes, converte os arquivos com nome antigo (servicos/x.png) em blobs.',
+        )
+
+    def handle(self, *args, **options):
+        carencia = timedelta(hours=options['carencia_horas'])
+        simular = options['simular']
+
+        if options['enderecar'] and not simular:
+            convertidos = 0
+            for model, campo in armazenamento.campos():
+                trocas = armazenamento.enderecar(model, campo)
+                for antigo, novo in trocas.items():
+                    ImagemDerivada.objects.filter(origem=antigo).update(origem=novo)
+                convertidos += len(trocas)
+            self.stdout.write(f'{convertidos} arquivos convertidos para blobs.')
+
+        derivadas = imagens.remover_derivadas_orfas(timezone.now() - carencia, simular=simular)
+        coleta = armazenamento.coletar(carencia, simular=simular)
+        verbo = 'seriam apagados' if simular else 'apagados'
+        self.stdout.write(self.style.SUCCESS(
+            f'{derivadas} derivadas órfãs e {coleta.blobs} blobs ({coleta.bytes / 1024:.0f} KiB) {verbo}.'
+        ))
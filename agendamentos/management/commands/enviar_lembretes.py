@@ -0,0 +1,105 @@
+# agendamentos/management/commands/enviar_lembretes.py
+
+import logging
+import signal
+import threading
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from agendamentos import caixa_saida, lembretes
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_ATUALIZACAO = 60  # segundos entre leituras incrementais no modo --daemon
+ESPERA_FALHA = timedelta(minutes=1)  # nova tentativa após erro ao enfileirar
+
+
+class Command(BaseCommand):
+    help = 'Envia os lembretes por e-mail das etapas vencidas (ConfiguracaoAgenda.lembretes).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=lembretes.TAMANHO_LOTE, help='Agendamentos por lote enviado.')
+        parser.add_argument(
+            '--daemon', action='store_true',
+            help='Fica rodando e envia cada etapa no horário (recupera as atrasadas ao iniciar).',
+        )
+
+    def handle(self, *args, **options):
+        if options['daemon']:
+            return self.daemon(options['lote'])
+
+        try:
+            por_etapa = lembretes.enfileirar(tamanho_lote=options['lote'])
+        except Exception as e:
+            raise CommandError(f'Falha ao enfileirar lembretes: {e}')
+
+        if not por_etapa:
+            self.stdout.write(self.style.SUCCESS('Nenhum agendamento próximo para notificar.'))
+        else:
+            self.relatar(por_etapa)
+        self.despachar()
+
+    def relatar(self, por_etapa):
+        for etapa, quantidade in sorted(por_etapa.items(), reverse=True):
+            self.stdout.write(self.style.SUCCESS(
+                f'{quantidade} lembretes de {lembretes.descrever(etapa)} enfileirados.'
+            ))
+
+    def despachar(self, parar=None):
+        """Envia o que está vencido na caixa de saída (inclusive tentativas anteriores)."""
+        resultado = caixa_saida.processar(parar=parar)
+        if resultado.enviados or resultado.falhas:
+            self.stdout.write(
+                f'{resultado.enviados} e-mails enviados, {resultado.falhas} falhas em '
+                f'{resultado.duracao:.2f}s — {resultado.por_segundo:.0f} e-mails/s'
+            )
+
+    # ---------- modo --daemon ----------
+
+    def daemon(self, tamanho_lote):
+        parar = threading.Event()
+
+        def encerrar(signum, frame):
+            self.stdout.write(f'Sinal {signal.Signals(signum).name} recebido; encerrando.')
+            parar.set()
+
+        signal.signal(signal.SIGTERM, encerrar)
+        signal.signal(signal.SIGINT, encerrar)
+
+        agenda = lembretes.Agenda()
+        self.stdout.write('Agendador de lembretes iniciado.')
+        while not parar.is_set():
+            self.ciclo(agenda, tamanho_lote, parar)
+            close_old_connections()
+            espera = INTERVALO_ATUALIZACAO
+            proximo = agenda.proximo()
+            if proximo is not None:
+                espera = min(espera, (proximo - timezone.now()).total_seconds())
+            parar.wait(max(espera, 0))
+        self.stdout.write(self.style.SUCCESS('Agendador de lembretes encerrado.'))
+
+    def ciclo(self, agenda, tamanho_lote, parar=None):
+        """Uma volta do daemon: lê o que mudou, enfileira o que venceu e despacha."""
+        agora = timezone.now()
+        try:
+            agenda.atualizar(agora)
+        except Exception:
+            logger.exception('Falha ao atualizar a agenda de lembretes')
+        ids = agenda.vencidos(agora)
+        if ids:
+            try:
+                por_etapa = lembretes.enfileirar(agora, Q(id__in=ids), tamanho_lote, agenda.etapas)
+            except Exception:
+                logger.exception('Falha ao enfileirar lembretes; nova tentativa em %s', ESPERA_FALHA)
+                for id_ in ids:
+                    agenda.agendar(id_, 0, agora + ESPERA_FALHA)  # etapa 0: só a nova tentativa
+            else:
+                self.relatar(por_etapa)
+        try:
+            self.despachar(parar)
+        except Exception:
+            logger.exception('Falha ao processar a caixa de saída')
@@ -0,0 +1,35 @@
+# agendamentos/management/commands/gerar_derivadas.py
+
+from django.core.management.base import BaseCommand
+
+from agendamentos import imagens
+from agendamentos.models import ImagemDerivada
+
+
+class Command(BaseCommand):
+    help = 'Gera as versões responsivas (WebP/JPEG em várias larguras) das imagens já enviadas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true', help='Regera também as que já têm derivadas.')
+
+    def handle(self, *args, **options):
+        prontas = set() if options['todas'] else set(ImagemDerivada.objects.values_list('origem', flat=True))
+        geradas = puladas = falhas = 0
+        for model, campo in imagens.CAMPOS_PUBLICOS:
+            storage = model._meta.get_field(campo).storage
+            nomes = model.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+            for nome in nomes.values_list(campo, flat=True).distinct():
+                if nome in prontas:
+                    puladas += 1
+                    continue
+                try:
+                    imagens.gerar_derivadas(nome, storage)
+                except Exception as e:
+                    falhas += 1
+                    self.stderr.write(f'{nome}: {e}')
+                else:
+                    geradas += 1
+                    prontas.add(nome)
+        self.stdout.write(self.style.SUCCESS(
+            f'{geradas} imagens com derivadas geradas, {puladas} já prontas, {falhas} com erro.'
+        ))
@@ -0,0 +1,45 @@
+# agendamentos/management/commands/importar_clientes.py
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from agendamentos.importacao import TAMANHO_LOTE, importar_clientes
+
+
+class Command(BaseCommand):
+    help = 'Importa clientes de um CSV (colunas: nome, email, telefone, cpf) em lotes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do CSV (vírgula ou ponto e vírgula).')
+        parser.add_argument('--encoding', default='utf-8-sig', help='Codificação do arquivo (padrão: utf-8-sig).')
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help='Linhas por lote gravado.')
+        parser.add_argument('--sem-atualizar', action='store_true', help='Não altera clientes já cadastrados.')
+        parser.add_argument('--relatorio', help='Grava as linhas com erro neste CSV.')
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        try:
+            with open(options['arquivo'], encoding=options['encoding'], newline='') as f:
+                resultado = importar_clientes(
+                    f, atualizar=not options['sem_atualizar'], tamanho_lote=options['lote']
+                )
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            raise CommandError(str(e))
+
+        duracao = time.monotonic() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.processados} linhas em {duracao:.1f}s: {resultado.criados} criados, '
+            f'{resultado.atualizados} atualizados, {resultado.sem_alteracao} sem alteração, '
+            f'{len(resultado.erros)} com erro.'
+        ))
+        if resultado.erros:
+            if options['relatorio']:
+                with open(options['relatorio'], 'w', encoding='utf-8', newline='') as destino:
+                    resultado.escrever_erros(destino)
+                self.stdout.write(f"Relatório de erros: {options['relatorio']}")
+            else:
+                for linha, email, erro in resultado.erros[:20]:
+                    self.stdout.write(self.style.WARNING(f'Linha {linha} ({email}): {erro}'))
+                if len(resultado.erros) > 20:
+                    self.stdout.write('... use --relatorio para a lista completa.')
@@ -0,0 +1,21 @@
+# agendamentos/management/commands/limpar_relatorios.py
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from agendamentos import relatorios
+
+
+class Command(BaseCommand):
+    help = 'Apaga os relatórios PDF (jobs e arquivos) mais antigos que o prazo de expiração.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias', type=float, default=relatorios.EXPIRA_EM.total_seconds() / 86400,
+            help='Idade mínima, em dias, do relatório apagado.',
+        )
+
+    def handle(self, *args, **options):
+        apagados = relatorios.limpar_expirados(timedelta(days=options['dias']))
+        self.stdout.write(self.style.SUCCESS(f'{apagados} relatórios expirados apagados.'))
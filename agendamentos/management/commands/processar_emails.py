@@ -0,0 +1,74 @@
+# agendamentos/management/commands/processar_emails.py
+
+import logging
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from agendamentos import caixa_saida
+
+logger = logging.getLogger(__name__)
+
+INTERVALO = 5  # segundos entre voltas no modo --daemon
+
+
+class Command(BaseCommand):
+    help = 'Envia os e-mails da caixa de saída (pool de threads, limite de taxa e novas tentativas).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=caixa_saida.WORKERS, help='Threads de envio.')
+        parser.add_argument(
+            '--por-segundo', type=float, default=caixa_saida.POR_SEGUNDO,
+            help='Máximo de e-mails por segundo (0 = sem limite).',
+        )
+        parser.add_argument('--lote', type=int, default=caixa_saida.TAMANHO_LOTE, help='Mensagens reservadas por vez.')
+        parser.add_argument('--daemon', action='store_true', help='Fica rodando e verifica a fila a cada 5 segundos.')
+        parser.add_argument('--situacao', action='store_true', help='Só mostra a profundidade da fila.')
+
+    def handle(self, *args, **options):
+        if options['situacao']:
+            return self.relatar_fila()
+
+        parar = threading.Event()
+        if options['daemon']:
+            def encerrar(signum, frame):
+                self.stdout.write(f'Sinal {signal.Signals(signum).name} recebido; encerrando.')
+                parar.set()
+
+            signal.signal(signal.SIGTERM, encerrar)
+            signal.signal(signal.SIGINT, encerrar)
+
+        while True:
+            try:
+                resultado = caixa_saida.processar(
+                    tamanho_lote=options['lote'], workers=options['workers'],
+                    por_segundo=options['por_segundo'], parar=parar,
+                )
+            except Exception:
+                if not options['daemon']:
+                    raise
+                logger.exception('Falha ao processar a caixa de saída')
+            else:
+                if resultado.enviados or resultado.falhas or not options['daemon']:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'{resultado.enviados} e-mails enviados, {resultado.falhas} falhas em '
+                        f'{resultado.duracao:.2f}s — {resultado.por_segundo:.1f} e-mails/s'
+                    ))
+                    self.relatar_fila()
+            if not options['daemon']:
+                break
+            close_old_connections()
+            if parar.wait(INTERVALO):
+                break
+        if options['daemon']:
+            self.stdout.write(self.style.SUCCESS('Caixa de saída encerrada.'))
+
+    def relatar_fila(self):
+        s = caixa_saida.situacao()
+        self.stdout.write(
+            f"Fila: {s['pendente']} pendentes ({s['vencidos']} vencidos), {s['enviando']} enviando, "
+            f"{s['falhou']} falharam, {s['enviado']} enviados; "
+            f"mais antigo na fila há {s['idade_mais_antigo']:.0f}s"
+        )
@@ -0,0 +1,24 @@
+# agendamentos/management/commands/processar_imagens.py
+
+from django.core.management.base import BaseCommand
+
+from agendamentos import imagens
+from agendamentos.models import Servico
+
+
+class Command(BaseCommand):
+    help = 'Processa as imagens de serviço que ficaram pendentes (ex.: processo reiniciado no meio).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--erros', action='store_true', help='Tenta de novo as que deram erro.')
+
+    def handle(self, *args, **options):
+        status = ['pendente', 'processando'] + (['erro'] if options['erros'] else [])
+        servicos = Servico.objects.filter(imagem_status__in=status).exclude(imagem='').exclude(imagem=None)
+        ok = falhas = 0
+        for servico_id, nome in servicos.values_list('id', 'imagem'):
+            if imagens.processar(servico_id, nome):
+                ok += 1
+            else:
+                falhas += 1
+        self.stdout.write(self.style.SUCCESS(f'{ok} imagens processadas, {falhas} com erro ou descartadas.'))
@@ -0,0 +1,25 @@
+# agendamentos/management/commands/reconstruir_resumo.py
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from agendamentos import resumo
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o resumo diário (dashboard/stats) a partir dos agendamentos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inicio', help='Primeiro dia (AAAA-MM-DD). Padrão: desde o início.')
+        parser.add_argument('--fim', help='Último dia (AAAA-MM-DD). Padrão: até o fim.')
+
+    def handle(self, *args, **options):
+        datas = {}
+        for nome in ('inicio', 'fim'):
+            valor = options[nome]
+            datas[nome] = parse_date(valor) if valor else None
+            if valor and datas[nome] is None:
+                raise CommandError(f'Data inválida para --{nome}: {valor}')
+
+        linhas = resumo.reconstruir(datas['inicio'], datas['fim'])
+        self.stdout.write(self.style.SUCCESS(f'Resumo diário reconstruído: {linhas} linhas.'))
@@ -0,0 +1,74 @@
+# agendamentos/metricas.py
+"""
+Métricas do dashboard numa passada: totais por status e receita saem de um
+único aggregate com Sum(filter=Q(...)) sobre o resumo diário; os serviços
+mais procurados, de um GROUP BY no mesmo resumo.
+
+O resultado fica em cache por CACHE_TIMEOUT e é descartado pelos signals de
+Agendamento/Servico (agora e de novo após o commit, ver signals._invalidar).
+"""
+from __future__ import annotations
+
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import ResumoDiario, Servico
+
+CHAVE = "metricas:dashboard"
+CACHE_TIMEOUT = 60
+TOP_SERVICOS = 5
+STATUS = ("Pendente", "Confirmado", "Realizado", "Cancelado")
+
+
+def _soma_receita(filtro: Q):
+    return Coalesce(Sum("receita", filter=filtro), Value(Decimal("0")), output_field=DecimalField())
+
+
+def calcular() -> dict:
+    totais = ResumoDiario.objects.aggregate(
+        total=Coalesce(Sum("quantidade"), 0),
+        **{st.lower(): Coalesce(Sum("quantidade", filter=Q(status=st)), 0) for st in STATUS},
+        receita_realizada=_soma_receita(Q(status="Realizado")),
+        receita_prevista=_soma_receita(Q(status__in=("Pendente", "Confirmado"))),
+    )
+    top = (
+        ResumoDiario.objects.filter(servico__isnull=False)
+        .exclude(status="Cancelado")
+        .values("servico_id", "servico__nome")
+        .annotate(quantidade=Sum("quantidade"), receita=Sum("receita"))
+        .filter(quantidade__gt=0)
+        .order_by("-quantidade", "servico__nome")[:TOP_SERVICOS]
+    )
+    return {
+        "total_servicos": Servico.objects.count(),
+        "total_agendamentos": totais["total"],
+        "por_status": {st.lower(): totais[st.lower()] for st in STATUS},
+        "receita": {
+            "realizada": float(totais["receita_realizada"]),
+            "prevista": float(totais["receita_prevista"]),
+        },
+        "servicos_populares": [
+            {
+                "id": s["servico_id"],
+                "nome": s["servico__nome"],
+                "quantidade": s["quantidade"],
+                "receita": float(s["receita"] or 0),
+            }
+            for s in top
+        ],
+    }
+
+
+def dashboard() -> dict:
+    dados = cache.get(CHAVE)
+    if dados is None:
+        dados = calcular()
+        cache.set(CHAVE, dados, CACHE_TIMEOUT)
+    return dados
+
+
+def invalidar() -> None:
+    cache.delete(CHAVE)
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0009_provasocial_alter_resultadoaluna_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiaAgenda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(unique=True)),
+                ('reservas', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0010_diaagenda'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaTemporaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_hora', models.DateTimeField()),
+                ('data_hora_fim', models.DateTimeField()),
+                ('expira_em', models.DateTimeField(db_index=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('servico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_temporarias', to='agendamentos.servico')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_temporarias', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['data_hora'],
+                'indexes': [models.Index(fields=['data_hora', 'expira_em'], name='agendamento_data_ho_db4e57_idx')],
+            },
+        ),
+    ]
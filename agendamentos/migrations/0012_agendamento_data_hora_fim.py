@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:02
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def preencher_data_hora_fim(apps, schema_editor):
+    Agendamento = apps.get_model('agendamentos', 'Agendamento')
+    lote = []
+    for ag in Agendamento.objects.select_related('servico').only('data_hora', 'servico__duracao').iterator(chunk_size=1000):
+        duracao = (ag.servico.duracao if ag.servico else None) or 60
+        ag.data_hora_fim = ag.data_hora + timedelta(minutes=duracao)
+        lote.append(ag)
+        if len(lote) >= 1000:
+            Agendamento.objects.bulk_update(lote, ['data_hora_fim'])
+            lote = []
+    if lote:
+        Agendamento.objects.bulk_update(lote, ['data_hora_fim'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0011_reservatemporaria'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agendamento',
+            name='data_hora_fim',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['data_hora', 'data_hora_fim'], name='agendamento_data_ho_8c9622_idx'),
+        ),
+        migrations.RunPython(preencher_data_hora_fim, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:04
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0012_agendamento_data_hora_fim'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConfiguracaoAgenda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('intervalo', models.PositiveIntegerField(default=30, help_text='Intervalo entre horários (minutos)')),
+                ('duracao_padrao', models.PositiveIntegerField(default=60, help_text='Duração usada quando o serviço não é informado (minutos)')),
+            ],
+            options={
+                'verbose_name': 'Configuração da agenda',
+                'verbose_name_plural': 'Configuração da agenda',
+            },
+        ),
+        migrations.CreateModel(
+            name='ExcecaoAgenda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(unique=True)),
+                ('descricao', models.CharField(blank=True, max_length=120)),
+                ('fechado', models.BooleanField(default=True, help_text='Desmarque para usar o horário especial abaixo')),
+                ('abre', models.TimeField(blank=True, null=True)),
+                ('fecha', models.TimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Exceção da agenda',
+                'verbose_name_plural': 'Exceções da agenda (feriados/horários especiais)',
+                'ordering': ['data'],
+            },
+        ),
+        migrations.CreateModel(
+            name='HorarioFuncionamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia_semana', models.PositiveSmallIntegerField(choices=[(0, 'Segunda-feira'), (1, 'Terça-feira'), (2, 'Quarta-feira'), (3, 'Quinta-feira'), (4, 'Sexta-feira'), (5, 'Sábado'), (6, 'Domingo')], unique=True)),
+                ('aberto', models.BooleanField(default=True)),
+                ('abre', models.TimeField(default=datetime.time(9, 0))),
+                ('fecha', models.TimeField(default=datetime.time(18, 0))),
+                ('pausa_inicio', models.TimeField(blank=True, null=True)),
+                ('pausa_fim', models.TimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Horário de funcionamento',
+                'verbose_name_plural': 'Horários de funcionamento',
+                'ordering': ['dia_semana'],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0013_configuracao_agenda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Profissional',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100)),
+                ('ativo', models.BooleanField(default=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Profissionais',
+                'ordering': ['nome'],
+            },
+        ),
+        migrations.AddField(
+            model_name='agendamento',
+            name='profissional',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='agendamentos', to='agendamentos.profissional'),
+        ),
+        migrations.AddField(
+            model_name='reservatemporaria',
+            name='profissional',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='agendamentos.profissional'),
+        ),
+        migrations.AddField(
+            model_name='servico',
+            name='profissionais',
+            field=models.ManyToManyField(blank=True, help_text='Quem realiza o serviço (vazio = qualquer profissional ativo)', related_name='servicos', to='agendamentos.profissional'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0014_profissionais'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['cliente', 'data_hora'], name='agendamento_cliente_e8b2de_idx'),
+        ),
+    ]
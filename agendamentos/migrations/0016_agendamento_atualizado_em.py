@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0015_agendamento_cliente_data_hora_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgendamentoRemovido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('agendamento_id', models.PositiveIntegerField()),
+                ('cliente_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('removido_em', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ['removido_em'],
+            },
+        ),
+        migrations.AddField(
+            model_name='agendamento',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
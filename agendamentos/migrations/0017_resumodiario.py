@@ -0,0 +1,54 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:14
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+
+def preencher_resumo(apps, schema_editor):
+    Agendamento = apps.get_model('agendamentos', 'Agendamento')
+    ResumoDiario = apps.get_model('agendamentos', 'ResumoDiario')
+    linhas = (
+        Agendamento.objects.annotate(dia=TruncDate('data_hora', tzinfo=timezone.get_current_timezone()))
+        .values('dia', 'servico_id', 'status')
+        .annotate(n=Count('id'), total=Coalesce(Sum('servico__preco'), Value(Decimal('0')), output_field=DecimalField()))
+        .order_by()
+    )
+    ResumoDiario.objects.bulk_create(
+        [
+            ResumoDiario(data=l['dia'], servico_id=l['servico_id'], status=l['status'], quantidade=l['n'], receita=l['total'])
+            for l in linhas.iterator(chunk_size=2000)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0016_agendamento_atualizado_em'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('quantidade', models.IntegerField(default=0)),
+                ('receita', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('servico', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumos_diarios', to='agendamentos.servico')),
+            ],
+            options={
+                'ordering': ['data'],
+                'indexes': [models.Index(fields=['data', 'status'], name='agendamento_data_2d96ab_idx')],
+                'constraints': [models.UniqueConstraint(fields=('data', 'servico', 'status'), name='resumo_diario_unico')],
+            },
+        ),
+        migrations.RunPython(preencher_resumo, migrations.RunPython.noop),
+    ]
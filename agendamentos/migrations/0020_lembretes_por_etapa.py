@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def migrar_lembretes_enviados(apps, schema_editor):
+    # O lembrete antigo saía 1 hora antes: para os agendamentos futuros que já
+    # o receberam, as etapas padrão de 24 h e 2 h contam como enviadas.
+    Agendamento = apps.get_model('agendamentos', 'Agendamento')
+    LembreteEnviado = apps.get_model('agendamentos', 'LembreteEnviado')
+    ids = Agendamento.objects.filter(lembrete_enviado=True, data_hora__gt=timezone.now()).values_list('id', flat=True)
+    LembreteEnviado.objects.bulk_create(
+        [LembreteEnviado(agendamento_id=i, antecedencia=m) for i in ids for m in (1440, 120)],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0019_emailpendente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='configuracaoagenda',
+            name='lembretes',
+            field=models.CharField(default='1440,120,15', help_text='Antecedências dos lembretes por e-mail (minutos, separadas por vírgula)', max_length=100),
+        ),
+        migrations.CreateModel(
+            name='LembreteEnviado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('antecedencia', models.PositiveIntegerField()),
+                ('enviado_em', models.DateTimeField(auto_now_add=True)),
+                ('agendamento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lembretes', to='agendamentos.agendamento')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('agendamento', 'antecedencia'), name='lembrete_por_etapa')],
+            },
+        ),
+        migrations.RunPython(migrar_lembretes_enviados, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='agendamento',
+            name='lembrete_enviado',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0020_lembretes_por_etapa'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servico',
+            name='imagem_status',
+            field=models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Processando'), ('pronta', 'Pronta'), ('erro', 'Erro')], default='pronta', editable=False, max_length=12, verbose_name='Processamento da imagem'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0021_servico_imagem_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImagemDerivada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origem', models.CharField(db_index=True, max_length=255)),
+                ('formato', models.CharField(choices=[('webp', 'WebP'), ('jpeg', 'JPEG')], max_length=4)),
+                ('largura', models.PositiveIntegerField()),
+                ('altura', models.PositiveIntegerField()),
+                ('arquivo', models.FileField(max_length=255, upload_to='derivadas/')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['origem', 'formato', 'largura'],
+                'constraints': [models.UniqueConstraint(fields=('origem', 'formato', 'largura'), name='derivada_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:34
+
+import agendamentos.armazenamento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0022_imagemderivada'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='imagemderivada',
+            name='arquivo',
+            field=models.FileField(max_length=255, storage=agendamentos.armazenamento.ArmazenamentoConteudo(), upload_to='derivadas/'),
+        ),
+        migrations.AlterField(
+            model_name='provasocial',
+            name='imagem',
+            field=models.ImageField(storage=agendamentos.armazenamento.ArmazenamentoConteudo(), upload_to='provas/'),
+        ),
+        migrations.AlterField(
+            model_name='resultadoaluna',
+            name='foto',
+            field=models.ImageField(storage=agendamentos.armazenamento.ArmazenamentoConteudo(), upload_to='resultados/'),
+        ),
+        migrations.AlterField(
+            model_name='servico',
+            name='imagem',
+            field=models.ImageField(blank=True, null=True, storage=agendamentos.armazenamento.ArmazenamentoConteudo(), upload_to='servicos/', verbose_name='Imagem do Serviço'),
+        ),
+        migrations.AlterField(
+            model_name='servicoimagem',
+            name='imagem',
+            field=models.ImageField(storage=agendamentos.armazenamento.ArmazenamentoConteudo(), upload_to='servicos/adicionais/'),
+        ),
+    ]
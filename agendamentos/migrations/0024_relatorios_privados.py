@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:41
+
+import agendamentos.armazenamento
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def apagar_relatorios_publicos(apps, schema_editor):
+    # os PDFs antigos ficaram em MEDIA_ROOT, com URL adivinhável: saem junto com os
+    # jobs (são só cache; um novo pedido gera de novo no storage privado)
+    RelatorioJob = apps.get_model('agendamentos', 'RelatorioJob')
+    for nome in RelatorioJob.objects.exclude(arquivo='').values_list('arquivo', flat=True):
+        default_storage.delete(nome)
+    RelatorioJob.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0023_armazenamento_conteudo'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='relatoriojob',
+            name='arquivo',
+            field=models.FileField(blank=True, storage=agendamentos.armazenamento.ArmazenamentoPrivado(), upload_to='relatorios/'),
+        ),
+        migrations.RunPython(apagar_relatorios_publicos, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,16 @@
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
-from PIL import Image
+from django.db.models import F
+from django.utils import timezone
+from datetime import time, timedelta
 import re
 
+from . import armazenamento
+
+# Duração assumida quando o agendamento não tem serviço (serviço removido)
+DURACAO_PADRAO_MINUTOS = 60
+
 
 # ============================
 # VALIDADORES
@@ -46,40 +53,62 @@ class Cliente(models.Model):
         return self.nome
 
 
+class Profissional(models.Model):
+    """Quem atende (cada profissional é uma "cadeira" independente na agenda)."""
+    nome = models.CharField(max_length=100)
+    ativo = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ['nome']
+        verbose_name_plural = "Profissionais"
+
+    def __str__(self) -> str:
+        return self.nome
+
+
 class Servico(models.Model):
+    IMAGEM_STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('processando', 'Processando'),
+        ('pronta', 'Pronta'),
+        ('erro', 'Erro'),
+    ]
+
     nome = models.CharField(max_length=100)
     descricao = models.TextField()
     preco = models.DecimalField(max_digits=6, decimal_places=2)
-    imagem = models.ImageField(upload_to='servicos/', blank=True, null=True, verbose_name="Imagem do Serviço")
+    imagem = models.ImageField(
+        upload_to='servicos/', storage=armazenamento.conteudo, blank=True, null=True, verbose_name="Imagem do Serviço",
+    )
+    # Recorte/redimensionamento em segundo plano (imagens.py), só quando a imagem muda
+    imagem_status = models.CharField(
+        max_length=12, choices=IMAGEM_STATUS_CHOICES, default='pronta', editable=False,
+        verbose_name="Processamento da imagem",
+    )
     duracao = models.IntegerField(default=60, help_text="Duração do serviço em minutos")
+    profissionais = models.ManyToManyField(
+        Profissional, blank=True, related_name='servicos',
+        help_text="Quem realiza o serviço (vazio = qualquer profissional ativo)",
+    )
 
     def __str__(self) -> str:
         return self.nome
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        # Processa a imagem para 1:1 (400x400) quando em storage local
-        if self.imagem and hasattr(self.imagem, "path"):
-            try:
-                img_path = self.imagem.path
-                with Image.open(img_path) as img:
-                    w, h = img.size
-                    if w != h:
-                        side = min(w, h)
-                        left = (w - side) // 2
-                        top = (h - side) // 2
-                        img = img.crop((left, top, left + side, top + side))
-                    if img.size != (400, 400):
-                        img = img.resize((400, 400), Image.Resampling.LANCZOS)
-                    img.save(img_path, quality=90, optimize=True)
-            except Exception as e:
-                print(f"[SERVICO.save] Erro ao processar imagem: {e}")
+        # Mantém o fim dos agendamentos futuros em dia com a duração
+        Agendamento.objects.filter(servico=self, data_hora__gte=timezone.now()).exclude(
+            data_hora_fim=F('data_hora') + timedelta(minutes=self.duracao)
+        ).update(
+            data_hora_fim=F('data_hora') + timedelta(minutes=self.duracao),
+            atualizado_em=timezone.now(),
+        )
 
 
 class ServicoImagem(models.Model):
     # Mantém o related_name padrão (servicoimagem_set)
     servico = models.ForeignKey(Servico, on_delete=models.CASCADE)
-    imagem = models.ImageField(upload_to="servicos/adicionais/")
+    imagem = models.ImageField(upload_to="servicos/adicionais/", storage=armazenamento.conteudo)
 
     def __str__(self):
         return f"Imagem de {self.servico.nome}"
@@ -95,18 +124,291 @@ class Agendamento(models.Model):
 
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='agendamentos')
     servico = models.ForeignKey(Servico, on_delete=models.SET_NULL, null=True, related_name='agendamentos')
+    # Nulo = agendamento anterior aos profissionais: ocupa a agenda de todos
+    profissional = models.ForeignKey(
+        Profissional, on_delete=models.SET_NULL, null=True, blank=True, related_name='agendamentos'
+    )
     data_hora = models.DateTimeField()
+    # Desnormalizado de servico.duracao (ver save e Servico.save) para as
+    # consultas de sobreposição: data_hora < fim_novo AND data_hora_fim > inicio_novo
+    data_hora_fim = models.DateTimeField(null=True, blank=True, editable=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Confirmado')
-    lembrete_enviado = models.BooleanField(default=False)
+    # Cursor do feed incremental do calendário (api_agendamentos?since=).
+    # .update() não passa pelo auto_now: quem atualiza em lote grava o campo.
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['data_hora']
+        indexes = [
+            models.Index(fields=['data_hora', 'data_hora_fim']),
+            # calendário do cliente (api_agendamentos para não-staff)
+            models.Index(fields=['cliente', 'data_hora']),
+        ]
 
     def __str__(self) -> str:
         nome_serv = self.servico.nome if self.servico else "Serviço Removido"
         nome_cli = self.cliente.nome if self.cliente else "Cliente"
         return f'{nome_serv} para {nome_cli} em {self.data_hora.strftime("%d/%m/%Y %H:%M")}'
 
+    def calcular_fim(self):
+        duracao = self.servico.duracao if self.servico else None
+        if not duracao:
+            # sem serviço: a mesma duração que a grade usa para os horários
+            duracao = ConfiguracaoAgenda.carregar().duracao_padrao or DURACAO_PADRAO_MINUTOS
+        return self.data_hora + timedelta(minutes=duracao)
+
+    def save(self, *args, **kwargs):
+        if self.data_hora:
+            self.data_hora_fim = self.calcular_fim()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'data_hora_fim' not in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'data_hora_fim'}
+        super().save(*args, **kwargs)
+
+
+class AgendamentoRemovido(models.Model):
+    """
+    Registro de exclusão para o feed incremental do calendário: quem já tem
+    os eventos em tela precisa saber quais sumiram desde o último cursor.
+    Guardado por RETENCAO_REMOVIDOS (ver signals.agendamento_excluido).
+    """
+    agendamento_id = models.PositiveIntegerField()
+    # sem FK: o cliente também pode ter sido excluído
+    cliente_id = models.PositiveIntegerField(null=True, blank=True)
+    removido_em = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['removido_em']
+
+    def __str__(self) -> str:
+        return f'Agendamento #{self.agendamento_id} removido em {self.removido_em:%d/%m/%Y %H:%M}'
+
+
+RETENCAO_REMOVIDOS = timedelta(days=7)
+
+
+# ============================
+# CONFIGURAÇÃO DA AGENDA
+# ============================
+
+class ConfiguracaoAgenda(models.Model):
+    """Parâmetros gerais da agenda (linha única, pk=1)."""
+    intervalo = models.PositiveIntegerField(default=30, help_text="Intervalo entre horários (minutos)")
+    duracao_padrao = models.PositiveIntegerField(default=60, help_text="Duração usada quando o serviço não é informado (minutos)")
+    lembretes = models.CharField(
+        max_length=100, default="1440,120,15",
+        help_text="Antecedências dos lembretes por e-mail (minutos, separadas por vírgula)",
+    )
+
+    class Meta:
+        verbose_name = "Configuração da agenda"
+        verbose_name_plural = "Configuração da agenda"
+
+    def __str__(self):
+        return "Configuração da agenda"
+
+    @classmethod
+    def carregar(cls) -> "ConfiguracaoAgenda":
+        # sem criar a linha: gravar aqui invalidaria a grade que está sendo compilada
+        return cls.objects.filter(pk=1).first() or cls(pk=1)
+
+    def etapas_lembrete(self) -> list[int]:
+        """Antecedências dos lembretes em minutos, da maior para a menor."""
+        return sorted({int(m) for m in re.findall(r'\d+', self.lembretes) if int(m) > 0}, reverse=True)
+
+
+class HorarioFuncionamento(models.Model):
+    """Expediente de um dia da semana, com pausa opcional (ex.: almoço)."""
+    DIAS_SEMANA = [
+        (0, 'Segunda-feira'),
+        (1, 'Terça-feira'),
+        (2, 'Quarta-feira'),
+        (3, 'Quinta-feira'),
+        (4, 'Sexta-feira'),
+        (5, 'Sábado'),
+        (6, 'Domingo'),
+    ]
+
+    dia_semana = models.PositiveSmallIntegerField(choices=DIAS_SEMANA, unique=True)
+    aberto = models.BooleanField(default=True)
+    abre = models.TimeField(default=time(9, 0))
+    fecha = models.TimeField(default=time(18, 0))
+    pausa_inicio = models.TimeField(blank=True, null=True)
+    pausa_fim = models.TimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['dia_semana']
+        verbose_name = "Horário de funcionamento"
+        verbose_name_plural = "Horários de funcionamento"
+
+    def __str__(self):
+        return self.get_dia_semana_display()
+
+    def clean(self):
+        if self.aberto and self.abre >= self.fecha:
+            raise ValidationError('O horário de abertura deve ser antes do fechamento.')
+        if bool(self.pausa_inicio) != bool(self.pausa_fim):
+            raise ValidationError('Informe início e fim da pausa.')
+        if self.pausa_inicio and self.pausa_inicio >= self.pausa_fim:
+            raise ValidationError('O início da pausa deve ser antes do fim.')
+
+
+class ExcecaoAgenda(models.Model):
+    """Feriado (fechado) ou expediente diferente numa data específica."""
+    data = models.DateField(unique=True)
+    descricao = models.CharField(max_length=120, blank=True)
+    fechado = models.BooleanField(default=True, help_text="Desmarque para usar o horário especial abaixo")
+    abre = models.TimeField(blank=True, null=True)
+    fecha = models.TimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['data']
+        verbose_name = "Exceção da agenda"
+        verbose_name_plural = "Exceções da agenda (feriados/horários especiais)"
+
+    def __str__(self):
+        return f"{self.data.strftime('%d/%m/%Y')} {self.descricao}".strip()
+
+    def clean(self):
+        if not self.fechado and not (self.abre and self.fecha and self.abre < self.fecha):
+            raise ValidationError('Informe abertura e fechamento do horário especial.')
+
+
+class DiaAgenda(models.Model):
+    """
+    Uma linha por dia com agendamentos. Serve de trava: a reserva de um
+    horário atualiza a linha do dia antes de checar conflitos, serializando
+    reservas concorrentes do mesmo dia (ver reservas.reservar_horario).
+    """
+    data = models.DateField(unique=True)
+    reservas = models.PositiveIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return self.data.strftime("%d/%m/%Y")
+
+
+class ReservaTemporaria(models.Model):
+    """
+    Segura um horário enquanto o usuário está na tela de confirmação.
+    Conta como ocupado para os outros até `expira_em`; depois disso é
+    ignorada e removida em lote (reservas.limpar_reservas_expiradas).
+    """
+    servico = models.ForeignKey(Servico, on_delete=models.CASCADE, related_name='reservas_temporarias')
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservas_temporarias')
+    profissional = models.ForeignKey(Profissional, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    data_hora = models.DateTimeField()
+    data_hora_fim = models.DateTimeField()
+    expira_em = models.DateTimeField(db_index=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['data_hora']
+        indexes = [models.Index(fields=['data_hora', 'expira_em'])]
+
+    def __str__(self) -> str:
+        return f'Reserva de {self.usuario} em {self.data_hora.strftime("%d/%m/%Y %H:%M")}'
+
+
+class ResumoDiario(models.Model):
+    """
+    Agregado por (dia local, serviço, status) lido pelo dashboard e pelo stats.
+    Mantido pelos signals de Agendamento (ver resumo.py).
+    """
+    data = models.DateField()
+    servico = models.ForeignKey(Servico, on_delete=models.CASCADE, null=True, blank=True, related_name='resumos_diarios')
+    status = models.CharField(max_length=20)
+    quantidade = models.IntegerField(default=0)
+    receita = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['data']
+        constraints = [
+            models.UniqueConstraint(fields=['data', 'servico', 'status'], name='resumo_diario_unico'),
+        ]
+        indexes = [models.Index(fields=['data', 'status'])]
+
+    def __str__(self) -> str:
+        return f'{self.data:%d/%m/%Y} {self.status}: {self.quantidade}'
+
+
+class RelatorioJob(models.Model):
+    """
+    Geração de relatório (PDF) em segundo plano — ver relatorios.py.
+    `chave` identifica os parâmetros: pedidos iguais em pouco tempo reutilizam
+    o mesmo job/arquivo.
+    """
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('processando', 'Processando'),
+        ('pronto', 'Pronto'),
+        ('erro', 'Erro'),
+    ]
+
+    chave = models.CharField(max_length=40, db_index=True)
+    parametros = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default='pendente')
+    arquivo = models.FileField(upload_to='relatorios/', storage=armazenamento.privado, blank=True)
+    linhas = models.PositiveIntegerField(default=0)
+    erro = models.TextField(blank=True)
+    criado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    criado_em = models.DateTimeField(auto_now_add=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-criado_em']
+
+    def __str__(self) -> str:
+        return f'Relatório #{self.pk} ({self.get_status_display()})'
+
+
+class LembreteEnviado(models.Model):
+    """Etapa de lembrete (antecedência em minutos) já enviada para o agendamento — ver lembretes.py."""
+    agendamento = models.ForeignKey(Agendamento, on_delete=models.CASCADE, related_name='lembretes')
+    antecedencia = models.PositiveIntegerField()
+    enviado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['agendamento', 'antecedencia'], name='lembrete_por_etapa'),
+        ]
+
+    def __str__(self) -> str:
+        return f'Lembrete de {self.antecedencia} min — agendamento #{self.agendamento_id}'
+
+
+class EmailPendente(models.Model):
+    """
+    Caixa de saída de e-mails (ver caixa_saida.py): gravada na mesma
+    transação que origina a mensagem e enviada depois pelo processar_emails.
+    `chave` é a chave de idempotência — a mesma mensagem não entra duas vezes.
+    """
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('enviando', 'Enviando'),
+        ('enviado', 'Enviado'),
+        ('falhou', 'Falhou'),
+    ]
+
+    chave = models.CharField(max_length=120, unique=True)
+    assunto = models.CharField(max_length=255)
+    mensagem = models.TextField()
+    remetente = models.CharField(max_length=255)
+    destinatarios = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pendente')
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    # Próximo envio (pendente) ou fim da reserva do worker (enviando)
+    proxima_tentativa = models.DateTimeField(default=timezone.now)
+    ultimo_erro = models.TextField(blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    enviado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['criado_em']
+        indexes = [models.Index(fields=['status', 'proxima_tentativa'])]
+
+    def __str__(self) -> str:
+        return f'{self.assunto} → {", ".join(self.destinatarios)} ({self.get_status_display()})'
+
 
 # ============================
 # RESULTADOS (ALUNAS) — vitrine pública
@@ -115,7 +417,7 @@ class Agendamento(models.Model):
 class ResultadoAluna(models.Model):
     nome_aluna = models.CharField(max_length=120)
     tecnica = models.CharField(max_length=120)
-    foto = models.ImageField(upload_to="resultados/")
+    foto = models.ImageField(upload_to="resultados/", storage=armazenamento.conteudo)
     ativo = models.BooleanField(default=True)
     ordem = models.PositiveIntegerField(default=0, db_index=True, help_text="Ordenação manual (menor primeiro)")
     criado_em = models.DateTimeField(auto_now_add=True)
@@ -132,7 +434,7 @@ class ResultadoAluna(models.Model):
 # ============================
 
 class ProvaSocial(models.Model):
-    imagem = models.ImageField(upload_to="provas/")
+    imagem = models.ImageField(upload_to="provas/", storage=armazenamento.conteudo)
     legenda = models.CharField(max_length=160, blank=True)
     ativo = models.BooleanField(default=True)
     ordem = models.PositiveIntegerField(default=0, db_index=True)
@@ -147,6 +449,32 @@ class ProvaSocial(models.Model):
         return self.legenda or f"ProvaSocial #{self.pk}"
 
 
+class ImagemDerivada(models.Model):
+    """
+    Versão redimensionada (WebP ou JPEG) de uma imagem enviada, para o
+    srcset das páginas públicas — ver imagens.py e a tag imagem_responsiva.
+    `origem` é o nome do arquivo original no storage: trocar a imagem deixa
+    as derivadas antigas sem uso, até o comando coletar_midia.
+    """
+    FORMATO_CHOICES = [('webp', 'WebP'), ('jpeg', 'JPEG')]
+
+    origem = models.CharField(max_length=255, db_index=True)
+    formato = models.CharField(max_length=4, choices=FORMATO_CHOICES)
+    largura = models.PositiveIntegerField()
+    altura = models.PositiveIntegerField()
+    arquivo = models.FileField(upload_to='derivadas/', storage=armazenamento.conteudo, max_length=255)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['origem', 'formato', 'largura']
+        constraints = [
+            models.UniqueConstraint(fields=['origem', 'formato', 'largura'], name='derivada_unica'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.origem} ({self.formato}, {self.largura}w)'
+
+
 # ============================
 # EXTRAS
 # ============================
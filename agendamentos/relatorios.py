@@ -0,0 +1,225 @@
+# agendamentos/relatorios.py
+"""
+Relatórios de agendamentos fora da requisição.
+
+`solicitar` cria (ou reaproveita) um RelatorioJob e o entrega, após o commit,
+a um pool local de threads. `gerar` lê os agendamentos em blocos
+(values_list + iterator), desenha o PDF página a página num arquivo
+temporário e grava o resultado no storage privado. A view só acompanha o
+status e serve o arquivo pronto.
+
+Pedidos com os mesmos parâmetros dentro de REUTILIZAR_POR devolvem o job
+existente (em andamento ou pronto) em vez de gerar outro arquivo.
+
+O PDF tem nomes de clientes: vai para o storage privado (armazenamento.py),
+fora de MEDIA_ROOT e com nome aleatório, e só sai pela view de download
+(staff). Jobs com mais de EXPIRA_EM saem, com o arquivo, pelo comando
+limpar_relatorios.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import hashlib
+import json
+import logging
+import os
+import secrets
+import tempfile
+import threading
+
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Agendamento, RelatorioJob
+
+logger = logging.getLogger(__name__)
+
+REUTILIZAR_POR = timedelta(minutes=10)
+EXPIRA_EM = timedelta(days=7)
+MAX_WORKERS = 1
+LINHAS_POR_PAGINA = 40
+CHUNK = 2000
+FILTROS = ("inicio", "fim", "status", "servico_id")
+
+_executor: ThreadPoolExecutor | None = None
+_executor_trava = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_trava:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="relatorios")
+        return _executor
+
+
+# ---------- filtros (compartilhados com a exportação CSV) ----------
+
+def filtrar_agendamentos(params) -> QuerySet:
+    """
+    Agendamentos filtrados por inicio/fim (AAAA-MM-DD, inclusivos), status e
+    servico_id. ValueError com a mensagem para o usuário.
+    """
+    qs = Agendamento.objects.all()
+    fuso = timezone.get_current_timezone()
+    inicio_str, fim_str = params.get("inicio", ""), params.get("fim", "")
+    if inicio_str:
+        inicio = parse_date(inicio_str)
+        if inicio is None:
+            raise ValueError("Data inicial inválida.")
+        qs = qs.filter(data_hora__gte=timezone.make_aware(datetime.combine(inicio, datetime.min.time()), fuso))
+    if fim_str:
+        fim = parse_date(fim_str)
+        if fim is None:
+            raise ValueError("Data final inválida.")
+        qs = qs.filter(data_hora__lt=timezone.make_aware(datetime.combine(fim + timedelta(days=1), datetime.min.time()), fuso))
+    status = params.get("status", "")
+    if status:
+        if status not in dict(Agendamento.STATUS_CHOICES):
+            raise ValueError("Status inválido.")
+        qs = qs.filter(status=status)
+    servico_id = params.get("servico_id", "")
+    if servico_id:
+        if not str(servico_id).isdigit():
+            raise ValueError("Serviço inválido.")
+        qs = qs.filter(servico_id=int(servico_id))
+    return qs
+
+
+def normalizar_parametros(params) -> dict:
+    return {k: str(params.get(k, "")).strip() for k in FILTROS if str(params.get(k, "")).strip()}
+
+
+def chave_parametros(parametros: dict) -> str:
+    return hashlib.sha1(json.dumps(parametros, sort_keys=True).encode()).hexdigest()
+
+
+# ---------- jobs ----------
+
+def solicitar(params, usuario=None) -> RelatorioJob:
+    """Valida os filtros e devolve o job (novo ou reaproveitado)."""
+    parametros = normalizar_parametros(params)
+    filtrar_agendamentos(parametros)  # valida antes de enfileirar
+    chave = chave_parametros(parametros)
+
+    existente = (
+        RelatorioJob.objects.filter(
+            chave=chave,
+            criado_em__gte=timezone.now() - REUTILIZAR_POR,
+            status__in=("pendente", "processando", "pronto"),
+        )
+        .order_by("-criado_em")
+        .first()
+    )
+    if existente:
+        return existente
+
+    job = RelatorioJob.objects.create(chave=chave, parametros=parametros, criado_por=usuario)
+    transaction.on_commit(lambda: _pool().submit(_executar, job.pk))
+    return job
+
+
+def _executar(job_id: int) -> None:
+    try:
+        gerar(job_id)
+    except Exception:
+        logger.exception("Falha ao gerar relatório %s", job_id)
+    finally:
+        close_old_connections()
+
+
+def gerar(job_id: int) -> RelatorioJob:
+    job = RelatorioJob.objects.get(pk=job_id)
+    RelatorioJob.objects.filter(pk=job.pk).update(status="processando")
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen.canvas import Canvas
+    except ImportError:
+        return _falhar(job, "Biblioteca 'reportlab' não instalada. Rode: pip install reportlab")
+
+    linhas = (
+        filtrar_agendamentos(job.parametros)
+        .order_by("data_hora", "id")
+        .values_list("data_hora", "cliente__nome", "servico__nome", "status")
+        .iterator(chunk_size=CHUNK)
+    )
+    fd, caminho = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        total = _desenhar(Canvas(caminho, pagesize=A4, pageCompression=1), A4, linhas)
+        with open(caminho, "rb") as f:
+            job.arquivo.save(f"relatorio_{job.pk}_{secrets.token_urlsafe(16)}.pdf", File(f), save=False)
+    except Exception as e:
+        return _falhar(job, f"Erro ao gerar relatório: {e}")
+    finally:
+        os.remove(caminho)
+
+    job.status = "pronto"
+    job.linhas = total
+    job.concluido_em = timezone.now()
+    job.save(update_fields=["arquivo", "status", "linhas", "concluido_em"])
+    return job
+
+
+def limpar_expirados(expira_em: timedelta = EXPIRA_EM) -> int:
+    """Apaga os jobs (e os PDFs) criados há mais de `expira_em`; devolve quantos."""
+    expirados = list(RelatorioJob.objects.filter(criado_em__lt=timezone.now() - expira_em))
+    for job in expirados:
+        if job.arquivo:
+            job.arquivo.delete(save=False)
+    RelatorioJob.objects.filter(pk__in=[j.pk for j in expirados]).delete()
+    return len(expirados)
+
+
+def _falhar(job: RelatorioJob, mensagem: str) -> RelatorioJob:
+    job.status = "erro"
+    job.erro = mensagem
+    job.concluido_em = timezone.now()
+    job.save(update_fields=["status", "erro", "concluido_em"])
+    return job
+
+
+def _desenhar(canvas, tamanho, linhas) -> int:
+    """Escreve as linhas em páginas de LINHAS_POR_PAGINA; devolve o total."""
+    largura, altura = tamanho
+    colunas = (40, 150, 340, 480)
+    gerado_em = timezone.localtime().strftime("Gerado em %d/%m/%Y %H:%M")
+
+    def cabecalho(pagina):
+        canvas.setFont("Helvetica-Bold", 14)
+        canvas.drawString(40, altura - 50, "Relatório de Agendamentos")
+        canvas.setFont("Helvetica", 8)
+        canvas.drawString(40, altura - 64, f"{gerado_em} — página {pagina}")
+        canvas.setFont("Helvetica-Bold", 9)
+        for x, titulo in zip(colunas, ("Data e Hora", "Cliente", "Serviço", "Status")):
+            canvas.drawString(x, altura - 90, titulo)
+        canvas.line(40, altura - 94, largura - 40, altura - 94)
+        canvas.setFont("Helvetica", 9)
+
+    total, pagina, y = 0, 1, altura - 110
+    cabecalho(pagina)
+    for data_hora, cliente, servico, status in linhas:
+        if total and total % LINHAS_POR_PAGINA == 0:
+            canvas.showPage()
+            pagina += 1
+            cabecalho(pagina)
+            y = altura - 110
+        valores = (
+            timezone.localtime(data_hora).strftime("%d/%m/%Y %H:%M"),
+            (cliente or "—")[:32],
+            (servico or "—")[:28],
+            status,
+        )
+        for x, valor in zip(colunas, valores):
+            canvas.drawString(x, y, valor)
+        y -= 16
+        total += 1
+    if not total:
+        canvas.drawString(40, y, "Nenhum agendamento para os filtros escolhidos.")
+    canvas.showPage()
+    canvas.save()
+    return total
@@ -0,0 +1,139 @@
+# agendamentos/reservas.py
+"""
+Reserva atômica de horários.
+
+Checar conflito e criar o agendamento em passos separados permite que duas
+requisições simultâneas passem pela checagem e reservem o mesmo horário.
+Aqui ambos acontecem na mesma transação, depois de travar o dia:
+
+- PostgreSQL/MySQL: o UPDATE na linha de DiaAgenda toma um lock de linha,
+  e a segunda transação espera a primeira terminar antes de checar. Na
+  primeira reserva do dia a linha ainda não existe: quem perde a corrida do
+  INSERT volta para o UPDATE (que lê a versão confirmada, mesmo no
+  REPEATABLE READ do MySQL, onde um SELECT não enxergaria a linha nova);
+- SQLite: as transações abrem com BEGIN IMMEDIATE (settings), então só
+  uma escreve por vez e a checagem sempre enxerga a reserva anterior.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import condicional, disponibilidade
+from .disponibilidade import escolher_profissional
+from .grade import obter_grade
+from .models import Agendamento, Cliente, DiaAgenda, Profissional, ReservaTemporaria, Servico
+
+# Quanto tempo a tela de confirmação segura o horário
+VALIDADE_RESERVA_TEMPORARIA = timedelta(minutes=5)
+
+
+class HorarioIndisponivel(Exception):
+    """Nenhum profissional candidato está livre no horário pedido."""
+
+
+def travar_dia(data_hora: datetime) -> None:
+    """Trava o dia de `data_hora` até o fim da transação corrente."""
+    dia = timezone.localtime(data_hora).date()
+    while not DiaAgenda.objects.filter(data=dia).update(reservas=F("reservas") + 1):
+        # primeira reserva do dia: a linha inserida já fica travada por esta
+        # transação. Se outra a criou ao mesmo tempo, o INSERT falha só no
+        # savepoint e o UPDATE seguinte espera o lock dela.
+        try:
+            with transaction.atomic():
+                DiaAgenda.objects.create(data=dia, reservas=1)
+            return
+        except IntegrityError:
+            continue
+
+
+def _profissional_livre(servico: Servico, data_hora: datetime, usuario, profissional: Profissional | None):
+    recursos = obter_grade().recursos(servico.id, profissional.id if profissional else None)
+    livre, profissional_id = escolher_profissional(
+        data_hora, servico.duracao, recursos, ignorar_usuario=usuario
+    )
+    if not livre:
+        raise HorarioIndisponivel("Este horário não está mais disponível.")
+    return profissional_id
+
+
+def reservar_horario(
+    *,
+    servico: Servico,
+    cliente: Cliente | None,
+    data_hora: datetime,
+    status: str = "Pendente",
+    usuario=None,
+    profissional: Profissional | None = None,
+) -> Agendamento:
+    """
+    Cria o agendamento se [data_hora, data_hora + duração) estiver livre para
+    `profissional` (ou, sem ele, para algum profissional que atende o serviço,
+    que fica atribuído ao agendamento). Levanta HorarioIndisponivel caso contrário.
+
+    Reservas temporárias de `usuario` não contam como conflito e são
+    consumidas na mesma transação.
+    """
+    with transaction.atomic():
+        travar_dia(data_hora)
+        profissional_id = _profissional_livre(servico, data_hora, usuario, profissional)
+        if usuario is not None:
+            ReservaTemporaria.objects.filter(usuario=usuario).delete()
+        return Agendamento.objects.create(
+            servico=servico,
+            cliente=cliente,
+            profissional_id=profissional_id,
+            data_hora=data_hora,
+            status=status,
+        )
+
+
+def segurar_horario(
+    *,
+    servico: Servico,
+    usuario,
+    data_hora: datetime,
+    profissional: Profissional | None = None,
+) -> ReservaTemporaria:
+    """
+    Segura o horário para `usuario` por VALIDADE_RESERVA_TEMPORARIA.
+    Cada usuário tem no máximo uma reserva temporária (a anterior é trocada).
+    Levanta HorarioIndisponivel se o horário já estiver ocupado.
+    """
+    limpar_reservas_expiradas()
+    agora = timezone.now()
+    with transaction.atomic():
+        travar_dia(data_hora)
+        profissional_id = _profissional_livre(servico, data_hora, usuario, profissional)
+        anteriores = list(
+            ReservaTemporaria.objects.filter(usuario=usuario).values_list("data_hora", flat=True)
+        )
+        ReservaTemporaria.objects.filter(usuario=usuario).delete()
+        reserva = ReservaTemporaria.objects.create(
+            servico=servico,
+            usuario=usuario,
+            profissional_id=profissional_id,
+            data_hora=data_hora,
+            data_hora_fim=data_hora + timedelta(minutes=servico.duracao),
+            expira_em=agora + VALIDADE_RESERVA_TEMPORARIA,
+        )
+        dias = {timezone.localtime(dh).date() for dh in [data_hora, *anteriores]}
+
+        def _invalidar():
+            for dia in dias:
+                disponibilidade.invalidar_dia(dia)
+            condicional.marcar_alteracao()
+            condicional.registrar_reserva_temporaria(reserva.expira_em)
+
+        _invalidar()
+        transaction.on_commit(_invalidar)
+    return reserva
+
+
+def limpar_reservas_expiradas() -> int:
+    """Remove as reservas vencidas com um único DELETE."""
+    removidas, _ = ReservaTemporaria.objects.filter(expira_em__lte=timezone.now()).delete()
+    return removidas
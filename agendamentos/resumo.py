@@ -0,0 +1,190 @@
+# agendamentos/resumo.py
+"""
+Resumo diário de agendamentos: uma linha por (dia, serviço, status) com a
+quantidade e a receita (Servico.preco). Dashboard e stats leem daqui em vez
+de varrer/agrupar Agendamento.
+
+Mantido de forma incremental pelos signals (cada gravação move 1 unidade de
+uma chave para outra, com UPDATE ... SET quantidade = quantidade ± 1) e
+reconstruível do zero com `manage.py reconstruir_resumo`.
+
+A receita acompanha o preço ATUAL do serviço: a troca de preço reescreve as
+linhas do serviço (ver signals.servico_preco_alterado). As leituras sempre
+somam (Sum), então duas linhas para a mesma chave não alteram os totais.
+
+Cada mês do resumo tem uma versão no cache (resumo:v:AAAA-MM), trocada a
+cada alteração — agora e de novo após o commit, como em disponibilidade.py.
+Quem guarda agregados derivados do resumo (estatisticas.py) inclui as
+versões dos meses cobertos na chave.
+"""
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import uuid
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Agendamento, ResumoDiario, Servico
+
+CACHE_PREFIXO = "resumo"
+
+
+def _chave_versao(ano: int, mes: int) -> str:
+    return f"{CACHE_PREFIXO}:v:{ano}-{mes:02d}"
+
+
+def _chave_geracao() -> str:
+    return f"{CACHE_PREFIXO}:geracao"
+
+
+def _novo_token() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def _meses(inicio: date, fim: date) -> list[tuple[int, int]]:
+    meses, ano, mes = [], inicio.year, inicio.month
+    while (ano, mes) <= (fim.year, fim.month):
+        meses.append((ano, mes))
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+    return meses
+
+
+def versao_periodo(inicio: date, fim: date) -> str:
+    """Token que muda quando qualquer dia de [inicio, fim] muda no resumo."""
+    chaves = [_chave_geracao()] + [_chave_versao(a, m) for a, m in _meses(inicio, fim)]
+    atuais = cache.get_many(chaves)
+    faltando = [k for k in chaves if k not in atuais]
+    if faltando:
+        for chave in faltando:
+            cache.add(chave, _novo_token(), None)
+        atuais.update(cache.get_many(faltando))
+    return ":".join(atuais.get(k, "") for k in chaves)
+
+
+def _invalidar_mes(dia: date) -> None:
+    chave = _chave_versao(dia.year, dia.month)
+
+    def _executar():
+        cache.set(chave, _novo_token(), None)
+
+    _executar()
+    transaction.on_commit(_executar)
+
+
+def invalidar_tudo() -> None:
+    def _executar():
+        cache.set(_chave_geracao(), _novo_token(), None)
+
+    _executar()
+    transaction.on_commit(_executar)
+
+
+# (dia, servico_id, status)
+Chave = tuple
+
+
+def chave_de(data_hora: datetime | None, servico_id: int | None, status: str | None) -> Chave | None:
+    if data_hora is None or not status:
+        return None
+    return (timezone.localtime(data_hora).date(), servico_id, status)
+
+
+def _preco(servico_id: int | None) -> Decimal:
+    if not servico_id:
+        return Decimal("0")
+    return Servico.objects.filter(pk=servico_id).values_list("preco", flat=True).first() or Decimal("0")
+
+
+def aplicar(chave: Chave, delta: int) -> None:
+    """Soma `delta` agendamentos (e a receita correspondente) na chave."""
+    dia, servico_id, status = chave
+    _invalidar_mes(dia)
+    receita = _preco(servico_id) * delta
+    filtro = {"data": dia, "servico_id": servico_id, "status": status}
+    if servico_id is None:
+        filtro = {"data": dia, "servico__isnull": True, "status": status}
+    atualizados = ResumoDiario.objects.filter(**filtro).update(
+        quantidade=F("quantidade") + delta, receita=F("receita") + receita
+    )
+    if atualizados:
+        return
+    try:
+        with transaction.atomic():
+            ResumoDiario.objects.create(
+                data=dia, servico_id=servico_id, status=status, quantidade=delta, receita=receita
+            )
+    except IntegrityError:
+        # outra transação criou a linha entre o UPDATE e o INSERT
+        ResumoDiario.objects.filter(**filtro).update(
+            quantidade=F("quantidade") + delta, receita=F("receita") + receita
+        )
+
+
+def registrar(antiga: Chave | None, nova: Chave | None) -> None:
+    """Move um agendamento de `antiga` para `nova` (None = não existia / removido)."""
+    if antiga == nova:
+        return
+    if antiga is not None:
+        aplicar(antiga, -1)
+    if nova is not None:
+        aplicar(nova, +1)
+
+
+def reconstruir(inicio: date | None = None, fim: date | None = None) -> int:
+    """
+    Refaz o resumo de [inicio, fim] (datas locais, inclusivas; None = sem
+    limite) a partir de Agendamento. Devolve o número de linhas gravadas.
+    """
+    agendamentos = Agendamento.objects.all()
+    resumos = ResumoDiario.objects.all()
+    fuso = timezone.get_current_timezone()
+    if inicio:
+        agendamentos = agendamentos.filter(
+            data_hora__gte=timezone.make_aware(datetime.combine(inicio, datetime.min.time()), fuso)
+        )
+        resumos = resumos.filter(data__gte=inicio)
+    if fim:
+        agendamentos = agendamentos.filter(
+            data_hora__lt=timezone.make_aware(datetime.combine(fim + timedelta(days=1), datetime.min.time()), fuso)
+        )
+        resumos = resumos.filter(data__lte=fim)
+
+    linhas = (
+        agendamentos.annotate(dia=TruncDate("data_hora", tzinfo=fuso))
+        .values("dia", "servico_id", "status")
+        .annotate(
+            n=Count("id"),
+            total=Coalesce(Sum("servico__preco"), Value(Decimal("0")), output_field=DecimalField()),
+        )
+        .order_by()
+    )
+    invalidar_tudo()
+    with transaction.atomic():
+        resumos.delete()
+        criados = ResumoDiario.objects.bulk_create(
+            [
+                ResumoDiario(
+                    data=l["dia"], servico_id=l["servico_id"], status=l["status"],
+                    quantidade=l["n"], receita=l["total"],
+                )
+                for l in linhas.iterator(chunk_size=2000)
+            ],
+            batch_size=1000,
+        )
+    return len(criados)
+
+
+def por_dia_e_status(inicio: date, fim: date) -> dict[tuple[date, str], int]:
+    """{(dia, status): quantidade} em [inicio, fim], numa consulta."""
+    qs = (
+        ResumoDiario.objects.filter(data__gte=inicio, data__lte=fim)
+        .values("data", "status")
+        .annotate(n=Sum("quantidade"))
+        .order_by()
+    )
+    return {(l["data"], l["status"]): l["n"] for l in qs}
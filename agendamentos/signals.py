@@ -0,0 +1,225 @@
+# agendamentos/signals.py
+"""
+Invalidação do cache de disponibilidade, da grade de horários e da versão
+global usada no GET condicional (condicional.py).
+
+Qualquer gravação/exclusão de Agendamento troca a versão do(s) dia(s)
+afetado(s) — agora e de novo após o commit, para que uma leitura
+concorrente não deixe em cache o estado anterior ao commit.
+
+Também mantém o feed incremental do calendário: exclusões viram
+AgendamentoRemovido e mudanças em cliente/serviço que aparecem no evento
+tocam `atualizado_em` dos agendamentos ligados.
+
+Criação, troca de status e remarcação de Agendamento são publicadas no canal
+de eventos (eventos.central) depois do commit, e toda gravação atualiza o
+resumo diário (resumo.py) na mesma transação.
+
+Troca da imagem de um Servico agenda o processamento em segundo plano
+(imagens.py); salvar sem trocar a imagem não reprocessa nada. Nas outras
+imagens públicas (galeria do serviço, resultados, provas sociais) a troca
+agenda só as derivadas responsivas.
+"""
+from django.db import transaction
+from django.db.models import F, Max, Min
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import condicional, disponibilidade, eventos, grade, imagens, metricas, resumo
+from .models import (
+    RETENCAO_REMOVIDOS, Agendamento, AgendamentoRemovido, Cliente, ConfiguracaoAgenda, ExcecaoAgenda,
+    HorarioFuncionamento, Profissional, ProvaSocial, ResultadoAluna, ResumoDiario, Servico, ServicoImagem,
+)
+
+# Campos de Cliente/Servico exibidos nos eventos do calendário
+_CAMPOS_EVENTO = {Cliente: ("nome", "email", "telefone"), Servico: ("nome",)}
+
+# Imagens das páginas públicas que ganham derivadas (a de Servico vai por imagens.processar)
+_IMAGENS_PUBLICAS = {ServicoImagem: "imagem", ResultadoAluna: "foto", ProvaSocial: "imagem"}
+
+
+def _invalidar(*datas_hora):
+    dias = {timezone.localtime(dh).date() for dh in datas_hora if dh}
+
+    def _executar():
+        for dia in dias:
+            disponibilidade.invalidar_dia(dia)
+        condicional.marcar_alteracao()
+        metricas.invalidar()
+
+    _executar()
+    transaction.on_commit(_executar)
+
+
+@receiver(post_init, sender=Agendamento)
+def guardar_estado_original(sender, instance, **kwargs):
+    # via __dict__ para não disparar consulta quando o campo vem adiado (.only/.defer)
+    instance._data_hora_original = instance.__dict__.get("data_hora")
+    instance._status_original = instance.__dict__.get("status")
+    instance._servico_id_original = instance.__dict__.get("servico_id")
+
+
+def _chave_original(instance):
+    return resumo.chave_de(instance._data_hora_original, instance._servico_id_original, instance._status_original)
+
+
+@receiver(post_save, sender=Agendamento)
+def agendamento_salvo(sender, instance, created, **kwargs):
+    _invalidar(instance.data_hora, instance._data_hora_original)
+    resumo.registrar(
+        None if created else _chave_original(instance),
+        resumo.chave_de(instance.data_hora, instance.servico_id, instance.status),
+    )
+    if created:
+        acao = "criado"
+    elif instance.status != instance._status_original:
+        acao = "status"
+    elif instance.data_hora != instance._data_hora_original:
+        acao = "remarcado"
+    else:
+        acao = None
+    if acao:
+        evento = eventos.evento_agendamento(instance, acao)
+        cliente_id = instance.cliente_id
+        transaction.on_commit(lambda: eventos.central.publicar(evento, cliente_id))
+    instance._data_hora_original = instance.data_hora
+    instance._status_original = instance.status
+    instance._servico_id_original = instance.servico_id
+
+
+@receiver(post_delete, sender=Agendamento)
+def agendamento_excluido(sender, instance, **kwargs):
+    agora = timezone.now()
+    AgendamentoRemovido.objects.filter(removido_em__lt=agora - RETENCAO_REMOVIDOS).delete()
+    AgendamentoRemovido.objects.create(agendamento_id=instance.pk, cliente_id=instance.cliente_id)
+    resumo.registrar(_chave_original(instance), None)
+    _invalidar(instance.data_hora, instance._data_hora_original)
+
+
+def _tocar_agendamentos(**filtro):
+    """Leva os agendamentos ao feed incremental sem passar por save()."""
+    Agendamento.objects.filter(**filtro).update(atualizado_em=timezone.now())
+
+
+@receiver(post_init, sender=Cliente)
+@receiver(post_init, sender=Servico)
+def guardar_campos_do_evento(sender, instance, **kwargs):
+    instance._campos_evento_originais = tuple(instance.__dict__.get(c) for c in _CAMPOS_EVENTO[sender])
+
+
+@receiver(post_save, sender=Cliente)
+@receiver(post_save, sender=Servico)
+def campos_do_evento_salvos(sender, instance, created, **kwargs):
+    atuais = tuple(instance.__dict__.get(c) for c in _CAMPOS_EVENTO[sender])
+    if not created and atuais != instance._campos_evento_originais:
+        filtro = "cliente" if sender is Cliente else "servico"
+        _tocar_agendamentos(**{filtro: instance})
+    instance._campos_evento_originais = atuais
+
+
+@receiver(pre_delete, sender=Servico)
+def servico_sera_excluido(sender, instance, **kwargs):
+    # o SET_NULL do Django é um UPDATE em lote, sem auto_now nem signals
+    _tocar_agendamentos(servico=instance)
+    instance._periodo_resumo = Agendamento.objects.filter(servico=instance).aggregate(
+        inicio=Min("data_hora"), fim=Max("data_hora")
+    )
+
+
+@receiver(post_delete, sender=Servico)
+def servico_excluido(sender, instance, **kwargs):
+    # as linhas do serviço saíram em cascata; os agendamentos agora estão sem serviço
+    periodo = getattr(instance, "_periodo_resumo", None) or {}
+    if periodo.get("inicio"):
+        resumo.reconstruir(
+            timezone.localtime(periodo["inicio"]).date(), timezone.localtime(periodo["fim"]).date()
+        )
+
+
+@receiver(post_init, sender=Servico)
+def guardar_preco(sender, instance, **kwargs):
+    instance._preco_original = instance.__dict__.get("preco")
+
+
+@receiver(post_save, sender=Servico)
+def servico_preco_alterado(sender, instance, created, **kwargs):
+    # a receita do resumo acompanha o preço atual do serviço
+    if not created and instance.preco != instance._preco_original:
+        ResumoDiario.objects.filter(servico=instance).update(receita=F("quantidade") * instance.preco)
+        resumo.invalidar_tudo()
+    instance._preco_original = instance.preco
+
+
+def _nome_imagem(valor) -> str:
+    # em __dict__ fica o nome (str) ou, depois de acessado, o FieldFile
+    return getattr(valor, "name", valor) or ""
+
+
+@receiver(post_init, sender=Servico)
+def guardar_imagem(sender, instance, **kwargs):
+    instance._imagem_original = _nome_imagem(instance.__dict__.get("imagem"))
+
+
+@receiver(post_save, sender=Servico)
+def servico_imagem_alterada(sender, instance, created, **kwargs):
+    # só depois do save o nome é o definitivo: com o storage por conteúdo,
+    # reenviar os mesmos bytes dá o mesmo nome e não há o que processar
+    nome = _nome_imagem(instance.imagem)
+    if nome and nome != instance._imagem_original:
+        Servico.objects.filter(pk=instance.pk).update(imagem_status="pendente")
+        instance.imagem_status = "pendente"
+        imagens.agendar(instance.pk, nome)
+    instance._imagem_original = nome
+
+
+@receiver(post_init, sender=ServicoImagem)
+@receiver(post_init, sender=ResultadoAluna)
+@receiver(post_init, sender=ProvaSocial)
+def guardar_imagem_publica(sender, instance, **kwargs):
+    instance._imagem_original = _nome_imagem(instance.__dict__.get(_IMAGENS_PUBLICAS[sender]))
+
+
+@receiver(post_save, sender=ServicoImagem)
+@receiver(post_save, sender=ResultadoAluna)
+@receiver(post_save, sender=ProvaSocial)
+def imagem_publica_alterada(sender, instance, created, **kwargs):
+    arquivo = getattr(instance, _IMAGENS_PUBLICAS[sender])
+    if arquivo and arquivo.name != instance._imagem_original:
+        imagens.agendar_derivadas(arquivo)
+    instance._imagem_original = _nome_imagem(arquivo)
+
+
+@receiver([post_save, post_delete], sender=Servico)
+def servico_alterado(sender, instance, **kwargs):
+    # a duração dos serviços entra no cálculo de todos os dias
+    def _executar():
+        disponibilidade.invalidar_tudo()
+        condicional.marcar_alteracao()
+        metricas.invalidar()
+
+    _executar()
+    transaction.on_commit(_executar)
+
+
+@receiver([post_save, post_delete], sender=Cliente)
+def cliente_alterado(sender, instance, **kwargs):
+    # nome/e-mail/telefone aparecem nos eventos do calendário
+    condicional.marcar_alteracao()
+    transaction.on_commit(condicional.marcar_alteracao)
+
+
+@receiver([post_save, post_delete], sender=Profissional)
+@receiver(m2m_changed, sender=Servico.profissionais.through)
+@receiver([post_save, post_delete], sender=ConfiguracaoAgenda)
+@receiver([post_save, post_delete], sender=HorarioFuncionamento)
+@receiver([post_save, post_delete], sender=ExcecaoAgenda)
+def configuracao_alterada(sender, instance, **kwargs):
+    # recompila a grade e descarta todos os slots calculados com a anterior
+    def _executar():
+        grade.invalidar_grade()
+        disponibilidade.invalidar_tudo()
+        condicional.marcar_alteracao()
+
+    _executar()
+    transaction.on_commit(_executar)
@@ -0,0 +1,45 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from agendamentos import imagens
+
+register = template.Library()
+
+
+def _srcset(derivadas):
+    return ", ".join(f"{d.arquivo.url} {d.largura}w" for d in derivadas)
+
+
+@register.simple_tag
+def imagem_responsiva(arquivo, sizes="100vw", alt="", **attrs):
+    """
+    <picture> com srcset WebP + JPEG das derivadas (ImagemDerivada), largura
+    e altura intrínsecas e carregamento preguiçoso. Sem derivadas ainda, cai
+    num <img> com o arquivo original.
+
+    Uso: {% imagem_responsiva servico.imagem sizes="(min-width: 768px) 33vw, 100vw" alt=servico.nome class="card-img-top" %}
+    """
+    if not arquivo:
+        return ""
+    attrs = {"loading": "lazy", "decoding": "async", **attrs}
+    extras = format_html_join("", ' {}="{}"', ((k.replace("_", "-"), v) for k, v in attrs.items()))
+    derivadas = imagens.derivadas_de(arquivo)
+    jpeg = [d for d in derivadas if d.formato == "jpeg"]
+    if not jpeg:
+        return format_html('<img src="{}" alt="{}"{}>', arquivo.url, alt, extras)
+    webp = [d for d in derivadas if d.formato == "webp"]
+    maior = jpeg[-1]
+    fonte = format_html('<source type="image/webp" srcset="{}" sizes="{}">', _srcset(webp), sizes) if webp else ""
+    return format_html(
+        '<picture style="display:contents">{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}"{}></picture>',
+        fonte, maior.arquivo.url, _srcset(jpeg), sizes, maior.largura, maior.altura, alt, extras,
+    )
+
+
+@register.filter
+def maior_derivada(arquivo):
+    """URL da maior derivada JPEG (lightbox/modal); o original se não houver."""
+    if not arquivo:
+        return ""
+    jpeg = [d for d in imagens.derivadas_de(arquivo) if d.formato == "jpeg"]
+    return jpeg[-1].arquivo.url if jpeg else arquivo.url
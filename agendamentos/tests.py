@@ -1,3 +1,1188 @@
-from django.test import TestCase
+from datetime import date, datetime, time, timedelta
+from io import BytesIO, StringIO
+import asyncio
+import os
+import tempfile
+import threading
+from unittest import mock
+import warnings
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.template import Context, Template
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import armazenamento, caixa_saida, eventos, imagens, importacao, lembretes, relatorios, resumo
+from .disponibilidade import calcular_slots, ocupacoes_do_dia, slots_do_dia, tem_conflito
+from .grade import obter_grade
+from .models import (
+    Agendamento, Cliente, ConfiguracaoAgenda, DiaAgenda, EmailPendente, ExcecaoAgenda, HorarioFuncionamento, ImagemDerivada,
+    Profissional, ProvaSocial, RelatorioJob, ReservaTemporaria, ResultadoAluna, ResumoDiario, Servico,
+)
+from .reservas import HorarioIndisponivel, limpar_reservas_expiradas, reservar_horario, segurar_horario, travar_dia
+
+
+def _dt(d: date, h: int, m: int = 0) -> datetime:
+    return timezone.make_aware(datetime(d.year, d.month, d.day, h, m))
+
+
+class DisponibilidadeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dia = timezone.localdate() + timedelta(days=7)
+        cls.cliente = Cliente.objects.create(nome="Ana", email="ana@example.com")
+        cls.curto = Servico.objects.create(nome="Curto", descricao="", preco=50, duracao=30)
+        cls.longo = Servico.objects.create(nome="Longo", descricao="", preco=150, duracao=120)
+        cls.user = User.objects.create_user("ana", "ana@example.com", "senha-forte-123")
+
+    def setUp(self):
+        cache.clear()
+
+    def agendar(self, servico, h, m=0, status="Confirmado"):
+        return Agendamento.objects.create(
+            cliente=self.cliente, servico=servico, data_hora=_dt(self.dia, h, m), status=status
+        )
+
+    def ocupados(self, duracao):
+        slots = calcular_slots(self.dia, duracao, ocupacoes_do_dia(self.dia))
+        return [s["hora"] for s in slots if s["ocupado"]]
+
+    def test_usa_duracao_de_cada_agendamento(self):
+        # 10:00–12:00 (longo) deve bloquear slots de 30 min até 11:30
+        self.agendar(self.longo, 10)
+        self.assertEqual(self.ocupados(30), ["10:00", "10:30", "11:00", "11:30"])
+
+    def test_slot_vizinho_de_agendamento_curto_fica_livre(self):
+        self.agendar(self.curto, 10)
+        self.assertEqual(self.ocupados(60), ["09:30", "10:00"])
+
+    def test_ignora_cancelados(self):
+        self.agendar(self.longo, 10, status="Cancelado")
+        self.assertEqual(self.ocupados(60), [])
+
+    def test_tem_conflito(self):
+        self.agendar(self.curto, 10)
+        self.assertTrue(tem_conflito(_dt(self.dia, 9, 30), 60))
+        self.assertFalse(tem_conflito(_dt(self.dia, 10, 30), 60))
+
+    def test_conflito_usa_fim_de_cada_lado(self):
+        # 30 min às 11:30 logo após um de 120 min às 09:30
+        self.agendar(self.longo, 9, 30)
+        self.assertFalse(tem_conflito(_dt(self.dia, 11, 30), 30))
+        self.assertTrue(tem_conflito(_dt(self.dia, 11), 30))
+        self.assertTrue(tem_conflito(_dt(self.dia, 9), 60))
+
+    def test_fim_acompanha_duracao_do_servico(self):
+        ag = self.agendar(self.curto, 10)
+        self.assertEqual(ag.data_hora_fim, _dt(self.dia, 10, 30))
+        self.curto.duracao = 45
+        self.curto.save()
+        ag.refresh_from_db()
+        self.assertEqual(ag.data_hora_fim, _dt(self.dia, 10, 45))
+
+    def test_fim_sem_servico_usa_duracao_configurada(self):
+        ConfiguracaoAgenda.objects.create(pk=1, duracao_padrao=90)
+        ag = self.agendar(None, 10)
+        self.assertEqual(ag.data_hora_fim, _dt(self.dia, 11, 30))
+
+    def test_admin_mantem_configuracao_em_linha_unica(self):
+        admin_user = User.objects.create_superuser("admin", "admin@example.com", "senha-forte-123")
+        self.client.force_login(admin_user)
+        adicionar = reverse("admin:agendamentos_configuracaoagenda_add")
+        resp = self.client.post(adicionar, {"intervalo": 15, "duracao_padrao": 45, "lembretes": "60"})
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(ConfiguracaoAgenda.carregar().intervalo, 15)
+        self.assertEqual(self.client.get(adicionar).status_code, 403)
+        apagar = reverse("admin:agendamentos_configuracaoagenda_delete", args=[1])
+        self.assertEqual(self.client.post(apagar, {"post": "yes"}).status_code, 403)
+        self.assertTrue(ConfiguracaoAgenda.objects.filter(pk=1).exists())
+
+    def test_grade_respeita_pausa_e_feriado(self):
+        HorarioFuncionamento.objects.create(
+            dia_semana=self.dia.weekday(), abre=time(9), fecha=time(13), pausa_inicio=time(10), pausa_fim=time(11)
+        )
+        horas = [s["hora"] for s in slots_do_dia(self.dia, 60)]
+        self.assertEqual(horas, ["09:00", "11:00", "11:30", "12:00"])
+        # outros dias da semana ficam fechados quando algum foi configurado
+        self.assertEqual(slots_do_dia(self.dia + timedelta(days=1), 60), [])
+
+        ExcecaoAgenda.objects.create(data=self.dia, fechado=True, descricao="Feriado")
+        self.assertEqual(slots_do_dia(self.dia, 60), [])
+
+    def test_grade_compilada_uma_vez(self):
+        obter_grade()
+        with self.assertNumQueries(0):
+            obter_grade().inicios(self.dia, 45)
+        ConfiguracaoAgenda.objects.update_or_create(pk=1, defaults={"intervalo": 60})
+        self.assertEqual(obter_grade().intervalo, 60)
+
+    def test_api_horarios_uma_consulta_de_agendamentos(self):
+        self.agendar(self.longo, 14)
+        self.client.force_login(self.user)
+        url = reverse("agendamentos:api_horarios_disponiveis")
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url, {"data": self.dia.isoformat(), "servico_id": self.curto.id})
+        self.assertEqual(res.status_code, 200)
+        corpo = res.json()
+        self.assertIn("14:00", [s["hora"] for s in corpo["slots"] if s["ocupado"]])
+        self.assertNotIn("14:00", corpo["horarios"])
+        consultas = [q for q in ctx.captured_queries if "agendamentos_agendamento" in q["sql"]]
+        self.assertEqual(len(consultas), 1)
+
+    def test_api_periodo_uma_consulta_para_o_mes(self):
+        self.agendar(self.longo, 9)
+        self.client.force_login(self.user)
+        url = reverse("agendamentos:api_horarios_periodo")
+        fim = self.dia + timedelta(days=29)
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url, {"inicio": self.dia.isoformat(), "fim": fim.isoformat()})
+        self.assertEqual(res.status_code, 200)
+        dias = res.json()["dias"]
+        self.assertEqual(len(dias), 30)
+        self.assertEqual(dias[0]["livres"], len(dias[1]["horarios"]) - 4)
+        consultas = [q for q in ctx.captured_queries if "agendamentos_agendamento" in q["sql"]]
+        self.assertEqual(len(consultas), 1)
+
+    def test_api_agendamentos_respeita_janela_do_calendario(self):
+        dentro = self.agendar(self.curto, 10)
+        Agendamento.objects.create(
+            cliente=self.cliente, servico=self.curto, data_hora=_dt(self.dia + timedelta(days=90), 10)
+        )
+        staff = User.objects.create_user("staff", "staff@example.com", "senha-forte-123", is_staff=True)
+        self.client.force_login(staff)
+        res = self.client.get(reverse("agendamentos:api_agendamentos"), {
+            "start": f"{self.dia.isoformat()}T00:00:00-03:00",
+            "end": f"{(self.dia + timedelta(days=7)).isoformat()}T00:00:00-03:00",
+        })
+        eventos = res.json()
+        self.assertEqual([e["id"] for e in eventos], [dentro.id])
+        self.assertEqual(eventos[0]["extendedProps"]["cliente_nome"], "Ana")
+        self.assertEqual(eventos[0]["end"], timezone.localtime(_dt(self.dia, 10, 30)).isoformat())
+
+    def test_api_agendamentos_responde_304_sem_consultar_agenda(self):
+        staff = User.objects.create_user("staff", "staff@example.com", "senha-forte-123", is_staff=True)
+        self.client.force_login(staff)
+        url = reverse("agendamentos:api_agendamentos")
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        self.assertIn("ETag", res)
+
+        with CaptureQueriesContext(connection) as ctx:
+            res2 = self.client.get(url, HTTP_IF_NONE_MATCH=res["ETag"])
+        self.assertEqual(res2.status_code, 304)
+        self.assertFalse([q for q in ctx.captured_queries if "agendamentos_" in q["sql"]])
+
+        self.agendar(self.curto, 10)
+        res3 = self.client.get(url, HTTP_IF_NONE_MATCH=res["ETag"])
+        self.assertEqual(res3.status_code, 200)
+        self.assertEqual(len(res3.json()), 1)
+
+    def test_api_agendamentos_feed_incremental(self):
+        mantido = self.agendar(self.curto, 10)
+        removido = self.agendar(self.curto, 11)
+        staff = User.objects.create_user("staff", "staff@example.com", "senha-forte-123", is_staff=True)
+        self.client.force_login(staff)
+        url = reverse("agendamentos:api_agendamentos")
+        desde = (timezone.now() - timedelta(seconds=1)).isoformat()
+        Agendamento.objects.filter(pk=mantido.pk).update(atualizado_em=timezone.now() - timedelta(hours=1))
+
+        novo = self.agendar(self.longo, 14)
+        removido_id = removido.id
+        removido.delete()
+
+        res = self.client.get(url, {"since": desde}).json()
+        self.assertFalse(res["completo"])
+        self.assertEqual([e["id"] for e in res["eventos"]], [novo.id])
+        self.assertEqual(res["removidos"], [removido_id])
+
+        # nome do cliente aparece no evento: os agendamentos dele voltam no feed
+        self.cliente.nome = "Ana Maria"
+        self.cliente.save()
+        res = self.client.get(url, {"since": res["cursor"]}).json()
+        self.assertEqual([e["id"] for e in res["eventos"]], [mantido.id, novo.id])
+        self.assertEqual(res["eventos"][0]["extendedProps"]["cliente_nome"], "Ana Maria")
+        antigo = (timezone.now() - timedelta(days=30)).isoformat()
+        self.assertTrue(self.client.get(url, {"since": antigo}).json()["completo"])
+
+    def test_api_periodo_limita_janela(self):
+        self.client.force_login(self.user)
+        url = reverse("agendamentos:api_horarios_periodo")
+        fim = self.dia + timedelta(days=365)
+        res = self.client.get(url, {"inicio": self.dia.isoformat(), "fim": fim.isoformat()})
+        self.assertEqual(res.status_code, 400)
+
+    def test_cache_serve_sem_banco_e_invalida_ao_agendar(self):
+        self.assertEqual(slots_do_dia(self.dia, 30)[0], {"hora": "09:00", "ocupado": False})
+        with self.assertNumQueries(0):
+            slots_do_dia(self.dia, 30)
+
+        ag = self.agendar(self.curto, 9)
+        self.assertTrue(slots_do_dia(self.dia, 30)[0]["ocupado"])
+
+        ag.status = "Cancelado"
+        ag.save()
+        self.assertFalse(slots_do_dia(self.dia, 30)[0]["ocupado"])
+
+    def test_cache_invalida_dia_antigo_ao_remarcar(self):
+        ag = self.agendar(self.curto, 9)
+        self.assertTrue(slots_do_dia(self.dia, 30)[0]["ocupado"])
+        ag.data_hora += timedelta(days=1)
+        ag.save()
+        self.assertFalse(slots_do_dia(self.dia, 30)[0]["ocupado"])
+
+
+class ReservaConcorrenteTests(TransactionTestCase):
+    """Várias threads (cada uma com sua conexão) disputando o mesmo dia."""
+
+    THREADS = 12
+
+    def setUp(self):
+        cache.clear()
+        self.dia = timezone.localdate() + timedelta(days=3)
+        self.cliente = Cliente.objects.create(nome="Bia", email="bia@example.com")
+        self.servico = Servico.objects.create(nome="Volume", descricao="", preco=120, duracao=60)
+
+    def disputar(self, horarios):
+        barreira = threading.Barrier(len(horarios))
+        criados, recusados, erros = [], [], []
+
+        def tentar(data_hora):
+            try:
+                barreira.wait()
+                criados.append(reservar_horario(servico=self.servico, cliente=self.cliente, data_hora=data_hora))
+            except HorarioIndisponivel:
+                recusados.append(data_hora)
+            except Exception as e:  # pragma: no cover - falha do teste
+                erros.append(e)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [threading.Thread(target=tentar, args=(h,)) for h in horarios]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(erros, [])
+        return criados, recusados
+
+    def assertSemSobreposicao(self):
+        ativos = sorted(
+            Agendamento.objects.filter(status__in=["Pendente", "Confirmado"]).values_list("data_hora", flat=True)
+        )
+        for anterior, seguinte in zip(ativos, ativos[1:]):
+            self.assertGreaterEqual(seguinte - anterior, timedelta(minutes=self.servico.duracao))
+
+    def test_mesmo_horario_apenas_uma_reserva(self):
+        criados, recusados = self.disputar([_dt(self.dia, 10)] * self.THREADS)
+        self.assertEqual(len(criados), 1)
+        self.assertEqual(len(recusados), self.THREADS - 1)
+        self.assertEqual(Agendamento.objects.count(), 1)
+
+    def test_horarios_sobrepostos_sem_dupla_reserva(self):
+        # 10:00, 10:30, 11:00, ... — cada par vizinho se sobrepõe (60 min)
+        horarios = [_dt(self.dia, 10) + timedelta(minutes=30 * i) for i in range(self.THREADS)]
+        criados, recusados = self.disputar(horarios)
+        self.assertGreaterEqual(len(criados), 1)
+        self.assertEqual(len(criados) + len(recusados), self.THREADS)
+        self.assertSemSobreposicao()
+
+    def test_primeira_reserva_do_dia_perdendo_o_insert_nao_quebra(self):
+        # simula a outra transação criando a linha do dia entre o UPDATE e o INSERT
+        criar = DiaAgenda.objects.create
+        with mock.patch.object(
+            DiaAgenda.objects, "create", side_effect=[IntegrityError("data duplicada"), mock.DEFAULT], wraps=criar
+        ) as create:
+            with transaction.atomic():
+                travar_dia(_dt(self.dia, 10))
+        self.assertEqual(create.call_count, 2)
+        self.assertEqual(DiaAgenda.objects.get(data=self.dia).reservas, 1)
+
+
+class ReservaTemporariaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dia = timezone.localdate() + timedelta(days=5)
+        cls.servico = Servico.objects.create(nome="Design", descricao="", preco=60, duracao=60)
+        cls.ana = User.objects.create_user("ana", "ana@example.com", "senha-forte-123")
+        cls.bia = User.objects.create_user("bia", "bia@example.com", "senha-forte-123")
+        Cliente.objects.create(nome="Ana", email="ana@example.com")
+
+    def setUp(self):
+        cache.clear()
+
+    def url_confirmar(self, h):
+        d = self.dia
+        return reverse("agendamentos:confirmar_agendamento", args=[self.servico.id, d.year, d.month, d.day, h, 0])
+
+    def test_get_segura_horario_para_os_outros(self):
+        self.client.force_login(self.ana)
+        self.assertEqual(self.client.get(self.url_confirmar(10)).status_code, 200)
+        self.assertTrue(slots_do_dia(self.dia, 60)[2]["ocupado"])  # 10:00
+
+        # outro usuário não consegue segurar nem reservar o mesmo horário
+        with self.assertRaises(HorarioIndisponivel):
+            segurar_horario(servico=self.servico, usuario=self.bia, data_hora=_dt(self.dia, 10, 30))
+
+        # a dona da reserva confirma normalmente e a reserva é consumida
+        self.client.post(self.url_confirmar(10))
+        self.assertEqual(Agendamento.objects.count(), 1)
+        self.assertFalse(ReservaTemporaria.objects.exists())
+
+    def test_propria_reserva_nao_aparece_ocupada_para_quem_segura(self):
+        segurar_horario(servico=self.servico, usuario=self.ana, data_hora=_dt(self.dia, 10))
+        self.assertTrue(slots_do_dia(self.dia, 60)[2]["ocupado"])  # agora em cache
+        self.assertFalse(slots_do_dia(self.dia, 60, ignorar_usuario=self.ana)[2]["ocupado"])
+        self.assertTrue(slots_do_dia(self.dia, 60, ignorar_usuario=self.bia)[2]["ocupado"])
+
+        url = reverse("agendamentos:api_horarios_disponiveis")
+        self.client.force_login(self.ana)
+        self.assertIn("10:00", self.client.get(url, {"data": self.dia.isoformat()}).json()["horarios"])
+        self.client.force_login(self.bia)
+        self.assertNotIn("10:00", self.client.get(url, {"data": self.dia.isoformat()}).json()["horarios"])
+
+    def test_reserva_expirada_libera_e_e_removida_em_lote(self):
+        segurar_horario(servico=self.servico, usuario=self.ana, data_hora=_dt(self.dia, 10))
+        ReservaTemporaria.objects.update(expira_em=timezone.now() - timedelta(seconds=1))
+        cache.clear()
+        self.assertFalse(slots_do_dia(self.dia, 60)[2]["ocupado"])
+        with self.assertNumQueries(1):
+            self.assertEqual(limpar_reservas_expiradas(), 1)
+
+
+class ProfissionaisTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dia = timezone.localdate() + timedelta(days=4)
+        cls.cliente = Cliente.objects.create(nome="Carla", email="carla@example.com")
+        cls.servico = Servico.objects.create(nome="Fio a fio", descricao="", preco=180, duracao=60)
+        cls.ana = Profissional.objects.create(nome="Ana")
+        cls.bia = Profissional.objects.create(nome="Bia")
+
+    def setUp(self):
+        cache.clear()
+
+    def reservar(self, h, profissional=None):
+        return reservar_horario(
+            servico=self.servico, cliente=self.cliente, data_hora=_dt(self.dia, h), profissional=profissional
+        )
+
+    def ocupado_as_10(self, recursos=None):
+        recursos = recursos or obter_grade().recursos(self.servico.id)
+        return slots_do_dia(self.dia, 60, recursos)[2]["ocupado"]
+
+    def test_slot_livre_enquanto_algum_profissional_estiver_livre(self):
+        self.assertEqual(self.reservar(10).profissional, self.ana)
+        self.assertFalse(self.ocupado_as_10())
+        self.assertTrue(self.ocupado_as_10((self.ana.id,)))
+
+        self.assertEqual(self.reservar(10).profissional, self.bia)
+        self.assertTrue(self.ocupado_as_10())
+        with self.assertRaises(HorarioIndisponivel):
+            self.reservar(10)
+
+    def test_servico_restrito_a_um_profissional(self):
+        self.servico.profissionais.add(self.bia)
+        self.reservar(10, profissional=self.bia)
+        self.assertTrue(self.ocupado_as_10())
+        with self.assertRaises(HorarioIndisponivel):
+            self.reservar(10)
+
+    def test_agendamento_sem_profissional_ocupa_todos(self):
+        Agendamento.objects.create(cliente=self.cliente, servico=self.servico, data_hora=_dt(self.dia, 10))
+        self.assertTrue(self.ocupado_as_10())
+
+
+class EventosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.servico = Servico.objects.create(nome="Volume russo", descricao="", preco=200, duracao=60)
+        cls.clientes = [Cliente.objects.create(nome=f"C{i}", email=f"c{i}@example.com") for i in range(4)]
+
+    def setUp(self):
+        cache.clear()
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def conectar(self, central, cliente_id, staff=False):
+        conexao = eventos.Conexao(cliente_id, staff, self.loop)
+        central._conexoes.add(conexao)
+        self.addCleanup(central.desconectar, conexao)
+        return conexao
+
+    def recebidos(self, conexao):
+        self.loop.run_until_complete(asyncio.sleep(0))  # entrega os call_soon_threadsafe
+        itens = []
+        while not conexao.fila.empty():
+            itens.append(conexao.fila.get_nowait())
+        return itens
+
+    def test_lembretes_com_uma_consulta_para_todas_as_abas(self):
+        central = eventos.Central()
+        Agendamento.objects.create(
+            cliente=self.clientes[0], servico=self.servico, data_hora=timezone.now() + timedelta(minutes=20)
+        )
+        abas = [self.conectar(central, c.id) for c in self.clientes for _ in range(3)]
+        with self.assertNumQueries(1):
+            central.verificar_lembretes()
+        primeira = self.recebidos(abas[0])
+        self.assertEqual(len(primeira), 1)
+        self.assertIn("Volume russo", primeira[0]["mensagem"])
+        self.assertEqual(sum(len(self.recebidos(a)) for a in abas[3:]), 0)
+
+        central.verificar_lembretes()
+        self.assertEqual(self.recebidos(abas[0]), [])  # avisa uma vez por agendamento
+
+    def test_mudanca_de_status_publicada_apos_commit(self):
+        dona = self.conectar(eventos.central, self.clientes[1].id)
+        outra = self.conectar(eventos.central, self.clientes[2].id)
+        staff = self.conectar(eventos.central, None, staff=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            ag = Agendamento.objects.create(
+                cliente=self.clientes[1], servico=self.servico, data_hora=timezone.now() + timedelta(days=2)
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            ag.status = "Cancelado"
+            ag.save()
+
+        self.assertEqual([e["acao"] for e in self.recebidos(dona)], ["criado", "status"])
+        self.assertEqual(len(self.recebidos(staff)), 2)
+        self.assertEqual(self.recebidos(outra), [])
+
+    def test_canal_so_abre_no_asgi(self):
+        user = User.objects.create_user("c0", "c0@example.com", "senha-forte-123")
+        self.client.force_login(user)
+        res = self.client.get(reverse("agendamentos:eventos_stream"))  # WSGI: não pode prender a thread
+        self.assertEqual(res.status_code, 204)
+
+        antes = set(eventos.central._conexoes)
+        self.addCleanup(lambda: [eventos.central.desconectar(c) for c in eventos.central._conexoes - antes])
+
+        async def abrir():
+            cliente = AsyncClient()
+            await cliente.aforce_login(user)
+            res = await cliente.get(reverse("agendamentos:eventos_stream"))
+            fluxo = aiter(res.streaming_content)
+            return res, await anext(fluxo)
+
+        res, primeiro = async_to_sync(abrir)()
+        self.assertEqual((res.status_code, res["Content-Type"]), (200, "text/event-stream"))
+        self.assertEqual(primeiro, b"retry: 5000\n\n")
+
+
+class ResumoDiarioTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nome="Duda", email="duda@example.com")
+        cls.classico = Servico.objects.create(nome="Clássico", descricao="", preco=100, duracao=60)
+        cls.hibrido = Servico.objects.create(nome="Híbrido", descricao="", preco=150, duracao=60)
+        cls.staff = User.objects.create_user("staff", "staff@example.com", "senha-forte-123", is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def agendar(self, servico, dia, status="Confirmado"):
+        return Agendamento.objects.create(cliente=self.cliente, servico=servico, data_hora=_dt(dia, 10), status=status)
+
+    def snapshot(self):
+        return sorted(
+            (r.data, r.servico_id, r.status, r.quantidade, r.receita)
+            for r in ResumoDiario.objects.exclude(quantidade=0)
+        )
+
+    def test_incremental_igual_a_reconstrucao(self):
+        hoje = timezone.localdate()
+        a = self.agendar(self.classico, hoje)
+        b = self.agendar(self.hibrido, hoje, status="Pendente")
+        c = self.agendar(self.classico, hoje - timedelta(days=1))
+        b.status = "Confirmado"
+        b.save()
+        c.data_hora += timedelta(days=3)
+        c.servico = self.hibrido
+        c.save()
+        a.delete()
+        self.hibrido.preco = 175
+        self.hibrido.save()
+
+        incremental = self.snapshot()
+        resumo.reconstruir()
+        self.assertEqual(incremental, self.snapshot())
+        self.assertEqual(sum(r[3] for r in incremental), 2)
+
+        self.hibrido.delete()  # agendamentos ficam sem serviço
+        incremental = self.snapshot()
+        call_command("reconstruir_resumo", stdout=StringIO())
+        self.assertEqual(incremental, self.snapshot())
+        self.assertEqual({r[1] for r in incremental}, {None})
+
+    def test_stats_le_apenas_o_resumo(self):
+        hoje = timezone.localdate()
+        self.agendar(self.classico, hoje)
+        self.agendar(self.classico, hoje, status="Cancelado")
+        self.client.force_login(self.staff)
+        with CaptureQueriesContext(connection) as ctx:
+            dados = self.client.get(reverse("agendamentos:stats"), {"days": 7}).json()
+        self.assertEqual(dados["kpis"]["hoje"], 1)
+        self.assertEqual(dados["kpis"]["cancelados_mes"], 1)
+        self.assertEqual(dados["pie"]["confirmado"], 1)
+        self.assertEqual(dados["tabela7d"][-1]["cancelados"], 1)
+        self.assertFalse([q for q in ctx.captured_queries if "agendamentos_agendamento" in q["sql"]])
+
+
+class EstatisticasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nome="Eva", email="eva@example.com")
+        cls.servico = Servico.objects.create(nome="Lifting", descricao="", preco=120, duracao=60)
+        cls.staff = User.objects.create_user("staff", "staff@example.com", "senha-forte-123", is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.staff)
+
+    def agendar(self, dia, status="Confirmado"):
+        return Agendamento.objects.create(cliente=self.cliente, servico=self.servico, data_hora=_dt(dia, 10), status=status)
+
+    def test_doze_meses_com_buckets_vazios(self):
+        hoje = timezone.localdate()
+        self.agendar(hoje)
+        self.agendar(hoje, status="Cancelado")
+        dados = self.client.get(reverse("agendamentos:stats_periodo", args=["12m"])).json()
+        self.assertEqual(dados["granularidade"], "mes")
+        self.assertEqual(len(dados["rotulos"]), 12)
+        self.assertEqual(dados["rotulos"][-1], hoje.replace(day=1).isoformat())
+        self.assertEqual(dados["total"][:-1], [0] * 11)
+        self.assertEqual(dados["total"][-1], 2)
+        self.assertEqual(dados["series"]["cancelado"][-1], 1)
+        self.assertEqual(dados["receita"][-1], 120.0)
+
+    def test_semanas_e_personalizado(self):
+        hoje = timezone.localdate()
+        dados = self.client.get(reverse("agendamentos:stats_periodo", args=["12s"])).json()
+        self.assertEqual(len(dados["rotulos"]), 12)
+        self.assertEqual(date.fromisoformat(dados["rotulos"][0]).weekday(), 0)
+
+        url = reverse("agendamentos:stats_periodo", args=["personalizado"])
+        inicio = hoje - timedelta(days=9)
+        dados = self.client.get(url, {"inicio": inicio.isoformat(), "fim": hoje.isoformat()}).json()
+        self.assertEqual((dados["granularidade"], len(dados["rotulos"])), ("dia", 10))
+        self.assertEqual(self.client.get(url, {"inicio": "ontem"}).status_code, 400)
+        self.assertEqual(len(self.client.get(reverse("agendamentos:stats_7d")).json()["rotulos"]), 7)
+
+    def test_cache_por_periodo_invalida_ao_agendar(self):
+        hoje = timezone.localdate()
+        url = reverse("agendamentos:stats_periodo", args=["30d"])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        self.assertFalse([q for q in ctx.captured_queries if "agendamentos_resumodiario" in q["sql"]])
+
+        self.agendar(hoje)
+        self.assertEqual(self.client.get(url).json()["total"][-1], 1)
+
+
+class MetricasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nome="Fê", email="fe@example.com")
+        cls.classico = Servico.objects.create(nome="Clássico", descricao="", preco=100, duracao=60)
+        cls.mega = Servico.objects.create(nome="Mega volume", descricao="", preco=250, duracao=90)
+        cls.staff = User.objects.create_user("staff", "staff@example.com", "senha-forte-123", is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.staff)
+
+    def agendar(self, servico, status):
+        return Agendamento.objects.create(
+            cliente=self.cliente, servico=servico, data_hora=_dt(timezone.localdate(), 10), status=status
+        )
+
+    def test_metricas_em_cache_e_invalidadas_por_signal(self):
+        self.agendar(self.classico, "Realizado")
+        self.agendar(self.classico, "Confirmado")
+        self.agendar(self.mega, "Cancelado")
+        url = reverse("agendamentos:api_dashboard")
+        dados = self.client.get(url).json()
+        self.assertEqual(dados["total_agendamentos"], 3)
+        self.assertEqual(dados["por_status"]["cancelado"], 1)
+        self.assertEqual(dados["receita"], {"realizada": 100.0, "prevista": 100.0})
+        self.assertEqual([s["nome"] for s in dados["servicos_populares"]], ["Clássico"])
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(reverse("agendamentos:dashboard"))
+        self.assertContains(res, "Clássico")
+        self.assertFalse([q for q in ctx.captured_queries if "agendamentos_" in q["sql"]])
+
+        self.agendar(self.mega, "Realizado")
+        self.assertEqual(self.client.get(url).json()["receita"]["realizada"], 350.0)
+
+
+class ExportacaoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nome="Gabi", email="gabi@example.com")
+        cls.servico = Servico.objects.create(nome="Brow lamination", descricao="", preco=90, duracao=60)
+        cls.outro = Servico.objects.create(nome="Henna", descricao="", preco=40, duracao=30)
+        cls.staff = User.objects.create_user("staff", "staff@example.com", "senha-forte-123", is_staff=True)
+        hoje = timezone.localdate()
+        for i in range(5):
+            Agendamento.objects.create(
+                cliente=cls.cliente, servico=cls.servico if i % 2 else cls.outro,
+                data_hora=_dt(hoje - timedelta(days=i), 10), status="Cancelado" if i == 3 else "Realizado",
+            )
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def exportar(self, **params):
+        res = self.client.get(reverse("agendamentos:dashboard_export_csv"), params)
+        self.assertTrue(res.streaming)
+        return b"".join(res.streaming_content).decode().strip().splitlines()
+
+    def test_csv_em_streaming_com_filtros(self):
+        self.assertEqual(len(self.exportar()), 6)
+        hoje = timezone.localdate()
+        linhas = self.exportar(inicio=(hoje - timedelta(days=2)).isoformat(), fim=hoje.isoformat())
+        self.assertEqual(len(linhas), 4)
+        self.assertEqual(self.exportar(status="Cancelado")[1].split(",")[0], "Brow lamination")
+        self.assertEqual(len(self.exportar(servico_id=self.outro.id)), 4)
+
+    def test_csv_em_streaming_no_asgi(self):
+        async def exportar():
+            cliente = AsyncClient()
+            await cliente.aforce_login(self.staff)
+            res = await cliente.get(reverse("agendamentos:dashboard_export_csv"))
+            # o handler ASGI consome via __aiter__: iterador síncrono seria lido todo antes de enviar
+            return res, [parte async for parte in res]
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            res, partes = async_to_sync(exportar)()
+        self.assertTrue(res.is_async)
+        self.assertEqual(len(b"".join(partes).decode().strip().splitlines()), 6)
+
+    def test_filtro_invalido_volta_ao_dashboard(self):
+        res = self.client.get(reverse("agendamentos:dashboard_export_csv"), {"status": "Sumido"})
+        self.assertRedirects(res, reverse("agendamentos:dashboard"), fetch_redirect_response=False)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), ARQUIVOS_PRIVADOS_ROOT=tempfile.mkdtemp())
+class RelatorioJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nome="Helô", email="helo@example.com")
+        cls.servico = Servico.objects.create(nome="Design", descricao="", preco=60, duracao=30)
+        cls.staff = User.objects.create_user("staff", "staff@example.com", "senha-forte-123", is_staff=True)
+        for i in range(45):
+            Agendamento.objects.create(
+                cliente=cls.cliente, servico=cls.servico, data_hora=_dt(timezone.localdate(), 9) - timedelta(days=i)
+            )
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def test_pdf_gerado_fora_da_requisicao_e_reutilizado(self):
+        url = reverse("agendamentos:dashboard_export_pdf")
+        with self.captureOnCommitCallbacks() as callbacks:
+            res = self.client.get(url, {"status": "Confirmado"})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(callbacks), 1)  # enfileirado para o pool, não gerado aqui
+        job = RelatorioJob.objects.get()
+        self.assertEqual(job.status, "pendente")
+
+        relatorios.gerar(job.pk)
+        status = self.client.get(reverse("agendamentos:relatorio_status", args=[job.pk])).json()
+        self.assertEqual((status["status"], status["linhas"]), ("pronto", 45))
+        res = self.client.get(status["download"])
+        self.assertTrue(b"".join(res.streaming_content).startswith(b"%PDF"))
+
+        # mesmos filtros em seguida: reaproveita o arquivo pronto
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.get(url, {"status": "Confirmado"})
+        self.assertEqual((RelatorioJob.objects.count(), len(callbacks)), (1, 0))
+
+    def test_download_em_streaming_no_asgi(self):
+        job = relatorios.solicitar({}, self.staff)
+        relatorios.gerar(job.pk)
+
+        async def baixar():
+            cliente = AsyncClient()
+            await cliente.aforce_login(self.staff)
+            res = await cliente.get(reverse("agendamentos:relatorio_download", args=[job.pk]))
+            return res, [parte async for parte in res]
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            res, partes = async_to_sync(baixar)()
+        self.assertIn("attachment", res["Content-Disposition"])
+        self.assertTrue(b"".join(partes).startswith(b"%PDF"))
+
+    def test_pdf_fica_fora_da_midia_publica_e_expira(self):
+        from django.conf import settings
+
+        job = relatorios.solicitar({}, self.staff)
+        relatorios.gerar(job.pk)
+        job.refresh_from_db()
+        self.assertTrue(job.arquivo.path.startswith(settings.ARQUIVOS_PRIVADOS_ROOT))
+        self.assertNotIn(job.chave[:8], job.arquivo.name)  # nome aleatório, não derivado dos filtros
+        with self.assertRaises(ValueError):
+            job.arquivo.url
+
+        self.client.logout()
+        res = self.client.get(reverse("agendamentos:relatorio_download", args=[job.pk]))
+        self.assertEqual(res.status_code, 302)  # login
+
+        caminho = job.arquivo.path
+        call_command("limpar_relatorios", stdout=StringIO())
+        self.assertTrue(RelatorioJob.objects.exists())  # ainda no prazo
+        RelatorioJob.objects.update(criado_em=timezone.now() - relatorios.EXPIRA_EM - timedelta(minutes=1))
+        saida = StringIO()
+        call_command("limpar_relatorios", stdout=saida)
+        self.assertIn("1 relatórios expirados apagados", saida.getvalue())
+        self.assertFalse(RelatorioJob.objects.exists())
+        self.assertFalse(os.path.exists(caminho))
+
+
+class ImportacaoClientesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.existente = Cliente.objects.create(nome="Bia", email="bia@example.com", cpf="11122233344")
+        cls.staff = User.objects.create_user("staff", "staff@example.com", "senha-forte-123", is_staff=True)
+
+    def test_cria_atualiza_e_reporta_erros_por_linha(self):
+        csv_texto = (
+            "nome;email;telefone;cpf\n"
+            "Carla;carla@example.com;(11) 99999-0000;123.456.789-01\n"
+            "Beatriz;bia@example.com;;\n"
+            "Dani;email-invalido;;\n"
+            "Carla 2;carla@example.com;;\n"
+            "Eva;eva@example.com;;11122233344\n"
+            "Fábio;fabio@example.com;abc;\n"
+        )
+        r = importacao.importar_clientes(StringIO(csv_texto))
+        self.assertEqual((r.criados, r.atualizados, r.sem_alteracao), (1, 1, 0))
+        self.assertEqual([linha for linha, _, _ in r.erros], [4, 5, 6, 7])
+        self.assertIn("repetido", r.erros[1][2])
+        self.assertIn("outra linha", r.erros[2][2])
+        self.assertEqual(Cliente.objects.get(cpf="12345678901").nome, "Carla")
+        self.existente.refresh_from_db()
+        self.assertEqual((self.existente.nome, self.existente.cpf), ("Beatriz", "11122233344"))
+
+        r = importacao.importar_clientes(StringIO("nome,email\nOutra,bia@example.com\n"), atualizar=False)
+        self.assertEqual((r.criados, r.atualizados, r.sem_alteracao), (0, 0, 1))
+
+    def test_consultas_por_lote_nao_crescem_com_as_linhas(self):
+        def consultas(n, inicio):
+            linhas = ["nome,email"] + [f"Cliente {i},c{i}@example.com" for i in range(inicio, inicio + n)]
+            with CaptureQueriesContext(connection) as ctx:
+                importacao.importar_clientes(iter(linhas), tamanho_lote=1000)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(consultas(10, 0), consultas(150, 100))
+        self.assertEqual(Cliente.objects.count(), 161)
+
+    def test_limites_e_conflito_no_banco_viram_erro_da_linha(self):
+        gravar = importacao._gravar
+
+        def outra_sessao_grava_antes(novos, alterados, resultado):
+            # simula um cadastro concorrente entre a consulta do lote e o insert
+            if not Cliente.objects.filter(email="ivo@example.com").exists():
+                Cliente.objects.create(nome="Ivo (site)", email="ivo@example.com")
+            gravar(novos, alterados, resultado)
+
+        csv_texto = (
+            "nome,email,telefone\n"
+            f"Hana,hana@example.com,{'9' * 25}\n"
+            "Ivo,ivo@example.com,\n"
+            "Júlia,julia@example.com,\n"
+        )
+        with mock.patch.object(importacao, "_gravar", outra_sessao_grava_antes):
+            r = importacao.importar_clientes(StringIO(csv_texto))
+        self.assertEqual(r.criados, 1)
+        self.assertEqual([(linha, email) for linha, email, _ in r.erros], [(2, "hana@example.com"), (3, "ivo@example.com")])
+        self.assertIn("Telefone muito longo", r.erros[0][2])
+        self.assertIn("Não foi possível gravar", r.erros[1][2])
+        self.assertTrue(Cliente.objects.filter(email="julia@example.com").exists())
+        self.assertEqual(Cliente.objects.get(email="ivo@example.com").nome, "Ivo (site)")
+
+    def test_sem_colunas_obrigatorias(self):
+        with self.assertRaises(ValueError):
+            importacao.importar_clientes(StringIO("nome,telefone\nAna,123\n"))
+
+    def test_comando_e_upload(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, encoding="utf-8") as f:
+            f.write("nome,email\nGabi,gabi@example.com\nSem Email,\n")
+        saida = StringIO()
+        call_command("importar_clientes", f.name, stdout=saida)
+        self.assertIn("1 criados", saida.getvalue())
+        self.assertTrue(Cliente.objects.filter(email="gabi@example.com").exists())
+
+        self.client.force_login(self.staff)
+        url = reverse("agendamentos:importar_clientes")
+        arquivo = SimpleUploadedFile("clientes.csv", "nome,email\nHelena,helena@example.com\nX,ruim\n".encode())
+        res = self.client.post(url, {"arquivo": arquivo, "atualizar": "1"})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.context["erros"]), 1)
+        self.assertTrue(Cliente.objects.filter(email="helena@example.com").exists())
+
+        arquivo = SimpleUploadedFile("clientes.csv", b"nome,email\nX,ruim\n")
+        res = self.client.post(url, {"arquivo": arquivo, "relatorio": "1"})
+        self.assertEqual(res["Content-Type"], "text/csv")
+        self.assertIn(b"ruim", res.content)
+
+
+class EnviarLembretesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.servico = Servico.objects.create(nome="Volume russo", descricao="", preco=180, duracao=90)
+        agora = timezone.now()
+        for i in range(5):
+            cliente = Cliente.objects.create(nome=f"Cliente {i}", email=f"c{i}@example.com")
+            Agendamento.objects.create(
+                cliente=cliente, servico=cls.servico, data_hora=agora + timedelta(hours=1, seconds=i)
+            )
+        Agendamento.objects.create(cliente=cliente, servico=cls.servico, data_hora=agora + timedelta(hours=4))
+        Agendamento.objects.create(cliente=cliente, servico=cls.servico, data_hora=agora + timedelta(minutes=10))
+
+    def test_uma_consulta_para_todas_as_etapas(self):
+        with CaptureQueriesContext(connection) as ctx:
+            por_etapa = lembretes.enfileirar(tamanho_lote=100)
+        self.assertEqual(por_etapa, {1440: 1, 120: 5, 15: 1})
+        consultas = [q["sql"] for q in ctx.captured_queries if 'FROM "agendamentos_agendamento"' in q["sql"]]
+        self.assertEqual(len(consultas), 2)  # o lote e a consulta vazia que encerra
+        # por etapa: um e-mail por cliente e um resumo para a dona
+        self.assertEqual(EmailPendente.objects.count(), 7 + 3)
+        resumo_2h = EmailPendente.objects.get(chave__startswith="lembrete:dono:120:")
+        self.assertIn("5 agendamento(s) em aproximadamente 2 horas", resumo_2h.assunto)
+
+        self.assertEqual(lembretes.enfileirar(), {})
+        # 50 minutos depois, os de 1 hora entram na etapa de 15 minutos
+        self.assertEqual(lembretes.enfileirar(timezone.now() + timedelta(minutes=50)), {15: 5})
+
+    def test_comando_envia_pela_caixa_de_saida(self):
+        saida = StringIO()
+        call_command("enviar_lembretes", stdout=saida)
+        self.assertIn("5 lembretes de 2 horas enfileirados", saida.getvalue())
+        self.assertIn("10 e-mails enviados", saida.getvalue())
+        self.assertEqual(len(mail.outbox), 10)
+        ag = Agendamento.objects.get(cliente__email="c0@example.com")
+        email = next(m for m in mail.outbox if m.to == ["c0@example.com"])
+        self.assertIn(timezone.localtime(ag.data_hora).strftime("%d/%m/%Y às %H:%M"), email.body)
+
+        mail.outbox.clear()
+        call_command("enviar_lembretes", stdout=StringIO())
+        self.assertEqual(mail.outbox, [])
+
+    def test_etapas_configuraveis(self):
+        from .forms import ConfiguracaoForm
+
+        form = ConfiguracaoForm(data={"duracao_padrao": 60, "intervalo": 30, "lembretes": "15, 1440,120,15"})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data["lembretes"], "1440,120,15")
+        self.assertFalse(ConfiguracaoForm(data={"duracao_padrao": 60, "intervalo": 30, "lembretes": "2h"}).is_valid())
+
+        ConfiguracaoAgenda.objects.create(pk=1, lembretes="30")
+        self.assertEqual(lembretes.enfileirar(), {30: 1})
+
+
+class AgendaLembretesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nome="Iris", email="iris@example.com")
+        cls.servico = Servico.objects.create(nome="Lifting", descricao="", preco=120, duracao=60)
+
+    def agendar(self, daqui, **kwargs):
+        return Agendamento.objects.create(
+            cliente=self.cliente, servico=self.servico, data_hora=timezone.now() + daqui, **kwargs
+        )
+
+    def test_recupera_atrasados_e_segue_remarcacoes(self):
+        atrasado = self.agendar(timedelta(minutes=20))  # etapa de 2 h venceu com o processo parado
+        depois = self.agendar(timedelta(hours=3))
+        self.agendar(timedelta(minutes=-10))  # já passou: não recebe lembrete
+        self.agendar(timedelta(hours=3), status="Cancelado")
+        Agendamento.objects.update(atualizado_em=timezone.now() - timedelta(minutes=5))
+
+        agenda = lembretes.Agenda([120, 15])
+        agora = timezone.now()
+        agenda.atualizar(agora)
+        self.assertEqual(len(agenda), 2)
+        self.assertEqual(agenda.vencidos(agora), [atrasado.id])
+
+        # remarcado para mais cedo: a leitura incremental traz só ele
+        depois.data_hora = agora + timedelta(minutes=90)
+        depois.save()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(agenda.atualizar(agora), 2)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(agenda.vencidos(agora), [depois.id])
+        self.assertEqual(agenda.vencidos(agora + timedelta(minutes=6)), [atrasado.id])
+        # só a etapa de 15 min nova; as entradas de antes da remarcação são descartadas
+        self.assertEqual(agenda.vencidos(agora + timedelta(hours=3)), [depois.id])
+        self.assertEqual(len(agenda), 0)
+
+    def test_ciclo_do_daemon_envia_os_vencidos(self):
+        from .management.commands.enviar_lembretes import Command
+
+        atrasado = self.agendar(timedelta(minutes=20))
+        self.agendar(timedelta(hours=4))
+        agenda = lembretes.Agenda([120, 15])
+        Command(stdout=StringIO()).ciclo(agenda, 100)
+        self.assertEqual(len(mail.outbox), 2)  # cliente + resumo da dona
+        self.assertEqual(list(atrasado.lembretes.values_list("antecedencia", flat=True)), [120])
+        self.assertEqual(len(agenda), 2)  # falta a etapa de 15 min de um e as duas do outro
+
+
+class BackendInstavel(locmem.EmailBackend):
+    """locmem que recusa as mensagens cujo assunto contém "falha"."""
+
+    def send_messages(self, messages):
+        if any("falha" in m.subject for m in messages):
+            raise ConnectionError("SMTP fora do ar")
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND="agendamentos.tests.BackendInstavel")
+class CaixaSaidaTests(TestCase):
+    def mensagem(self, chave, assunto="Olá"):
+        return (chave, assunto, "corpo", None, ["x@example.com"])
+
+    def test_enfileira_na_transacao_com_chave_de_idempotencia(self):
+        self.assertEqual(caixa_saida.enfileirar([self.mensagem("a"), self.mensagem("b")]), 2)
+        self.assertEqual(caixa_saida.enfileirar([self.mensagem("a")]), 0)
+        try:
+            with transaction.atomic():
+                caixa_saida.enfileirar([self.mensagem("c")])
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(sorted(EmailPendente.objects.values_list("chave", flat=True)), ["a", "b"])
+
+    def test_falha_volta_com_espera_e_nao_trava_as_outras(self):
+        caixa_saida.enfileirar([self.mensagem(str(i)) for i in range(5)] + [self.mensagem("f", "falha")])
+        resultado = caixa_saida.processar(workers=3, por_segundo=0)
+        self.assertEqual((resultado.enviados, resultado.falhas), (5, 1))
+        self.assertEqual(len(mail.outbox), 5)
+
+        falhou = EmailPendente.objects.get(chave="f")
+        self.assertEqual((falhou.status, falhou.tentativas), ("pendente", 1))
+        self.assertGreater(falhou.proxima_tentativa, timezone.now())
+        self.assertIn("SMTP fora do ar", falhou.ultimo_erro)
+        self.assertEqual(caixa_saida.processar().falhas, 0)  # ainda esperando
+
+        EmailPendente.objects.filter(pk=falhou.pk).update(
+            proxima_tentativa=timezone.now(), tentativas=caixa_saida.MAX_TENTATIVAS - 1
+        )
+        caixa_saida.processar()
+        self.assertEqual(EmailPendente.objects.get(pk=falhou.pk).status, "falhou")
+        situacao = caixa_saida.situacao()
+        self.assertEqual((situacao["enviado"], situacao["falhou"], situacao["pendente"]), (5, 1, 0))
+
+    def test_reserva_vencida_volta_para_a_fila(self):
+        caixa_saida.enfileirar([self.mensagem("a")])
+        EmailPendente.objects.update(status="enviando", proxima_tentativa=timezone.now() - timedelta(seconds=1))
+        saida = StringIO()
+        call_command("processar_emails", stdout=saida)
+        self.assertIn("1 e-mails enviados", saida.getvalue())
+        self.assertIn("Fila: 0 pendentes", saida.getvalue())
+
+
+def _png(largura: int, altura: int) -> bytes:
+    from PIL import Image
+
+    saida = BytesIO()
+    Image.new("RGB", (largura, altura), "#c8a45a").save(saida, format="PNG")
+    return saida.getvalue()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImagemServicoTests(TestCase):
+    def test_processa_fora_da_requisicao_so_quando_a_imagem_muda(self):
+        from PIL import Image
+
+        servico = Servico(nome="Brow", descricao="", preco=80, duracao=45)
+        with self.captureOnCommitCallbacks() as callbacks:
+            servico.imagem.save("brow.png", ContentFile(_png(800, 600)), save=False)
+            servico.save()
+        com_imagem = len(callbacks)  # inclui a entrega ao pool depois do commit
+        self.assertEqual(Servico.objects.get(pk=servico.pk).imagem_status, "pendente")
+
+        self.assertTrue(imagens.processar(servico.pk, servico.imagem.name))
+        servico = Servico.objects.get(pk=servico.pk)  # a imagem regravada ganha outro nome (hash)
+        self.assertEqual(servico.imagem_status, "pronta")
+        with Image.open(servico.imagem.path) as img:
+            self.assertEqual(img.size, (400, 400))
+
+        # editar só o texto não reprocessa
+        with self.captureOnCommitCallbacks() as callbacks:
+            servico.descricao = "Design com henna"
+            servico.save()
+        self.assertEqual(len(callbacks), com_imagem - 1)
+        self.assertEqual(Servico.objects.get(pk=servico.pk).imagem_status, "pronta")
+
+    def test_reenviar_os_mesmos_bytes_nao_deixa_pendente(self):
+        servico = Servico(nome="Lifting", descricao="", preco=120, duracao=60)
+        servico.imagem = SimpleUploadedFile("lifting.png", _png(400, 400), content_type="image/png")
+        servico.save()
+        self.assertTrue(imagens.processar(servico.pk, servico.imagem.name))
+
+        servico = Servico.objects.get(pk=servico.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            servico.descricao = "Lifting de cílios"
+            servico.save()
+        sem_imagem = len(callbacks)
+
+        # mesmo arquivo de novo (como vem do formulário): o nome só é decidido no save
+        servico = Servico.objects.get(pk=servico.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            servico.imagem = SimpleUploadedFile("outro_nome.png", _png(400, 400), content_type="image/png")
+            servico.save()
+        self.assertEqual(len(callbacks), sem_imagem)  # nada agendado
+        self.assertEqual(servico.imagem_status, "pronta")
+        self.assertEqual(Servico.objects.get(pk=servico.pk).imagem_status, "pronta")
+
+    def test_pedido_velho_e_descartado(self):
+        servico = Servico(nome="Lash", descricao="", preco=90, duracao=60)
+        servico.imagem.save("lash.png", ContentFile(_png(500, 500)), save=False)
+        servico.save()
+        antigo = servico.imagem.name
+        servico.imagem.save("lash2.png", ContentFile(_png(600, 500)), save=True)
+        self.assertFalse(imagens.processar(servico.pk, antigo))
+        self.assertEqual(Servico.objects.get(pk=servico.pk).imagem_status, "pendente")
+
+        call_command("processar_imagens", stdout=StringIO())
+        self.assertEqual(Servico.objects.get(pk=servico.pk).imagem_status, "pronta")
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImagemDerivadaTests(TestCase):
+    def _prova(self, largura, altura, nome="prova.png"):
+        prova = ProvaSocial(legenda="Antes e depois")
+        prova.imagem.save(nome, ContentFile(_png(largura, altura)), save=False)
+        prova.save()
+        return prova
+
+    def test_gera_larguras_e_formatos_sem_ampliar(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            prova = self._prova(1000, 500)
+        self.assertTrue(callbacks)  # geração agendada para depois do commit
+
+        imagens.gerar_derivadas(prova.imagem.name, prova.imagem.storage)
+        imagens.gerar_derivadas(prova.imagem.name, prova.imagem.storage)  # regerar não duplica
+        derivadas = ImagemDerivada.objects.filter(origem=prova.imagem.name)
+        self.assertEqual(
+            sorted(derivadas.values_list("formato", "largura", "altura")),
+            [("jpeg", 320, 160), ("jpeg", 640, 320), ("jpeg", 1000, 500),
+             ("webp", 320, 160), ("webp", 640, 320), ("webp", 1000, 500)],
+        )
+        for derivada in derivadas:
+            self.assertTrue(derivada.arquivo.storage.exists(derivada.arquivo.name))
+
+    def test_tag_monta_srcset_com_dimensoes(self):
+        prova = self._prova(800, 1200)
+        modelo = Template('{% load imagens_responsivas %}{% imagem_responsiva p.imagem sizes="50vw" alt="Cílios" class="ps-thumb" %}')
+
+        html = modelo.render(Context({"p": prova}))
+        self.assertIn(f'src="{prova.imagem.url}"', html)  # ainda sem derivadas: original
+        self.assertNotIn("srcset", html)
+
+        imagens.gerar_derivadas(prova.imagem.name, prova.imagem.storage)
+        prova = ProvaSocial.objects.get(pk=prova.pk)
+        html = modelo.render(Context({"p": prova}))
+        self.assertIn('type="image/webp"', html)
+        self.assertRegex(html, r'srcset="/media/conteudo/\w\w/\w{64}\.jpeg 320w, ')
+        self.assertIn('width="800" height="1200"', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertIn('class="ps-thumb"', html)
+
+    def test_backfill_e_pagina_carregam_derivadas_em_uma_consulta(self):
+        for i in range(3):
+            resultado = ResultadoAluna(nome_aluna=f"Aluna {i}", tecnica="Volume russo")
+            resultado.foto.save(f"aluna{i}.png", ContentFile(_png(700 + i, 700)), save=False)
+            resultado.save()
+
+        saida = StringIO()
+        call_command("gerar_derivadas", stdout=saida)
+        self.assertIn("3 imagens com derivadas geradas", saida.getvalue())
+        saida = StringIO()
+        call_command("gerar_derivadas", stdout=saida)
+        self.assertIn("0 imagens com derivadas geradas, 3 já prontas", saida.getvalue())
+
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse("resultados_alunas"))
+        self.assertContains(resposta, "srcset", count=6)  # <source> e <img> de cada foto
+        self.assertEqual(sum("agendamentos_imagemderivada" in q["sql"] for q in consultas.captured_queries), 1)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ArmazenamentoConteudoTests(TestCase):
+    def _resultado(self, conteudo, nome="foto.png"):
+        resultado = ResultadoAluna(nome_aluna="Ana", tecnica="Fio a fio")
+        resultado.foto.save(nome, ContentFile(conteudo), save=True)
+        return resultado
+
+    def test_mesmo_conteudo_vira_um_blob(self):
+        a = self._resultado(_png(300, 300), "a.png")
+        b = self._resultado(_png(300, 300), "b.PNG")
+        c = self._resultado(_png(301, 300), "a.png")
+        self.assertEqual(a.foto.name, b.foto.name)
+        self.assertRegex(a.foto.name, r"^conteudo/(\w\w)/\1\w{62}\.png$")
+        self.assertNotEqual(a.foto.name, c.foto.name)
+
+        # apagar pelo campo não tira o blob de quem ainda usa
+        a.foto.delete(save=True)
+        self.assertTrue(b.foto.storage.exists(b.foto.name))
+
+    def test_coleta_apaga_so_blobs_e_derivadas_sem_uso(self):
+        usado = self._resultado(_png(400, 300), "usado.png")
+        trocado = self._resultado(_png(500, 300), "velho.png")
+        imagens.gerar_derivadas(trocado.foto.name, trocado.foto.storage)
+        velho = trocado.foto.name
+        trocado.foto.save("novo.png", ContentFile(_png(600, 300)), save=True)
+        recente = armazenamento.conteudo.save("x.png", ContentFile(b"sem registro ainda"))
+
+        passado = (timezone.now() - 2 * armazenamento.CARENCIA).timestamp()
+        for pasta, _, arquivos in os.walk(armazenamento.conteudo.path(armazenamento.PASTA)):
+            for arquivo in arquivos:
+                caminho = os.path.join(pasta, arquivo)
+                if not caminho.endswith(recente):
+                    os.utime(caminho, (passado, passado))
+        ImagemDerivada.objects.update(criado_em=timezone.now() - 2 * armazenamento.CARENCIA)
+
+        saida = StringIO()
+        call_command("coletar_midia", "--simular", stdout=saida)
+        self.assertIn("4 derivadas órfãs e 1 blobs", saida.getvalue())  # 320w e 500w, WebP e JPEG
+        self.assertTrue(armazenamento.conteudo.exists(velho))
+
+        call_command("coletar_midia", stdout=StringIO())
+        self.assertFalse(armazenamento.conteudo.exists(velho))
+        self.assertFalse(ImagemDerivada.objects.exists())
+        for nome in (usado.foto.name, trocado.foto.name, recente):
+            self.assertTrue(armazenamento.conteudo.exists(nome))
+        self.assertEqual(armazenamento.coletar().blobs, 0)  # derivadas saíram na rodada anterior
+
+    def test_enderecar_converte_nomes_antigos(self):
+        antigo = FileSystemStorage().save("resultados/antigo.png", ContentFile(_png(320, 200)))
+        resultado = ResultadoAluna.objects.create(nome_aluna="Bia", tecnica="Volume", foto=antigo)
+        ImagemDerivada.objects.create(origem=antigo, formato="jpeg", largura=320, altura=200, arquivo="derivadas/x.jpeg")
+
+        saida = StringIO()
+        call_command("coletar_midia", "--enderecar", stdout=saida)
+        self.assertIn("1 arquivos convertidos", saida.getvalue())
+        resultado.refresh_from_db()
+        self.assertTrue(armazenamento.enderecado(resultado.foto.name))
+        self.assertTrue(armazenamento.conteudo.exists(resultado.foto.name))
+        self.assertFalse(armazenamento.conteudo.exists(antigo))
+        self.assertEqual(ImagemDerivada.objects.get().origem, resultado.foto.name)
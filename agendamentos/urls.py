@@ -11,15 +11,21 @@ urlpatterns = [
     path("dashboard/", views.dashboard, name="dashboard"),
     path("dashboard/export/csv/", views.dashboard_export_csv, name="dashboard_export_csv"),
     path("dashboard/export/pdf/", views.dashboard_export_pdf, name="dashboard_export_pdf"),
+    path("relatorios/<int:job_id>/", views.relatorio_status, name="relatorio_status"),
+    path("relatorios/<int:job_id>/download/", views.relatorio_download, name="relatorio_download"),
 
     # Stats
     path("stats/", views.stats, name="stats"),
-    path("stats/7d/", views.stats, name="stats_7d"),
+    path("stats/7d/", views.stats_periodo, {"periodo": "7d"}, name="stats_7d"),
+    path("stats/<str:periodo>/", views.stats_periodo, name="stats_periodo"),
 
     # APIs internas do painel (FullCalendar / horários / notificação)
     path("api/agendamentos/", views.api_agendamentos, name="api_agendamentos"),
     path("api/horarios/", views.api_horarios_disponiveis, name="api_horarios_disponiveis"),
+    path("api/horarios/periodo/", views.api_horarios_periodo, name="api_horarios_periodo"),
     path("api/notificacao/", views.api_notificacao_proximo_agendamento, name="api_notificacao_proximo_agendamento"),
+    path("api/eventos/", views.eventos_stream, name="eventos_stream"),
+    path("api/dashboard/", views.api_dashboard, name="api_dashboard"),
 
     # Fluxo de agendamento
     path("agendar/<int:servico_id>/", views.agendar_servico, name="agendar_servico"),
@@ -37,6 +43,9 @@ urlpatterns = [
         name="atualizar_status_agendamento",
     ),
 
+    # Configuração da agenda (expediente, intervalos)
+    path("configuracoes/", views.configuracoes_agenda, name="configuracoes_agenda"),
+
     # Serviços
     path("servicos/", views.gerir_servicos, name="gerir_servicos"),
     path("servicos/novo/", views.criar_servico, name="criar_servico"),
@@ -72,6 +81,7 @@ urlpatterns = [
     # Clientes  ✅ (adicionados)
     path("clientes/", views.gerir_clientes, name="gerir_clientes"),
     path("clientes/novo/", views.criar_cliente, name="criar_cliente"),
+    path("clientes/importar/", views.importar_clientes, name="importar_clientes"),
     path("clientes/editar/<int:cliente_id>/", views.editar_cliente, name="editar_cliente"),
     path("clientes/excluir/<int:cliente_id>/", views.excluir_cliente, name="excluir_cliente"),
 
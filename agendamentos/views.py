@@ -2,22 +2,41 @@
 from __future__ import annotations
 
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Count
-from django.http import JsonResponse, HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import content_disposition_header
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.views.static import serve
 from django import forms
+from asgiref.sync import sync_to_async
 
-from datetime import timedelta, datetime, time
-from io import BytesIO
+from datetime import timedelta, datetime
+import asyncio
 import base64
+import io
+import itertools
 import json
 
 from .models import (
-    Cliente, Servico, Agendamento,
-    ResultadoAluna, ProvaSocial
+    RETENCAO_REMOVIDOS, Cliente, Servico, Agendamento, AgendamentoRemovido,
+    ResultadoAluna, ProvaSocial,
+    ConfiguracaoAgenda, HorarioFuncionamento, ExcecaoAgenda, RelatorioJob,
 )
+from .forms import ConfiguracaoForm, HorarioFuncionamentoFormSet
+from .grade import obter_grade
+from .disponibilidade import (
+    DURACAO_PADRAO, MAX_DIAS_PERIODO, filtro_sobreposicao,
+    slots_do_dia, slots_do_periodo,
+)
+from .condicional import etag_agendamentos, etag_horarios, modificado_agendamentos, modificado_horarios
+from .reservas import HorarioIndisponivel, reservar_horario, segurar_horario
+from . import armazenamento, estatisticas, eventos, imagens, importacao, metricas, relatorios, resumo
 
 # --------------------------------------------------------------------
 # (Opcional) suporte a imagens adicionais se existir o model no projeto
@@ -47,12 +66,16 @@ class AgendamentoForm(forms.ModelForm):
 
 def home(request):
     # carrega provas sociais ativas para o bloco da home (se o template usar)
-    provas = ProvaSocial.objects.filter(ativo=True).order_by("ordem", "-criado_em")[:8]
+    provas = list(ProvaSocial.objects.filter(ativo=True).order_by("ordem", "-criado_em")[:8])
+    imagens.carregar_derivadas(p.imagem for p in provas)
     return render(request, "agendamentos/home.html", {"provas": provas})
 
 
 def lista_servicos(request):
-    servicos = Servico.objects.all().order_by("nome")
+    servicos = list(Servico.objects.prefetch_related("servicoimagem_set").order_by("nome"))
+    imagens.carregar_derivadas(
+        [s.imagem for s in servicos] + [i.imagem for s in servicos for i in s.servicoimagem_set.all()]
+    )
     return render(request, "agendamentos/lista_servicos.html", {"servicos": servicos})
 
 
@@ -61,10 +84,17 @@ def curso(request):
 
 
 def resultados_alunas(request):
-    resultados = ResultadoAluna.objects.filter(ativo=True).order_by("-criado_em")
+    resultados = list(ResultadoAluna.objects.filter(ativo=True).order_by("-criado_em"))
+    imagens.carregar_derivadas(r.foto for r in resultados)
     return render(request, "agendamentos/resultados_alunas.html", {"resultados": resultados})
 
 
+@cache_control(public=True, max_age=armazenamento.MAX_CACHE, immutable=True)
+def midia_conteudo(request, caminho):
+    # blobs endereçados por conteúdo nunca mudam (armazenamento.py)
+    return serve(request, caminho, document_root=armazenamento.conteudo.path(armazenamento.PASTA))
+
+
 # ============================================================
 # ÁREA LOGADA
 # ============================================================
@@ -106,28 +136,27 @@ def dashboard(request):
         messages.error(request, "Você não tem permissão para acessar esta página.")
         return redirect("agendamentos:painel")
 
-    total_servicos = Servico.objects.count()
-    total_agendamentos = Agendamento.objects.count()
-    agendamentos_pendentes = Agendamento.objects.filter(status="Pendente").count()
-    agendamentos_confirmados = Agendamento.objects.filter(status="Confirmado").count()
-    agendamentos_concluidos = Agendamento.objects.filter(status="Realizado").count()
-
-    servicos_populares = (
-        Servico.objects.annotate(num_agendamentos=Count("agendamentos"))
-        .order_by("-num_agendamentos")[:5]
-    )
-
+    m = metricas.dashboard()
     context = {
-        "total_servicos": total_servicos,
-        "total_agendamentos": total_agendamentos,
-        "agendamentos_pendentes": agendamentos_pendentes,
-        "agendamentos_confirmados": agendamentos_confirmados,
-        "agendamentos_concluidos": agendamentos_concluidos,
-        "servicos_populares": servicos_populares,
+        "metricas": m,
+        "total_servicos": m["total_servicos"],
+        "total_agendamentos": m["total_agendamentos"],
+        "agendamentos_pendentes": m["por_status"]["pendente"],
+        "agendamentos_confirmados": m["por_status"]["confirmado"],
+        "agendamentos_concluidos": m["por_status"]["realizado"],
+        "servicos_populares": m["servicos_populares"],
     }
     return render(request, "agendamentos/dashboard.html", context)
 
 
+@login_required
+def api_dashboard(request):
+    """Mesmas métricas do dashboard, em JSON (cache curto, ver metricas.py)."""
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Sem permissão."}, status=403)
+    return JsonResponse(metricas.dashboard())
+
+
 # ============================================================
 # CLIENTES
 # ============================================================
@@ -178,6 +207,49 @@ def criar_cliente(request):
     )
 
 
+LIMITE_ERROS_TELA = 200
+
+
+@login_required
+def importar_clientes(request):
+    """Upload de CSV de clientes (ver importacao.py); erros em tela ou em CSV."""
+    if not request.user.is_staff:
+        messages.error(request, "Você não tem permissão para importar clientes.")
+        return redirect("agendamentos:painel")
+
+    if request.method != "POST":
+        return render(request, "agendamentos/importar_clientes.html")
+
+    arquivo = request.FILES.get("arquivo")
+    if not arquivo:
+        messages.error(request, "Selecione um arquivo CSV.")
+        return render(request, "agendamentos/importar_clientes.html")
+
+    texto = io.TextIOWrapper(arquivo.file, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        resultado = importacao.importar_clientes(texto, atualizar=bool(request.POST.get("atualizar")))
+    except ValueError as e:
+        messages.error(request, str(e))
+        return render(request, "agendamentos/importar_clientes.html")
+
+    if resultado.erros and request.POST.get("relatorio"):
+        response = HttpResponse(content_type="text/csv")
+        response["Content-Disposition"] = 'attachment; filename="importacao_clientes_erros.csv"'
+        resultado.escrever_erros(response)
+        return response
+
+    messages.success(
+        request,
+        f"Importação concluída: {resultado.criados} criados, {resultado.atualizados} atualizados, "
+        f"{resultado.sem_alteracao} sem alteração, {len(resultado.erros)} com erro.",
+    )
+    return render(request, "agendamentos/importar_clientes.html", {
+        "resultado": resultado,
+        "erros": resultado.erros[:LIMITE_ERROS_TELA],
+        "erros_ocultos": max(len(resultado.erros) - LIMITE_ERROS_TELA, 0),
+    })
+
+
 @login_required
 def editar_cliente(request, cliente_id: int):
     if not request.user.is_staff:
@@ -225,80 +297,130 @@ def excluir_cliente(request, cliente_id: int):
 # EXPORTS (CSV/PDF)
 # ============================================================
 
+class _Eco:
+    """"Arquivo" do csv.writer que devolve a linha em vez de guardá-la."""
+    def write(self, valor):
+        return valor
+
+
+EXPORT_CHUNK = 2000
+_COLUNAS_EXPORT = ("servico__nome", "cliente__nome", "data_hora", "status")
+
+
+def _corpo_streaming(request, partes, lote: int = EXPORT_CHUNK):
+    """
+    Corpo de StreamingHttpResponse no modo do servidor. No WSGI, o próprio
+    iterador. No ASGI o Django leria um iterador síncrono inteiro para a
+    memória antes do primeiro byte; então vira um gerador assíncrono que puxa
+    `lote` partes por vez numa thread (thread_sensitive: a mesma da view, e
+    portanto a mesma conexão do cursor de .iterator()).
+    """
+    if not isinstance(request, ASGIRequest):
+        return partes
+    iterador = iter(partes)
+    proximo_lote = sync_to_async(lambda: list(itertools.islice(iterador, lote)), thread_sensitive=True)
+
+    async def _assincrono():
+        try:
+            while bloco := await proximo_lote():
+                for parte in bloco:
+                    yield parte
+        finally:
+            if hasattr(iterador, "close"):  # cliente desconectou no meio: fecha o cursor
+                await sync_to_async(iterador.close, thread_sensitive=True)()
+
+    return _assincrono()
+
+
 @login_required
 def dashboard_export_csv(request):
+    """
+    CSV em streaming: linhas lidas em blocos de EXPORT_CHUNK (values_list,
+    sem instanciar modelos) e enviadas conforme são geradas — memória
+    constante independente do tamanho do histórico, no WSGI e no ASGI
+    (_corpo_streaming).
+    """
     if not request.user.is_staff:
         messages.error(request, "Você não tem permissão para acessar esta página.")
         return redirect("agendamentos:painel")
 
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = 'attachment; filename="agendamentos_dashboard.csv"'
+    try:
+        qs = relatorios.filtrar_agendamentos(request.GET)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect("agendamentos:dashboard")
 
     import csv
-    writer = csv.writer(response)
-    writer.writerow(["Serviço", "Cliente", "Data e Hora", "Status"])
-
-    agendamentos = Agendamento.objects.select_related("servico", "cliente").order_by("data_hora")
-    for ag in agendamentos:
-        writer.writerow([
-            ag.servico.nome if ag.servico else "—",
-            ag.cliente.nome if ag.cliente else "—",
-            timezone.localtime(ag.data_hora).strftime("%Y-%m-%d %H:%M"),
-            ag.status,
-        ])
+    writer = csv.writer(_Eco())
+    linhas = qs.order_by("data_hora", "id").values_list(*_COLUNAS_EXPORT).iterator(chunk_size=EXPORT_CHUNK)
+
+    def _gerar():
+        yield writer.writerow(["Serviço", "Cliente", "Data e Hora", "Status"])
+        for servico_nome, cliente_nome, data_hora, status in linhas:
+            yield writer.writerow([
+                servico_nome or "—",
+                cliente_nome or "—",
+                timezone.localtime(data_hora).strftime("%Y-%m-%d %H:%M"),
+                status,
+            ])
+
+    response = StreamingHttpResponse(_corpo_streaming(request, _gerar()), content_type="text/csv")
+    response["Content-Disposition"] = 'attachment; filename="agendamentos_dashboard.csv"'
     return response
 
 
 @login_required
 def dashboard_export_pdf(request):
+    """
+    Enfileira o PDF (mesmos filtros do CSV) e mostra a página que acompanha o
+    job; pedidos iguais em poucos minutos reutilizam o mesmo arquivo.
+    """
     if not request.user.is_staff:
         messages.error(request, "Você não tem permissão para acessar esta página.")
         return redirect("agendamentos:painel")
 
     try:
-        from reportlab.lib.pagesizes import letter
-        from reportlab.lib import colors
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-        from reportlab.lib.styles import getSampleStyleSheet
-    except Exception:
-        messages.error(request, "Biblioteca 'reportlab' não instalada. Rode: pip install reportlab")
+        job = relatorios.solicitar(request.GET, request.user)
+    except ValueError as e:
+        messages.error(request, str(e))
         return redirect("agendamentos:dashboard")
+    return render(request, "agendamentos/relatorio_status.html", {"job": job})
+
+
+def _status_relatorio(job: RelatorioJob) -> dict:
+    return {
+        "id": job.pk,
+        "status": job.status,
+        "linhas": job.linhas,
+        "erro": job.erro,
+        "download": reverse("agendamentos:relatorio_download", args=[job.pk]) if job.status == "pronto" else None,
+    }
+
+
+@login_required
+def relatorio_status(request, job_id: int):
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Sem permissão."}, status=403)
+    return JsonResponse(_status_relatorio(get_object_or_404(RelatorioJob, pk=job_id)))
+
+
+@login_required
+def relatorio_download(request, job_id: int):
+    if not request.user.is_staff:
+        messages.error(request, "Você não tem permissão para acessar esta página.")
+        return redirect("agendamentos:painel")
 
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-    elements = []
-
-    elements.append(Paragraph("Relatório de Agendamentos", styles["Title"]))
-    elements.append(Paragraph(timezone.now().strftime("Gerado em %d/%m/%Y %H:%M"), styles["Normal"]))
-    elements.append(Paragraph("<br/>", styles["Normal"]))
-
-    data = [["Serviço", "Cliente", "Data e Hora", "Status"]]
-    ags = Agendamento.objects.select_related("servico", "cliente").order_by("data_hora")
-    for ag in ags:
-        data.append([
-            ag.servico.nome if ag.servico else "—",
-            ag.cliente.nome if ag.cliente else "—",
-            timezone.localtime(ag.data_hora).strftime("%Y-%m-%d %H:%M"),
-            ag.status,
-        ])
-
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ("BOTTOMPADDING", (0, 0), (-1, 0), 10),
-        ("BACKGROUND", (0, 1), (-1, -1), colors.beige),
-        ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
-    ]))
-    elements.append(table)
-
-    doc.build(elements)
-    buffer.seek(0)
-
-    return HttpResponse(buffer, content_type="application/pdf")
+    job = get_object_or_404(RelatorioJob, pk=job_id, status="pronto")
+
+    # FileResponse é um iterador síncrono: no ASGI seria lido inteiro para a memória
+    def _blocos():
+        with job.arquivo.open("rb") as f:
+            yield from f.chunks()
+
+    resposta = StreamingHttpResponse(_corpo_streaming(request, _blocos(), lote=1), content_type="application/pdf")
+    resposta["Content-Length"] = str(job.arquivo.size)
+    resposta["Content-Disposition"] = content_disposition_header(True, f"relatorio_agendamentos_{job.pk}.pdf")
+    return resposta
 
 
 # ============================================================
@@ -307,68 +429,203 @@ def dashboard_export_pdf(request):
 
 @login_required
 def stats(request):
+    """
+    JSON do dashboard (?days= para a pizza; padrão 30): KPIs de hoje/semana/mês,
+    distribuição por status e tabela dos últimos 7 dias. Lê só o resumo
+    diário, numa consulta que cobre todas as janelas.
+    """
     if not request.user.is_staff:
         messages.error(request, "Você não tem permissão para acessar esta página.")
         return redirect("agendamentos:painel")
 
-    hoje = timezone.localdate()
-    inicio = hoje - timedelta(days=6)
+    try:
+        dias = min(max(int(request.GET.get("days", 30)), 1), 366)
+    except ValueError:
+        dias = 30
 
-    qs = (
-        Agendamento.objects.filter(data_hora__date__gte=inicio, data_hora__date__lte=hoje)
-        .values("data_hora__date")
-        .annotate(count=Count("id"))
-        .order_by("data_hora__date")
+    hoje = timezone.localdate()
+    inicio_semana = hoje - timedelta(days=hoje.weekday())
+    fim_semana = inicio_semana + timedelta(days=6)
+    inicio_mes = hoje.replace(day=1)
+    fim_mes = (inicio_mes + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    inicio_pizza = hoje - timedelta(days=dias - 1)
+    inicio_7d = hoje - timedelta(days=6)
+
+    contagens = resumo.por_dia_e_status(
+        min(inicio_semana, inicio_mes, inicio_pizza, inicio_7d), max(fim_semana, fim_mes)
     )
-    datas = [(inicio + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(7)]
-    mapa = {item["data_hora__date"].strftime("%Y-%m-%d"): item["count"] for item in qs}
-    dados = [mapa.get(d, 0) for d in datas]
 
-    return render(request, "agendamentos/stats.html", {"datas": datas, "dados_grafico": dados})
+    def total(inicio, fim, status=None):
+        return sum(
+            n for (dia, st), n in contagens.items()
+            if inicio <= dia <= fim and (st == status if status else st != "Cancelado")
+        )
+
+    datas = [inicio_7d + timedelta(days=i) for i in range(7)]
+    return JsonResponse({
+        "kpis": {
+            "hoje": total(hoje, hoje),
+            "semana": total(inicio_semana, fim_semana),
+            "mes": total(inicio_mes, fim_mes),
+            "cancelados_mes": total(inicio_mes, fim_mes, "Cancelado"),
+        },
+        "pie": {
+            st.lower(): total(inicio_pizza, hoje, st)
+            for st in ("Confirmado", "Realizado", "Cancelado", "Pendente")
+        },
+        "tabela7d": [
+            {
+                "data": d.strftime("%d/%m"),
+                "confirmados": contagens.get((d, "Confirmado"), 0),
+                "realizados": contagens.get((d, "Realizado"), 0),
+                "cancelados": contagens.get((d, "Cancelado"), 0),
+            }
+            for d in datas
+        ],
+        "datas": [d.isoformat() for d in datas],
+        "dados_grafico": [sum(contagens.get((d, st), 0) for st in ("Confirmado", "Realizado", "Cancelado", "Pendente")) for d in datas],
+    })
+
+
+@login_required
+def stats_periodo(request, periodo: str):
+    """
+    Série para gráficos: /stats/7d/, 30d/, 12s/ (semanas), 12m/ (meses) ou
+    personalizado/?inicio=&fim=&granularidade=dia|semana|mes.
+    """
+    if not request.user.is_staff:
+        messages.error(request, "Você não tem permissão para acessar esta página.")
+        return redirect("agendamentos:painel")
+
+    try:
+        p = estatisticas.resolver_periodo(periodo, request.GET)
+    except estatisticas.PeriodoInvalido as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({"periodo": periodo, **estatisticas.serie(p)})
+
+
+_PALETA_STATUS = {
+    "confirmado": {"color": "#16a34a", "textColor": "#ffffff", "borderColor": "#15803d"},
+    "pendente": {"color": "#2563eb", "textColor": "#ffffff", "borderColor": "#1d4ed8"},
+    "cancelado": {"color": "#dc2626", "textColor": "#ffffff", "borderColor": "#b91c1c"},
+    "realizado": {"color": "#9333ea", "textColor": "#ffffff", "borderColor": "#7e22ce"},
+}
+_PALETA_PADRAO = {"color": "#6b7280", "textColor": "#ffffff", "borderColor": "#4b5563"}
+
+# Colunas usadas pelo calendário (sem instanciar modelos)
+_CAMPOS_EVENTO = (
+    "id", "status", "data_hora", "data_hora_fim",
+    "servico_id", "servico__nome", "servico__duracao",
+    "cliente__nome", "cliente__email", "cliente__telefone",
+)
+MAX_DIAS_CALENDARIO = 62
+# Recuo do cursor do feed incremental: cobre gravações com atualizado_em
+# anterior ao cursor que só ficaram visíveis depois (commit atrasado).
+MARGEM_CURSOR = timedelta(seconds=30)
+
+
+def _ler_instante(valor):
+    """ISO 8601 (data ou data+hora) -> datetime aware; None se vazio ou inválido."""
+    if not valor:
+        return None
+    valor = valor.replace(" ", "+")  # "+03:00" chega como " 03:00" na querystring
+    try:
+        dt = parse_datetime(valor)
+        if dt is None:
+            d = parse_date(valor[:10])
+            dt = datetime.combine(d, datetime.min.time()) if d else None
+    except ValueError:
+        return None
+    if dt is not None and timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
+
+
+def _janela_calendario(request) -> tuple[datetime, datetime]:
+    """
+    Janela [start, end) enviada pelo FullCalendar (ISO 8601, data ou data+hora),
+    limitada a MAX_DIAS_CALENDARIO. Sem parâmetros: do mês passado ao próximo.
+    """
+    inicio = _ler_instante(request.GET.get("start"))
+    fim = _ler_instante(request.GET.get("end"))
+    if inicio is None:
+        hoje = timezone.make_aware(datetime.combine(timezone.localdate(), datetime.min.time()))
+        inicio = hoje - timedelta(days=31)
+    if fim is None or fim <= inicio or fim - inicio > timedelta(days=MAX_DIAS_CALENDARIO):
+        fim = inicio + timedelta(days=MAX_DIAS_CALENDARIO)
+    return inicio, fim
+
+
+def _evento_calendario(ag: dict) -> dict:
+    fim = ag["data_hora_fim"] or ag["data_hora"] + timedelta(minutes=ag["servico__duracao"] or DURACAO_PADRAO)
+    return {
+        "id": ag["id"],
+        "title": f"{ag['servico__nome'] or 'Serviço'} - {ag['cliente__nome'] or 'Cliente'}",
+        "start": timezone.localtime(ag["data_hora"]).isoformat(),
+        "end": timezone.localtime(fim).isoformat(),
+        "status": ag["status"],
+        **_PALETA_STATUS.get((ag["status"] or "").lower(), _PALETA_PADRAO),
+        "extendedProps": {
+            "status": ag["status"],
+            "servico_nome": ag["servico__nome"] or "",
+            "servico_id": ag["servico_id"],
+            "cliente_nome": ag["cliente__nome"] or "",
+            "cliente_email": ag["cliente__email"] or "",
+            "cliente_telefone": ag["cliente__telefone"] or "",
+        },
+    }
 
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=etag_agendamentos, last_modified_func=modificado_agendamentos)
 def api_agendamentos(request):
-    qs = Agendamento.objects.select_related("servico", "cliente").order_by("data_hora")
+    """
+    Eventos do FullCalendar na janela ?start=&end= (máx. MAX_DIAS_CALENDARIO).
+    Staff vê todos; os demais, apenas os próprios.
+
+    Com ?since=<cursor> devolve só o que mudou desde o cursor:
+    {"cursor", "eventos" (criados/alterados, qualquer data), "removidos" (ids),
+    "completo"}. Cursor ausente do histórico (> RETENCAO_REMOVIDOS) devolve a
+    janela inteira com "completo": true. O próximo cursor também vai no
+    cabeçalho X-Agenda-Cursor da resposta completa.
+    """
+    agora = timezone.now()
+    cursor = (agora - MARGEM_CURSOR).isoformat()
+    qs = Agendamento.objects.all()
+    removidos = AgendamentoRemovido.objects.all()
     if not request.user.is_staff:
         cliente = None
         if request.user.email:
             cliente = Cliente.objects.filter(email=request.user.email).first()
         qs = qs.filter(cliente=cliente) if cliente else qs.none()
-
-    def palette(status: str):
-        s = (status or "").lower()
-        if s == "confirmado":
-            return {"color": "#16a34a", "textColor": "#ffffff", "borderColor": "#15803d"}
-        if s == "pendente":
-            return {"color": "#2563eb", "textColor": "#ffffff", "borderColor": "#1d4ed8"}
-        if s == "cancelado":
-            return {"color": "#dc2626", "textColor": "#ffffff", "borderColor": "#b91c1c"}
-        if s == "realizado":
-            return {"color": "#9333ea", "textColor": "#ffffff", "borderColor": "#7e22ce"}
-        return {"color": "#6b7280", "textColor": "#ffffff", "borderColor": "#4b5563"}
-
-    data = []
-    for ag in qs:
-        dur = ag.servico.duracao if ag.servico else 60
-        pal = palette(ag.status)
-        data.append({
-            "id": ag.id,
-            "title": f"{ag.servico.nome if ag.servico else 'Serviço'} - {ag.cliente.nome if ag.cliente else 'Cliente'}",
-            "start": timezone.localtime(ag.data_hora).isoformat(),
-            "end": timezone.localtime(ag.data_hora + timedelta(minutes=dur)).isoformat(),
-            "status": ag.status,
-            **pal,
-            "extendedProps": {
-                "status": ag.status,
-                "servico_nome": ag.servico.nome if ag.servico else "",
-                "servico_id": ag.servico.id if ag.servico else None,
-                "cliente_nome": ag.cliente.nome if ag.cliente else "",
-                "cliente_email": ag.cliente.email if ag.cliente else "",
-                "cliente_telefone": ag.cliente.telefone if ag.cliente else "",
-            },
+        removidos = removidos.filter(cliente_id=cliente.pk) if cliente else removidos.none()
+
+    if "since" not in request.GET:
+        inicio, fim = _janela_calendario(request)
+        qs = qs.filter(**filtro_sobreposicao(inicio, fim)).order_by("data_hora")
+        resposta = JsonResponse([_evento_calendario(ag) for ag in qs.values(*_CAMPOS_EVENTO)], safe=False)
+        resposta["X-Agenda-Cursor"] = cursor
+        return resposta
+
+    desde = _ler_instante(request.GET["since"])
+    if desde is None or desde < agora - RETENCAO_REMOVIDOS:
+        inicio, fim = _janela_calendario(request)
+        qs = qs.filter(**filtro_sobreposicao(inicio, fim)).order_by("data_hora")
+        return JsonResponse({
+            "cursor": cursor,
+            "completo": True,
+            "eventos": [_evento_calendario(ag) for ag in qs.values(*_CAMPOS_EVENTO)],
+            "removidos": [],
         })
-    return JsonResponse(data, safe=False)
+
+    qs = qs.filter(atualizado_em__gt=desde).order_by("data_hora")
+    return JsonResponse({
+        "cursor": cursor,
+        "completo": False,
+        "eventos": [_evento_calendario(ag) for ag in qs.values(*_CAMPOS_EVENTO)],
+        "removidos": list(removidos.filter(removido_em__gt=desde).values_list("agendamento_id", flat=True)),
+    })
 
 
 @login_required
@@ -400,11 +657,79 @@ def api_notificacao_proximo_agendamento(request):
 
 
 @login_required
+async def eventos_stream(request):
+    """
+    Canal SSE (text/event-stream) com lembretes do próximo horário e
+    criação/mudança de status de agendamentos. Substitui o polling de
+    api_notificacao_proximo_agendamento: o Cliente é buscado uma vez por
+    conexão e os lembretes saem do agendador único de eventos.central.
+
+    Só no ASGI: no WSGI a resposta infinita prenderia a thread para sempre,
+    então devolve 204 e o navegador volta ao polling (ver eventos.py).
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    user = await request.auser()
+    cliente = None
+    if user.email:
+        cliente = await Cliente.objects.filter(email=user.email).only("id").afirst()
+    conexao = eventos.central.conectar(cliente.id if cliente else None, user.is_staff)
+
+    async def _fluxo():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    evento = await asyncio.wait_for(conexao.fila.get(), eventos.KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield eventos.formatar_sse(evento)
+        finally:
+            eventos.central.desconectar(conexao)
+
+    resposta = StreamingHttpResponse(_fluxo(), content_type="text/event-stream")
+    resposta["Cache-Control"] = "no-cache"
+    resposta["X-Accel-Buffering"] = "no"
+    return resposta
+
+
+def _parametros_agenda(request) -> tuple[int, tuple]:
+    """
+    (duração, profissionais candidatos) a partir de ?servico_id= e
+    ?profissional_id=. Sem serviço, usa a duração padrão da agenda.
+    """
+    grade = obter_grade()
+    dur = grade.duracao_padrao
+    servico_id = None
+    servico_param = request.GET.get("servico_id")
+    if servico_param:
+        try:
+            servico = get_object_or_404(Servico, id=int(servico_param))
+            dur = int(servico.duracao or DURACAO_PADRAO)
+            servico_id = servico.id
+        except Exception:
+            pass
+
+    profissional_id = None
+    try:
+        profissional_id = int(request.GET.get("profissional_id") or 0) or None
+    except ValueError:
+        pass
+    return dur, grade.recursos(servico_id, profissional_id)
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=etag_horarios, last_modified_func=modificado_horarios)
 def api_horarios_disponiveis(request):
     """
     Retorna horários de um dia.
     - Se receber ?servico_id=..., usa a duração do serviço.
-    - Se NÃO receber, usa 60 min (compatível com o flyout do calendário).
+    - Se NÃO receber, usa a duração padrão da agenda (60 min de fábrica).
+    - ?profissional_id=... restringe a um profissional; sem ele, o slot está
+      livre se QUALQUER profissional que atende o serviço estiver livre.
+    - A reserva temporária do próprio usuário não conta como ocupada.
     Resposta inclui:
       { "slots": [ {"hora":"09:00", "ocupado": false}, ... ],
         "horarios": ["09:00","09:30", ...]  # apenas os livres (compat legada)
@@ -419,48 +744,46 @@ def api_horarios_disponiveis(request):
     except Exception:
         return JsonResponse({"error": "Data inválida."}, status=400)
 
-    # duração: por serviço (se informado) ou 60
-    dur = 60
-    servico_id = request.GET.get("servico_id")
-    if servico_id:
-        try:
-            servico = get_object_or_404(Servico, id=int(servico_id))
-            dur = int(servico.duracao or 60)
-        except Exception:
-            dur = 60
-
-    horario_abre = time(9, 0)
-    horario_fecha = time(18, 0)
-    intervalo = 30
-
-    slots = []
-    horarios_livres = []
-
-    atual = datetime.combine(data_sel, horario_abre)
-    limite = datetime.combine(data_sel, horario_fecha)
-    now_local = timezone.localtime()
-
-    while atual + timedelta(minutes=dur) <= limite:
-        # bloqueia passado do dia atual
-        if data_sel == now_local.date() and atual <= now_local:
-            atual += timedelta(minutes=intervalo)
-            continue
-
-        conflito = Agendamento.objects.filter(
-            data_hora__date=data_sel,
-            data_hora__lt=atual + timedelta(minutes=dur),
-            data_hora__gte=atual - timedelta(minutes=dur),
-            status__in=["Pendente", "Confirmado"],
-        ).exists()
+    dur, recursos = _parametros_agenda(request)
+    slots = slots_do_dia(data_sel, dur, recursos, ignorar_usuario=request.user)
+    horarios_livres = [s["hora"] for s in slots if not s["ocupado"]]
 
-        hora_txt = atual.strftime("%H:%M")
-        slots.append({"hora": hora_txt, "ocupado": bool(conflito)})
-        if not conflito:
-            horarios_livres.append(hora_txt)
+    return JsonResponse({"slots": slots, "horarios": horarios_livres})
 
-        atual += timedelta(minutes=intervalo)
 
-    return JsonResponse({"slots": slots, "horarios": horarios_livres})
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=etag_horarios, last_modified_func=modificado_horarios)
+def api_horarios_periodo(request):
+    """
+    Horários de vários dias numa única ida ao banco (visão mensal).
+    GET ?inicio=YYYY-MM-DD&fim=YYYY-MM-DD[&servico_id=...][&profissional_id=...]  (fim inclusive)
+    Resposta:
+      { "dias": [ {"data":"2025-10-01", "livres": 12,
+                   "slots": [...], "horarios": [...]}, ... ] }
+    """
+    try:
+        inicio = datetime.strptime(request.GET.get("inicio", ""), "%Y-%m-%d").date()
+        fim = datetime.strptime(request.GET.get("fim", ""), "%Y-%m-%d").date()
+    except Exception:
+        return JsonResponse({"error": "Período inválido."}, status=400)
+
+    if fim < inicio:
+        return JsonResponse({"error": "Período inválido."}, status=400)
+    if (fim - inicio).days + 1 > MAX_DIAS_PERIODO:
+        return JsonResponse({"error": f"Período máximo de {MAX_DIAS_PERIODO} dias."}, status=400)
+
+    dur, recursos = _parametros_agenda(request)
+    dias = []
+    for dia, slots in slots_do_periodo(inicio, fim, dur, recursos, ignorar_usuario=request.user).items():
+        horarios_livres = [s["hora"] for s in slots if not s["ocupado"]]
+        dias.append({
+            "data": dia.strftime("%Y-%m-%d"),
+            "livres": len(horarios_livres),
+            "slots": slots,
+            "horarios": horarios_livres,
+        })
+    return JsonResponse({"dias": dias})
 
 
 # ============================================================
@@ -484,24 +807,13 @@ def agendar_servico(request, servico_id: int):
                 messages.error(request, "Não é possível agendar em um horário que já passou.")
                 return render(request, "agendamentos/agendar_servico.html", {"servico": servico, "config": None, "form": form})
 
-            conflito = Agendamento.objects.filter(
-                data_hora__date=dt.date(),
-                data_hora__lt=dt + timedelta(minutes=servico.duracao),
-                data_hora__gte=dt - timedelta(minutes=servico.duracao),
-                status__in=["Pendente", "Confirmado"],
-            ).exists()
-            if conflito:
-                messages.error(request, "Este horário não está mais disponível. Escolha outro.")
-                return render(request, "agendamentos/agendar_servico.html", {"servico": servico, "config": None, "form": form})
-
             cliente = Cliente.objects.filter(email=request.user.email).first()
 
-            ag = Agendamento.objects.create(
-                servico=servico,
-                cliente=cliente,
-                data_hora=dt,
-                status="Pendente",
-            )
+            try:
+                ag = reservar_horario(servico=servico, cliente=cliente, data_hora=dt)
+            except HorarioIndisponivel:
+                messages.error(request, "Este horário não está mais disponível. Escolha outro.")
+                return render(request, "agendamentos/agendar_servico.html", {"servico": servico, "config": None, "form": form})
             messages.success(request, f"Agendamento #{ag.id} criado! Aguardando confirmação.")
             return redirect("agendamentos:painel")
     else:
@@ -519,28 +831,28 @@ def confirmar_agendamento(request, servico_id: int, year: int, month: int, day:
         messages.error(request, "Não é possível confirmar um agendamento que já passou.")
         return redirect("agendamentos:agendar_servico", servico_id=servico.id)
 
-    conflito = Agendamento.objects.filter(
-        data_hora__date=data_hora.date(),
-        data_hora__lt=data_hora + timedelta(minutes=servico.duracao),
-        data_hora__gte=data_hora - timedelta(minutes=servico.duracao),
-        status__in=["Pendente", "Confirmado"],
-    ).exists()
-    if conflito:
-        messages.error(request, "Este horário não está mais disponível. Escolha outro.")
-        return redirect("agendamentos:agendar_servico", servico_id=servico.id)
-
     if request.method == "POST":
         cliente = Cliente.objects.filter(email=request.user.email).first()
-        Agendamento.objects.create(
-            servico=servico,
-            cliente=cliente,
-            data_hora=data_hora,
-            status="Pendente",
-        )
+        try:
+            reservar_horario(servico=servico, cliente=cliente, data_hora=data_hora, usuario=request.user)
+        except HorarioIndisponivel:
+            messages.error(request, "Este horário não está mais disponível. Escolha outro.")
+            return redirect("agendamentos:agendar_servico", servico_id=servico.id)
         messages.success(request, "Agendamento criado com sucesso! Aguardando confirmação.")
         return redirect("agendamentos:painel")
 
-    return render(request, "agendamentos/confirmar_agendamento.html", {"servico": servico, "data_hora": data_hora})
+    # segura o horário enquanto a confirmação está aberta
+    try:
+        reserva = segurar_horario(servico=servico, usuario=request.user, data_hora=data_hora)
+    except HorarioIndisponivel:
+        messages.error(request, "Este horário não está mais disponível. Escolha outro.")
+        return redirect("agendamentos:agendar_servico", servico_id=servico.id)
+
+    return render(
+        request,
+        "agendamentos/confirmar_agendamento.html",
+        {"servico": servico, "data_hora": data_hora, "reserva": reserva},
+    )
 
 
 @login_required
@@ -571,6 +883,43 @@ def atualizar_status_agendamento(request, agendamento_id: int):
     return redirect("agendamentos:gerir_agendamentos")
 
 
+# ============================================================
+# CONFIGURAÇÃO DA AGENDA
+# ============================================================
+
+@login_required
+def configuracoes_agenda(request):
+    if not request.user.is_staff:
+        messages.error(request, "Você não tem permissão para acessar esta página.")
+        return redirect("agendamentos:painel")
+
+    existentes = set(HorarioFuncionamento.objects.values_list("dia_semana", flat=True))
+    faltando = [HorarioFuncionamento(dia_semana=d) for d, _ in HorarioFuncionamento.DIAS_SEMANA if d not in existentes]
+    if faltando:
+        HorarioFuncionamento.objects.bulk_create(faltando)
+
+    config = ConfiguracaoAgenda.carregar()
+    if request.method == "POST":
+        form = ConfiguracaoForm(request.POST, instance=config)
+        formset = HorarioFuncionamentoFormSet(request.POST, queryset=HorarioFuncionamento.objects.all())
+        if form.is_valid() and formset.is_valid():
+            form.save()
+            formset.save()
+            messages.success(request, "Configuração da agenda salva!")
+            return redirect("agendamentos:configuracoes_agenda")
+        messages.error(request, "Erro ao salvar a configuração. Verifique os dados.")
+    else:
+        form = ConfiguracaoForm(instance=config)
+        formset = HorarioFuncionamentoFormSet(queryset=HorarioFuncionamento.objects.all())
+
+    excecoes = ExcecaoAgenda.objects.filter(data__gte=timezone.localdate())
+    return render(
+        request,
+        "agendamentos/configuracoes_agenda.html",
+        {"form": form, "formset": formset, "excecoes": excecoes},
+    )
+
+
 # ============================================================
 # SERVIÇOS
 # ============================================================
@@ -610,7 +959,10 @@ def criar_servico(request):
                     pass
 
             servico.save()
+            form.save_m2m()
             messages.success(request, "Serviço criado com sucesso!")
+            if servico.imagem_status == "pendente":
+                messages.info(request, "A imagem está sendo ajustada e aparece atualizada em instantes.")
             return redirect("agendamentos:gerir_servicos")
         messages.error(request, "Erro ao criar serviço. Verifique os dados.")
     else:
@@ -644,7 +996,10 @@ def editar_servico(request, servico_id: int):
                     pass
 
             servico.save()
+            form.save_m2m()
             messages.success(request, "Serviço atualizado com sucesso!")
+            if servico.imagem_status == "pendente":
+                messages.info(request, "A imagem está sendo ajustada e aparece atualizada em instantes.")
             return redirect("agendamentos:gerir_servicos")
         messages.error(request, "Erro ao atualizar serviço. Verifique os dados.")
     else:
@@ -728,19 +1083,19 @@ def adicionar_imagens_adicionais(request, servico_id: int):
 
     servico = get_object_or_404(Servico, id=servico_id)
     if request.method == "POST":
-        imagens = request.FILES.getlist("imagens_adicionais")
-        if not imagens:
+        arquivos = request.FILES.getlist("imagens_adicionais")
+        if not arquivos:
             messages.error(request, "Nenhuma imagem selecionada para upload.")
             return redirect("agendamentos:editar_servico", servico_id=servico.id)
 
         existentes = ServicoImagem.objects.filter(servico=servico).count()
         disponiveis = max(0, 5 - existentes)
-        for f in imagens[:disponiveis]:
+        for f in arquivos[:disponiveis]:
             ServicoImagem.objects.create(servico=servico, imagem=f)
-        if len(imagens) > disponiveis:
+        if len(arquivos) > disponiveis:
             messages.warning(request, "Limite de 5 imagens adicionais por serviço.")
         else:
-            messages.success(request, f"{min(len(imagens), disponiveis)} imagens adicionadas ao serviço {servico.nome}!")
+            messages.success(request, f"{min(len(arquivos), disponiveis)} imagens adicionadas ao serviço {servico.nome}!")
     return redirect("agendamentos:editar_servico", servico_id=servico.id)
 
 